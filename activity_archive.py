@@ -0,0 +1,274 @@
+"""Tiered retention of the activities table.
+
+Hot: activities younger than ``activity_retention_days`` stay in the main
+database. Archive: older ones are moved, in batches and in id order, into
+monthly SQLite files (``archive/activities-YYYY-MM.db`` next to the main
+database) and folded into the hourly ``activity_rollups`` in the same
+transaction that deletes them from ``activities``. Rollups only: archive
+files older than ``activity_archive_months`` months are deleted, their
+counts stay in the rollups.
+
+Every activity is counted either in ``activities`` or in ``activity_rollups``,
+so the dashboard adds both up (``rollup_query()``) and never counts twice.
+Archived raw messages are read back with ``archived_activities()``; the
+live moderation continues into them once the hot messages run out, and the
+message search looks into them on request (the full-text index only covers
+the hot activities).
+
+Runs as a job of the ID-Finder bot; for the first run on a large database:
+
+    python activity_archive.py --vacuum
+"""
+import os
+import re
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import Table, Column, MetaData, Index, create_engine, select, extract, func, event
+
+from database import DB_PATH, SessionLocal, ReadSessionLocal, Activity, ActivityRollup, ActivityArchive, engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 180
+DEFAULT_ARCHIVE_MONTHS = 0 # 0 = keep archive files forever
+ARCHIVE_DIR = os.path.join(os.path.dirname(DB_PATH), "archive")
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_INTERVAL_SECONDS = 6 * 3600
+
+_archive_metadata = MetaData()
+# Same columns as Activity, without the foreign key to users (the archive has no users table)
+archive_table = Table(
+    "activities", _archive_metadata,
+    *[Column(c.name, c.type, primary_key=c.primary_key) for c in Activity.__table__.columns],
+)
+Index("ix_archive_user_ts", archive_table.c.user_id, archive_table.c.ts)
+Index("ix_archive_chat_ts", archive_table.c.chat_id, archive_table.c.ts)
+Index("ix_archive_ts", archive_table.c.ts)
+
+_engines = {}
+
+
+def archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f"activities-{month}.db")
+
+
+def _archive_engine(month):
+    eng = _engines.get(month)
+    if eng is None:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        eng = create_engine(f"sqlite:///{archive_path(month)}", connect_args={"timeout": 30})
+        event.listen(eng, "connect", _register_functions)
+        _archive_metadata.create_all(eng)
+        _engines[month] = eng
+    return eng
+
+
+def _register_functions(dbapi_connection, connection_record):
+    # SQLite's LIKE and lower() only fold ASCII; the text search compares casefold()ed text
+    dbapi_connection.create_function("casefold", 1, lambda value: value.casefold() if value else value, deterministic=True)
+
+
+def text_terms(q):
+    """Words and "phrases" of a search input, casefolded; every one must occur in the text."""
+    return [term.casefold() for phrase, word in re.findall(r'"([^"]*)"|(\S+)', q or "") if (term := " ".join((phrase or word).split()))]
+
+
+def retention_cutoff(retention_days, now=None):
+    """Start of the oldest day that stays hot; None if archiving is disabled."""
+    if not retention_days or retention_days <= 0:
+        return None
+    return (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=retention_days)
+
+
+def _fold(session, rows):
+    """Add a batch of activities to the hourly rollups."""
+    buckets = {}
+    for row in rows:
+        key = (row.ts.replace(minute=0, second=0, microsecond=0), row.chat_id or 0, row.user_id or 0)
+        counts = buckets.setdefault(key, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += 1 if row.has_media else 0
+        counts[2] += 1 if row.is_command else 0
+    # One query for the existing buckets of the batch's time span instead of one per bucket
+    hours = [key[0] for key in buckets]
+    existing = {(r.bucket_start, r.chat_id, r.user_id): r for r in session.query(ActivityRollup).filter(ActivityRollup.bucket_start.between(min(hours), max(hours)))}
+    for key, (messages, media, commands) in buckets.items():
+        rollup = existing.get(key)
+        if not rollup:
+            rollup = ActivityRollup(bucket_start=key[0], chat_id=key[1], user_id=key[2], messages=0, media=0, commands=0)
+            session.add(rollup)
+        rollup.messages += messages
+        rollup.media += media
+        rollup.commands += commands
+
+
+def _write_archives(rows):
+    """Copy a batch into the monthly archive files; returns {month: rows}. Re-runs are idempotent (same ids)."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row.ts.strftime("%Y-%m"), []).append({c.name: getattr(row, c.name) for c in archive_table.columns})
+    for month, values in by_month.items():
+        with _archive_engine(month).begin() as conn:
+            conn.execute(archive_table.insert().prefix_with("OR IGNORE"), values)
+    return by_month
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to ``batch_size`` activities older than ``cutoff``; returns the number moved."""
+    with SessionLocal() as session:
+        # Activities are written in time order, so the oldest rows have the lowest ids
+        rows = session.query(Activity).filter(Activity.ts < cutoff).order_by(Activity.id).limit(batch_size).all()
+        if not rows:
+            return 0
+        # Archive first: if we crash before the delete commits, the next run re-inserts the same ids
+        by_month = _write_archives(rows)
+        _fold(session, rows)
+        for month, values in by_month.items():
+            entry = session.get(ActivityArchive, month)
+            if not entry:
+                entry = ActivityArchive(month=month, path=archive_path(month), rows=0)
+                session.add(entry)
+            # min/max, not the first and last row: ids follow arrival, timestamps may be slightly out of order
+            first, last = min(v["ts"] for v in values), max(v["ts"] for v in values)
+            entry.rows += len(values)
+            entry.first_ts = min(entry.first_ts, first) if entry.first_ts else first
+            entry.last_ts = max(entry.last_ts, last) if entry.last_ts else last
+            entry.updated_at = datetime.utcnow()
+        session.query(Activity).filter(Activity.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+        session.commit()
+        return len(rows)
+
+
+def prune_archives(archive_months, now=None):
+    """Delete archive files older than ``archive_months`` months (rollups stay); returns the months removed."""
+    if not archive_months or archive_months <= 0:
+        return []
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - archive_months
+    oldest_kept = f"{index // 12:04d}-{index % 12 + 1:02d}"
+    removed = []
+    with SessionLocal() as session:
+        for entry in session.query(ActivityArchive).filter(ActivityArchive.month < oldest_kept, ActivityArchive.deleted_at.is_(None)).all():
+            eng = _engines.pop(entry.month, None)
+            if eng is not None:
+                eng.dispose()
+            if os.path.exists(entry.path):
+                os.remove(entry.path)
+            entry.deleted_at = datetime.utcnow()
+            removed.append(entry.month)
+        session.commit()
+    return removed
+
+
+def run_archive(retention_days=DEFAULT_RETENTION_DAYS, archive_months=DEFAULT_ARCHIVE_MONTHS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """One archive pass; returns (rows moved, archive months removed)."""
+    cutoff = retention_cutoff(retention_days)
+    moved = 0
+    if cutoff is not None:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            n = archive_batch(cutoff, batch_size)
+            moved += n
+            batches += 1
+            if n < batch_size:
+                break
+    removed = prune_archives(archive_months)
+    if moved:
+        logger.info(f"Aktivitäten-Archiv: {moved} Aktivitäten vor {cutoff:%Y-%m-%d} archiviert.")
+    if removed:
+        logger.info(f"Aktivitäten-Archiv: Archivdateien entfernt (Rollups bleiben): {', '.join(removed)}")
+    return moved, removed
+
+
+def rollup_query(session, columns, start=None, month=None, year=None, user_id=None):
+    """Query over ``activity_rollups`` with the same filters the dashboard applies to ``activities``."""
+    query = session.query(*columns)
+    if start is not None:
+        query = query.filter(ActivityRollup.bucket_start >= start.replace(minute=0, second=0, microsecond=0))
+    if month and month > 0:
+        query = query.filter(extract('month', ActivityRollup.bucket_start) == month)
+    if year and year > 0:
+        query = query.filter(extract('year', ActivityRollup.bucket_start) == year)
+    if user_id is not None:
+        query = query.filter(ActivityRollup.user_id == user_id)
+    return query
+
+
+def archived_activities(start=None, end=None, user_id=None, chat_id=None, thread_id=None, text=None, limit=100):
+    """Raw archived activities (newest first) as dicts, reading only the monthly files the range needs.
+
+    ``text`` keeps the messages that contain all its words and "phrases"
+    (substrings, case-insensitive); without a full-text index every file in the
+    range is scanned.
+    """
+    terms = text_terms(text)
+    with ReadSessionLocal() as session:
+        entries = session.query(ActivityArchive).filter(ActivityArchive.deleted_at.is_(None)).order_by(ActivityArchive.month.desc()).all()
+    result = []
+    for entry in entries:
+        if (start and entry.last_ts and entry.last_ts < start) or (end and entry.first_ts and entry.first_ts >= end):
+            continue
+        if not os.path.exists(entry.path):
+            continue
+        query = select(archive_table)
+        if start is not None:
+            query = query.where(archive_table.c.ts >= start)
+        if end is not None:
+            query = query.where(archive_table.c.ts < end)
+        if user_id is not None:
+            query = query.where(archive_table.c.user_id == user_id)
+        if chat_id is not None:
+            query = query.where(archive_table.c.chat_id == chat_id)
+        if thread_id is not None:
+            query = query.where(archive_table.c.thread_id == thread_id)
+        for term in terms:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            query = query.where(func.casefold(archive_table.c.text).like(pattern, escape="\\"))
+        query = query.order_by(archive_table.c.ts.desc()).limit(limit - len(result))
+        with _archive_engine(entry.month).connect() as conn:
+            result += [dict(row._mapping) for row in conn.execute(query)]
+        if len(result) >= limit:
+            break
+    return result
+
+
+def archive_stats():
+    """Rows and months in the archive, for the dashboard."""
+    with ReadSessionLocal() as session:
+        rows, months, first = session.query(func.coalesce(func.sum(ActivityArchive.rows), 0), func.count(ActivityArchive.month), func.min(ActivityArchive.first_ts))\
+            .filter(ActivityArchive.deleted_at.is_(None)).one()
+        rolled_up = session.query(func.coalesce(func.sum(ActivityRollup.messages), 0)).scalar()
+    return {"rows": rows, "months": months, "first_ts": first, "rolled_up": rolled_up}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ältere Aktivitäten in Monatsarchive verschieben")
+    parser.add_argument("--retention-days", type=int, default=None, help="Tage, die in der Haupt-DB bleiben (Standard: ID-Finder-Konfiguration)")
+    parser.add_argument("--archive-months", type=int, default=None, help="Monate, die Archivdateien behalten werden (0 = immer)")
+    parser.add_argument("--vacuum", action="store_true", help="Haupt-DB danach verkleinern (VACUUM)")
+    args = parser.parse_args(argv)
+
+    import json
+    config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bots", "id_finder_bot", "id_finder_config.json")
+    cfg = {}
+    if os.path.exists(config_file):
+        with open(config_file, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    retention_days = args.retention_days if args.retention_days is not None else cfg.get("activity_retention_days", DEFAULT_RETENTION_DAYS)
+    archive_months = args.archive_months if args.archive_months is not None else cfg.get("activity_archive_months", DEFAULT_ARCHIVE_MONTHS)
+
+    from database import init_db
+    init_db()
+    moved, removed = run_archive(retention_days, archive_months)
+    print(f"{moved} Aktivitäten archiviert, {len(removed)} Archivdateien entfernt.")
+    if args.vacuum:
+        # VACUUM must not run inside a transaction (PostgreSQL)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("Datenbank verkleinert.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Contention benchmark: several bot processes write the same SQLite database at once.
+
+    python -m benchmarks.bench_contention --processes 4 --threads 4 --duration 20
+    python -m benchmarks.bench_contention --modes queue --readers 2 --compare benchmarks/results/contention-....json
+
+Every writer process runs ``--threads`` threads that log messages the way
+the ID-Finder does (user upsert, then activity + user summary), like the
+executor threads of a bot. Reader processes run dashboard-style queries on
+the read-only engine at the same time. Each mode runs on a fresh database:
+``queue`` with the per-process writer queue (default), ``noqueue`` with
+SQLITE_WRITER_QUEUE=0, i.e. all threads wait in SQLite's busy handler.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from time import perf_counter
+
+from benchmarks.common import use_temp_database, quiet_logging, db_size, latency_summary, write_results, compare
+
+MODES = {"queue": "1", "noqueue": "0"}
+CHATS = (-1001000000001, -1001000000002, -1001000000003)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4, help="Schreibende Bot-Prozesse")
+    parser.add_argument("--threads", type=int, default=4, help="Threads je Prozess (Executor-Threads eines Bots)")
+    parser.add_argument("--readers", type=int, default=1, help="Lesende Prozesse (Dashboard)")
+    parser.add_argument("--duration", type=float, default=15, help="Laufzeit je Modus in Sekunden")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--modes", default="queue,noqueue", help="Kommagetrennt: queue, noqueue")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON-Ausgabe ('-' = stdout, Standard: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Früheres Ergebnis (JSON) zum Vergleich")
+    return parser.parse_args(argv)
+
+
+def _log_message(SessionLocal, User, Activity, count_user_message, rng, users, n):
+    """One message like id_finder_bot: update_user_db() and log_activity_db(), two transactions."""
+    from datetime import datetime
+
+    user_id = 100000 + rng.randrange(users)
+    with SessionLocal() as session:
+        user = session.get(User, user_id)
+        if not user:
+            session.add(User(id=user_id, username=f"user{user_id}", full_name=f"Nutzer {user_id}"))
+        else:
+            user.last_seen = datetime.utcnow()
+        session.commit()
+    with SessionLocal() as session:
+        has_media = rng.random() < 0.2
+        activity = Activity(ts=datetime.now(), chat_id=rng.choice(CHATS), chat_type="supergroup", chat_title="Gruppe", message_id=n,
+                            user_id=user_id, text="hallo " * rng.randint(1, 20), msg_type="photo" if has_media else "text", has_media=has_media)
+        session.add(activity)
+        count_user_message(session, user_id, activity.ts, has_media)
+        session.commit()
+
+
+def writer_process(db_path, mode, index, args, start_event, results):
+    os.environ["SQLITE_WRITER_QUEUE"] = MODES[mode]
+    use_temp_database(db_path)
+    quiet_logging(os.path.join(os.path.dirname(db_path), f"writer-{index}.log"))
+    from database import SessionLocal, User, Activity, count_user_message, WRITER_QUEUE
+
+    latencies, errors, lock = [], {}, threading.Lock()
+
+    def worker(thread_index):
+        rng = random.Random(args.seed * 1000 + index * 100 + thread_index)
+        n = 0
+        deadline = start + args.duration
+        while time.monotonic() < deadline:
+            n += 1
+            t = perf_counter()
+            try:
+                _log_message(SessionLocal, User, Activity, count_user_message, rng, args.users, index * 10**7 + thread_index * 10**6 + n)
+            except Exception as e:
+                with lock:
+                    key = type(e).__name__ + ": " + str(e).splitlines()[0][:80]
+                    errors[key] = errors.get(key, 0) + 1
+                continue
+            elapsed = perf_counter() - t
+            with lock:
+                latencies.append(elapsed)
+
+    start_event.wait()
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put({"role": "writer", "latencies": latencies, "errors": errors, "queue_waits": WRITER_QUEUE.waits, "queue_wait_s": WRITER_QUEUE.wait_seconds})
+
+
+def reader_process(db_path, mode, index, args, start_event, results):
+    os.environ["SQLITE_WRITER_QUEUE"] = MODES[mode]
+    use_temp_database(db_path)
+    quiet_logging(os.path.join(os.path.dirname(db_path), f"reader-{index}.log"))
+    from datetime import datetime, timedelta
+    from sqlalchemy import func
+    from database import ReadSessionLocal, Activity
+
+    latencies, errors = [], {}
+    start_event.wait()
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        t = perf_counter()
+        try:
+            with ReadSessionLocal() as db:
+                # Leaderboard of the last hour and the newest messages of a chat, like the dashboard pages
+                since = datetime.now() - timedelta(hours=1)
+                db.query(Activity.user_id, func.count(Activity.id)).filter(Activity.ts >= since).group_by(Activity.user_id)\
+                    .order_by(func.count(Activity.id).desc()).limit(10).all()
+                db.query(Activity).filter(Activity.chat_id == CHATS[0]).order_by(Activity.id.desc()).limit(50).all()
+        except Exception as e:
+            key = type(e).__name__ + ": " + str(e).splitlines()[0][:80]
+            errors[key] = errors.get(key, 0) + 1
+            continue
+        latencies.append(perf_counter() - t)
+    results.put({"role": "reader", "latencies": latencies, "errors": errors})
+
+
+def run_mode(mode, args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix=f"engelbot-contention-{mode}-"), "bench.db")
+    ctx = multiprocessing.get_context("spawn")
+    # Schema first, so the processes do not race on create_all()
+    setup = ctx.Process(target=_init_database, args=(db_path, args.users))
+    setup.start()
+    setup.join()
+
+    start_event, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=writer_process, args=(db_path, mode, i, args, start_event, results)) for i in range(args.processes)]
+    procs += [ctx.Process(target=reader_process, args=(db_path, mode, i, args, start_event, results)) for i in range(args.readers)]
+    for p in procs:
+        p.start()
+    time.sleep(1) # let every process finish its imports before the clock starts
+    start_event.set()
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    writes = [v for r in reports if r["role"] == "writer" for v in r["latencies"]]
+    reads = [v for r in reports if r["role"] == "reader" for v in r["latencies"]]
+    errors = {}
+    for r in reports:
+        for key, count in r["errors"].items():
+            errors[key] = errors.get(key, 0) + count
+    return {
+        "messages": len(writes),
+        "msgs_per_s": round(len(writes) / args.duration, 1),
+        "write_latency_ms": latency_summary(writes),
+        "read_latency_ms": latency_summary(reads),
+        "errors": sum(errors.values()),
+        "error_kinds": errors,
+        "queue_waits": sum(r.get("queue_waits", 0) for r in reports),
+        "queue_wait_s": round(sum(r.get("queue_wait_s", 0) for r in reports), 3),
+        "db_bytes": db_size(db_path),
+    }
+
+
+def _init_database(db_path, users):
+    use_temp_database(db_path)
+    from database import init_db, engine, User
+    init_db()
+    # Known users, so concurrent first messages of a user do not collide on the insert
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": 100000 + i, "username": f"user{100000 + i}", "full_name": f"Nutzer {i}"} for i in range(users)])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        sys.exit(f"Unbekannte Modi: {', '.join(unknown)} (erlaubt: {', '.join(MODES)})")
+    print(f"Contention-Benchmark: {args.processes} Prozesse x {args.threads} Threads schreiben, {args.readers} lesen, je {args.duration:.0f}s", file=sys.stderr)
+    results = {}
+    for mode in modes:
+        res = results[mode] = run_mode(mode, args)
+        w, r = res["write_latency_ms"], res["read_latency_ms"]
+        print(f"  {mode:<8} {res['msgs_per_s']:>8} msg/s  Schreiben p50 {w.get('p50')} ms p99 {w.get('p99')} ms max {w.get('max')} ms  "
+              f"Lesen p50 {r.get('p50')} ms p99 {r.get('p99')} ms  Fehler {res['errors']}  Warteschlange {res['queue_waits']}x/{res['queue_wait_s']}s",
+              file=sys.stderr)
+        for kind, count in res["error_kinds"].items():
+            print(f"           {count}x {kind}", file=sys.stderr)
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    doc = write_results("contention", params, results, args.output)
+    if args.compare:
+        compare(args.compare, doc)
+    return doc
+
+
+if __name__ == "__main__":
+    main()
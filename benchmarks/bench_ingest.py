@@ -0,0 +1,136 @@
+"""Ingestion benchmark: fake updates through id_finder_bot.track_activity into a temporary SQLite DB.
+
+    python -m benchmarks.bench_ingest --messages 5000
+    python -m benchmarks.bench_ingest --rate 200 --duration 30 --compare benchmarks/results/ingest-....json
+
+Measures sustained messages per second, handler latency (overall and per
+message kind) and database growth, and writes the results as JSON.
+"""
+import os
+import sys
+import asyncio
+import argparse
+from time import perf_counter
+
+from benchmarks.common import use_temp_database, quiet_logging, data_size, wal_size, latency_summary, write_results, compare
+
+SIZE_SAMPLES = 20
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000, help="Anzahl Nachrichten (ignoriert mit --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Laufzeit in Sekunden statt fester Anzahl")
+    parser.add_argument("--rate", type=float, default=0, help="Zielrate in Nachrichten/s (0 = so schnell wie möglich)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Gleichzeitig verarbeitete Updates (PTB-Standard: 1)")
+    parser.add_argument("--mix", default=None, help="Nachrichtenmix, z.B. text=70,media=15,topic=10,command=5")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="SQLite-Datei (Standard: neue temporäre Datei)")
+    parser.add_argument("--output", default=None, help="JSON-Ausgabe ('-' = stdout, Standard: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Früheres Ergebnis (JSON) zum Vergleich")
+    return parser.parse_args(argv)
+
+
+async def run(args, track_activity, factory, measure):
+    latencies, by_kind, size_series = [], {}, []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    total = None if args.duration else args.messages
+    size_every = max(1, (total or int(args.rate * args.duration) or 10000) // SIZE_SAMPLES)
+    pending = set()
+
+    async def handle(kind, update):
+        try:
+            start = perf_counter()
+            await track_activity(update, None)
+            elapsed = perf_counter() - start
+            latencies.append(elapsed)
+            by_kind.setdefault(kind, []).append(elapsed)
+        finally:
+            semaphore.release()
+
+    start = perf_counter()
+    sent = 0
+    while True:
+        now = perf_counter()
+        if total is not None and sent >= total:
+            break
+        if args.duration and now - start >= args.duration:
+            break
+        if args.rate:
+            # Open loop: message n is due at start + n / rate, regardless of how long earlier ones took
+            due = start + sent / args.rate
+            if due > now:
+                await asyncio.sleep(due - now)
+        await semaphore.acquire()
+        kind, update = factory.make()
+        task = asyncio.create_task(handle(kind, update))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        sent += 1
+        if sent % size_every == 0:
+            size_series.append({"messages": sent, **measure()})
+    if pending:
+        await asyncio.gather(*pending)
+    elapsed = perf_counter() - start
+    size_series.append({"messages": sent, **measure()})
+    return sent, elapsed, latencies, by_kind, size_series
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_path = use_temp_database(args.db)
+    quiet_logging(os.path.join(os.path.dirname(db_path), "bench_ingest.log"))
+
+    from sqlalchemy import text
+    from database import engine, read_engine, init_db
+    from benchmarks.fake_updates import UpdateFactory, parse_mix
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots", "id_finder_bot"))
+    import id_finder_bot
+
+    init_db()
+    factory = UpdateFactory(seed=args.seed, users=args.users, mix=parse_mix(args.mix) if args.mix else None)
+
+    def measure():
+        # Data pages and WAL separately: the WAL grows and shrinks with checkpoints, the data does not
+        with read_engine.connect() as conn:
+            return {"bytes": data_size(conn), "wal_bytes": wal_size(db_path)}
+
+    start_bytes = measure()["bytes"]
+    print(f"Ingest-Benchmark: DB {db_path}", file=sys.stderr)
+    sent, elapsed, latencies, by_kind, size_series = asyncio.run(run(args, id_finder_bot.track_activity, factory, measure))
+    end_wal_bytes = wal_size(db_path)
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        rows = {table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in ("activities", "users", "topics", "log_entries")}
+    end_bytes = measure()["bytes"]
+
+    results = {
+        "messages": sent,
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(sent / elapsed, 1) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+        "latency_by_kind_ms": {kind: latency_summary(values) for kind, values in sorted(by_kind.items())},
+        "db": {
+            "start_bytes": start_bytes,
+            "end_bytes": end_bytes,
+            "end_wal_bytes": end_wal_bytes, # before the final checkpoint
+            "bytes_per_message": round((end_bytes - start_bytes) / sent, 1) if sent else None,
+            "rows": rows,
+            "growth": size_series,
+        },
+    }
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "db")}
+    doc = write_results("ingest", params, results, args.output)
+    lat = results["latency_ms"]
+    print(f"{sent} Nachrichten in {elapsed:.1f}s = {results['msgs_per_s']} msg/s, p50 {lat.get('p50')} ms, p99 {lat.get('p99')} ms, "
+          f"{results['db']['bytes_per_message']} Bytes/Nachricht", file=sys.stderr)
+    if args.compare:
+        compare(args.compare, doc)
+    return doc
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Dashboard query benchmark: the analytics and moderation routes over a seeded database.
+
+    python -m benchmarks.bench_routes --activities 200000
+    python -m benchmarks.seed --db /tmp/engelbot-10m.db --activities 10000000
+    python -m benchmarks.bench_routes --db /tmp/engelbot-10m.db --repeat 3
+
+Drives id_finder_analytics, api_user_activity, live_moderation,
+id_finder_dashboard and user_detail through Flask's test client and reports
+per case the latency (cold first call and warm calls), the SQL statements
+with their time and their ``EXPLAIN QUERY PLAN``.
+"""
+import os
+import sys
+import argparse
+from time import perf_counter
+
+from benchmarks.common import use_temp_database, quiet_logging, db_size, latency_summary, write_results, compare
+from benchmarks.seed import add_seed_arguments, fixture_from_args, seed_database
+
+ROUTES = ("id_finder_analytics", "api_user_activity", "live_moderation", "id_finder_dashboard", "user_detail")
+PLAN_WARNINGS = ("SCAN ", "USE TEMP B-TREE")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=None, help="Vorhandene (mit benchmarks.seed erzeugte) SQLite-Datei statt neuer Testdaten")
+    add_seed_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="Warme Aufrufe je Fall")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Kommagetrennte Auswahl der Routen")
+    parser.add_argument("--output", default=None, help="JSON-Ausgabe ('-' = stdout, Standard: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Früheres Ergebnis (JSON) zum Vergleich")
+    return parser.parse_args(argv)
+
+
+class QueryRecorder:
+    """Collects the SQL statements (with parameters and duration) the engines run while active."""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+
+        self.active = False
+        self.queries = []
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and context is not None:
+            context._bench_start = perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_bench_start", None)
+        if self.active and start is not None:
+            self.queries.append((statement, parameters, perf_counter() - start))
+
+    def start(self):
+        self.queries = []
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        return self.queries
+
+
+def query_plan(conn, statement, parameters):
+    """``EXPLAIN QUERY PLAN`` as indented lines, like the sqlite3 shell prints it."""
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def build_cases(engine, routes):
+    """(route, label, url) per case; users and chats are taken from the seeded data."""
+    from sqlalchemy import text, select, func
+    from database import Activity
+
+    with engine.connect() as conn:
+        ranked = conn.execute(text("SELECT user_id, COUNT(*) AS n FROM activities GROUP BY user_id ORDER BY n DESC")).fetchall()
+        chat = conn.execute(text("SELECT chat_id, thread_id FROM activities WHERE thread_id IS NOT NULL LIMIT 1")).first()
+        latest = conn.execute(select(func.max(Activity.ts))).scalar()
+    if not ranked:
+        raise RuntimeError("Die Datenbank enthält keine Aktivitäten (zuerst benchmarks.seed ausführen)")
+    top_user, median_user = ranked[0][0], ranked[len(ranked) // 2][0]
+    cases = {
+        "id_finder_analytics": [
+            ("alle", "/id-finder/analytics"),
+            ("30 Tage", "/id-finder/analytics?days=30"),
+            ("Monat", f"/id-finder/analytics?month={latest.month}&year={latest.year}"),
+        ],
+        "api_user_activity": [
+            ("aktivster Nutzer", f"/api/id-finder/user-activity/{top_user}"),
+            ("Median-Nutzer", f"/api/id-finder/user-activity/{median_user}"),
+            ("aktivster Nutzer, 30 Tage", f"/api/id-finder/user-activity/{top_user}?days=30"),
+        ],
+        "live_moderation": [("alle", "/live-moderation")],
+        "id_finder_dashboard": [("alle", "/id-finder")],
+        "user_detail": [
+            ("aktivster Nutzer", f"/user-detail/{top_user}"),
+            ("Median-Nutzer", f"/user-detail/{median_user}"),
+        ],
+    }
+    if chat:
+        cases["live_moderation"] += [
+            ("Chat", f"/live-moderation?chat_id={chat[0]}"),
+            ("Chat + Thema", f"/live-moderation?chat_id={chat[0]}&topic_id={chat[1]}"),
+        ]
+    return [(route, label, url) for route in routes for label, url in cases[route]]
+
+
+def run_case(client, recorder, engine, url, repeat):
+    recorder.start()
+    start = perf_counter()
+    response = client.get(url)
+    cold = perf_counter() - start
+    queries = recorder.stop()
+
+    warm = []
+    for _ in range(repeat):
+        start = perf_counter()
+        client.get(url)
+        warm.append(perf_counter() - start)
+
+    statements = {}
+    for statement, parameters, elapsed in queries:
+        entry = statements.setdefault(statement, {"sql": " ".join(statement.split()), "calls": 0, "ms": 0.0, "parameters": parameters})
+        entry["calls"] += 1
+        entry["ms"] += elapsed * 1000
+    with engine.connect() as conn:
+        for entry in statements.values():
+            try:
+                entry["plan"] = query_plan(conn, entry["sql"], entry.pop("parameters"))
+            except Exception as e:
+                entry["plan"] = [f"(kein Plan: {e})"]
+            entry["ms"] = round(entry["ms"], 3)
+            entry["warnings"] = [line.strip() for line in entry["plan"] if line.strip().startswith(PLAN_WARNINGS)]
+
+    return {
+        "url": url,
+        "status": response.status_code,
+        "bytes": len(response.get_data()),
+        "cold_ms": round(cold * 1000, 3),
+        "latency_ms": latency_summary(warm),
+        "queries": len(queries),
+        "db_ms": round(sum(q[2] for q in queries) * 1000, 3),
+        "statements": sorted(statements.values(), key=lambda e: -e["ms"]),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        raise SystemExit(f"Unbekannte Route(n): {', '.join(sorted(unknown))} (erlaubt: {', '.join(ROUTES)})")
+    seeded = args.db is None
+    db_path = use_temp_database(args.db)
+    quiet_logging(os.path.join(os.path.dirname(db_path), "bench_routes.log"))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_dashboard"))
+
+    from sqlalchemy import text
+    from database import engine, read_engine
+
+    if seeded:
+        print(f"Erzeuge Testdaten ({args.activities:,} Aktivitäten) in {db_path} ...", file=sys.stderr)
+        start = perf_counter()
+        seed_database(fixture_from_args(args))
+        print(f"Testdaten erzeugt in {perf_counter() - start:.1f}s", file=sys.stderr)
+
+    import app as dashboard
+    dashboard.is_setup_done = lambda: True
+    recorder = QueryRecorder(engine, read_engine)
+    client = dashboard.app.test_client()
+
+    with engine.connect() as conn:
+        rows = {table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in ("users", "activities", "topics", "moderation_logs")}
+    print(f"Routen-Benchmark: DB {db_path} ({db_size(db_path) / 1e6:.1f} MB, {rows['activities']:,} Aktivitäten)", file=sys.stderr)
+
+    cases = {}
+    for route, label, url in build_cases(engine, routes):
+        result = run_case(client, recorder, engine, url, args.repeat)
+        cases[f"{route}: {label}"] = result
+        lat = result["latency_ms"]
+        flags = f"  ! {len({w for s in result['statements'] for w in s['warnings']})} Plan-Warnungen" if any(s["warnings"] for s in result["statements"]) else ""
+        print(f"  {route + ': ' + label:<50} HTTP {result['status']}  kalt {result['cold_ms']:>9.1f} ms  p50 {lat.get('p50', 0):>9.1f} ms  "
+              f"{result['queries']:>3} SQL{flags}", file=sys.stderr)
+
+    results = {"db": {"bytes": db_size(db_path), "rows": rows}, "cases": cases}
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "db")}
+    if not seeded:
+        # The seed options only describe the data when the benchmark generated it
+        params = {"repeat": args.repeat, "routes": args.routes, "db": os.path.basename(db_path)}
+    doc = write_results("routes", params, results, args.output)
+    if args.compare:
+        compare(args.compare, doc)
+    return doc
+
+
+if __name__ == "__main__":
+    main()
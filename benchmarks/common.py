@@ -0,0 +1,131 @@
+"""Shared helpers of the benchmark scripts.
+
+``use_temp_database()`` must run before anything imports ``database``: the
+engine is created from SQLITE_DB_PATH at import time.
+"""
+import os
+import sys
+import json
+import math
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+
+def use_temp_database(path=None):
+    """Point the ``database`` module at a fresh SQLite file; returns its path."""
+    if "database" in sys.modules:
+        raise RuntimeError("use_temp_database() must run before 'database' is imported")
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="engelbot-bench-"), "bench.db")
+    os.environ["SQLITE_DB_PATH"] = path
+    # A configured server database must not be used (or filled) by a benchmark
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.pop("DATABASE_READ_URL", None)
+    for p in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "bots")):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    return path
+
+
+def quiet_logging(log_file):
+    """Configure the shared logging before the code under test does, without console output."""
+    from bot_logging import setup_logging
+    setup_logging("benchmark", log_file, console=False)
+
+
+def db_size(path):
+    """Bytes of the database including its WAL file."""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def wal_size(path):
+    """Bytes of the WAL file (0 right after a TRUNCATE checkpoint)."""
+    return os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0
+
+
+def data_size(conn):
+    """Bytes of data (page_count * page_size), including pages still in the WAL; independent of checkpoints."""
+    return conn.exec_driver_sql("PRAGMA page_count").scalar() * conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def latency_summary(samples):
+    """p50/p90/p99/max/mean in milliseconds of a list of durations in seconds."""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(values),
+        "mean": ms(sum(values) / len(values)),
+        "p50": ms(percentile(values, 0.50)),
+        "p90": ms(percentile(values, 0.90)),
+        "p99": ms(percentile(values, 0.99)),
+        "max": ms(values[-1]),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(name, params, results, output=None):
+    """Write the run as JSON (to ``output``, default benchmarks/results/<name>-<time>.json) and return the document."""
+    doc = {
+        "benchmark": name,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    if output == "-":
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+        return doc
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"Ergebnis gespeichert: {output}", file=sys.stderr)
+    return doc
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        items = {}
+        for k, v in value.items():
+            items.update(_flatten(v, f"{prefix}{k}."))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+
+def compare(previous_path, current):
+    """Print every numeric result next to the value of a previous run."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    old, new = _flatten(previous.get("results", {})), _flatten(current["results"])
+    print(f"\nVergleich mit {previous_path} ({previous.get('git')} -> {current.get('git')}):", file=sys.stderr)
+    for key in sorted(new):
+        if key not in old:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"  {key:<45} {old[key]:>14} -> {new[key]:>14}  {change}", file=sys.stderr)
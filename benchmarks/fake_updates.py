@@ -0,0 +1,79 @@
+"""Seeded generator of realistic Telegram updates for the ingestion benchmarks.
+
+Users follow a power law (few users write most messages), the message mix
+is configurable (text, media, forum topic posts, commands) and everything is
+reproducible from the seed.
+"""
+import random
+import itertools
+from datetime import datetime, timezone
+
+from telegram import Update, Message, Chat, User, PhotoSize, Video, Document, Sticker, Voice, MessageEntity
+
+DEFAULT_MIX = {"text": 70, "media": 15, "topic": 10, "command": 5}
+MEDIA_KINDS = ("photo", "video", "document", "sticker", "voice")
+COMMANDS = ("/id", "/start", "/help", "/player", "/stats")
+WORDS = ("hallo", "heute", "outfit", "danke", "gruppe", "bild", "morgen", "frage", "super", "wer", "kommt", "abend", "ja", "nein", "läuft")
+
+
+def parse_mix(spec):
+    """``"text=70,media=15"`` -> ``{"text": 70, "media": 15}``."""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unbekannte Nachrichtenart: {kind!r} (erlaubt: {', '.join(DEFAULT_MIX)})")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class UpdateFactory:
+    def __init__(self, seed=42, users=5000, chats=3, topics_per_chat=12, mix=None, zipf_exponent=1.1):
+        self.rng = random.Random(seed)
+        self.mix = mix or DEFAULT_MIX
+        self._kinds = list(self.mix)
+        self._kind_weights = list(itertools.accumulate(self.mix.values()))
+        self._users = [User(id=100000 + i, first_name=f"User{i}", is_bot=False, username=f"user{i}" if i % 4 else None) for i in range(users)]
+        # Power law: the user at rank r writes with weight 1 / r^s
+        self._user_weights = list(itertools.accumulate(1 / (r ** zipf_exponent) for r in range(1, users + 1)))
+        self._chats = [Chat(id=-1001000000000 - i, type=Chat.SUPERGROUP, title=f"Gruppe {i}", is_forum=True) for i in range(chats)]
+        self._topics = {chat.id: [1000 + t for t in range(topics_per_chat)] for chat in self._chats}
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(1)
+        self._file_id = itertools.count(1)
+
+    def _text(self, low=1, high=25):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def _media(self, kind):
+        file_id = f"F{next(self._file_id):010d}"
+        unique = file_id + "u"
+        if kind == "photo":
+            return {"photo": (PhotoSize(file_id + "s", unique + "s", 90, 90), PhotoSize(file_id, unique, 1280, 960))}
+        if kind == "video":
+            return {"video": Video(file_id, unique, 1280, 720, 12)}
+        if kind == "document":
+            return {"document": Document(file_id, unique, file_name="datei.pdf")}
+        if kind == "sticker":
+            return {"sticker": Sticker(file_id, unique, 512, 512, False, False, Sticker.REGULAR)}
+        return {"voice": Voice(file_id, unique, 5)}
+
+    def make(self):
+        """One update; returns ``(kind, Update)``."""
+        kind = self.rng.choices(self._kinds, cum_weights=self._kind_weights)[0]
+        user = self.rng.choices(self._users, cum_weights=self._user_weights)[0]
+        chat = self.rng.choice(self._chats)
+        fields = {"from_user": user}
+        if kind == "text":
+            fields["text"] = self._text()
+        elif kind == "media":
+            fields.update(self._media(self.rng.choice(MEDIA_KINDS)))
+            if self.rng.random() < 0.3:
+                fields["caption"] = self._text(1, 8)
+        elif kind == "topic":
+            fields.update(text=self._text(), message_thread_id=self.rng.choice(self._topics[chat.id]), is_topic_message=True)
+        else:
+            command = self.rng.choice(COMMANDS)
+            fields.update(text=command, entities=(MessageEntity(MessageEntity.BOT_COMMAND, 0, len(command)),))
+        message = Message(next(self._message_id), datetime.now(timezone.utc), chat, **fields)
+        return kind, Update(next(self._update_id), message=message)
@@ -0,0 +1,230 @@
+"""Seeded fixture generator: fills users, activities, topics and moderation_logs.
+
+    python -m benchmarks.seed --db /tmp/engelbot-10m.db --activities 10000000
+
+Users write with power-law weights (few users write most messages), message
+times follow a diurnal and weekly pattern over ``--days`` days and
+activities are inserted in time order, like the ID-Finder writes them. The
+same seed gives the same rows (timestamps relative to the current hour).
+"""
+import sys
+import bisect
+import random
+import argparse
+import itertools
+from time import perf_counter
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, quiet_logging, db_size
+
+BATCH_SIZE = 20000
+# Share of messages per hour of day (local group chat: quiet at night, peak in the evening)
+HOUR_WEIGHTS = (3, 2, 1, 1, 1, 1, 2, 4, 6, 7, 7, 8, 9, 8, 8, 8, 9, 10, 12, 14, 15, 13, 9, 5)
+# Monday .. Sunday
+WEEKDAY_WEIGHTS = (0.9, 0.9, 0.95, 1.0, 1.1, 1.3, 1.25)
+MSG_TYPES = (("text", 75), ("photo", 10), ("video", 3), ("sticker", 6), ("document", 2), ("voice", 2), ("command", 2))
+MOD_ACTIONS = (("warn", 60), ("delete", 25), ("mute", 10), ("ban", 5))
+WORDS = ("hallo", "heute", "outfit", "danke", "gruppe", "bild", "morgen", "frage", "super", "wer", "kommt", "abend", "ja", "nein", "läuft")
+FIRST_USER_ID = 100000
+FIRST_ADMIN_ID = 900000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument("--db", default=None, help="SQLite-Datei (Standard: neue temporäre Datei)")
+    return parser.parse_args(argv)
+
+
+def add_seed_arguments(parser):
+    parser.add_argument("--activities", type=int, default=200000, help="Anzahl Aktivitäten")
+    parser.add_argument("--users", type=int, default=None, help="Anzahl Nutzer (Standard: Aktivitäten / 200, mindestens 100)")
+    parser.add_argument("--chats", type=int, default=3)
+    parser.add_argument("--topics-per-chat", type=int, default=12)
+    parser.add_argument("--days", type=int, default=365, help="Zeitraum der Aktivitäten bis heute")
+    parser.add_argument("--moderation-rate", type=float, default=0.002, help="Moderationseinträge je Aktivität")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponent der Nutzerverteilung")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def _cumulative(pairs):
+    return [v for v, _ in pairs], list(itertools.accumulate(w for _, w in pairs))
+
+
+class Fixture:
+    """Generates the rows; ``seed_database()`` inserts them."""
+
+    def __init__(self, activities, users=None, chats=3, topics_per_chat=12, days=365, moderation_rate=0.002, zipf=1.1, seed=42, now=None):
+        self.rng = random.Random(seed)
+        self.activities = activities
+        self.users = users or max(100, activities // 200)
+        self.days = days
+        self.moderation_rate = moderation_rate
+        # Whole hours, so two runs with the same seed produce the same timestamps within an hour
+        self.end = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+        self.chats = [(-1001000000000 - i, f"Gruppe {i}") for i in range(chats)]
+        self.topics = {chat_id: [1000 + t for t in range(topics_per_chat)] for chat_id, _ in self.chats}
+        # Power law: the user at rank r writes with weight 1 / r^s; ranks are shuffled over the IDs
+        ids = list(range(FIRST_USER_ID, FIRST_USER_ID + self.users))
+        self.rng.shuffle(ids)
+        self.user_ids = ids
+        self.user_weights = list(itertools.accumulate(1 / (r ** zipf) for r in range(1, self.users + 1)))
+        self.msg_types, self.msg_type_weights = _cumulative(MSG_TYPES)
+        self.mod_actions, self.mod_action_weights = _cumulative(MOD_ACTIONS)
+        self.hour_weights = list(itertools.accumulate(HOUR_WEIGHTS))
+
+    def pick_user(self):
+        return self.user_ids[bisect.bisect_left(self.user_weights, self.rng.random() * self.user_weights[-1])]
+
+    def _day_counts(self):
+        """Messages per day: weekday pattern, slow growth over the period and some noise."""
+        weights = []
+        for d in range(self.days):
+            day = self.start + timedelta(days=d)
+            weights.append(WEEKDAY_WEIGHTS[day.weekday()] * (0.6 + 0.8 * d / max(1, self.days - 1)) * self.rng.uniform(0.8, 1.2))
+        total = sum(weights)
+        counts = [int(self.activities * w / total) for w in weights]
+        for i in range(self.activities - sum(counts)):
+            counts[-1 - i % self.days] += 1
+        return counts
+
+    def _day_times(self, day, n):
+        times = []
+        for _ in range(n):
+            hour = bisect.bisect_left(self.hour_weights, self.rng.random() * self.hour_weights[-1])
+            times.append(day + timedelta(hours=hour, seconds=self.rng.randrange(3600)))
+        times.sort()
+        return times
+
+    def _text(self, low=1, high=20):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def activity_rows(self):
+        """Activities in time order, as dicts for ``insert()``."""
+        message_ids = {chat_id: itertools.count(1) for chat_id, _ in self.chats}
+        file_ids = itertools.count(1)
+        rng = self.rng
+        for d, count in enumerate(self._day_counts()):
+            for ts in self._day_times(self.start + timedelta(days=d), count):
+                chat_id, chat_title = rng.choice(self.chats)
+                kind = rng.choices(self.msg_types, cum_weights=self.msg_type_weights)[0]
+                has_media = kind not in ("text", "command")
+                row = {
+                    "ts": ts, "chat_id": chat_id, "chat_type": "supergroup", "chat_title": chat_title,
+                    "thread_id": rng.choice(self.topics[chat_id]) if rng.random() < 0.3 else None,
+                    "message_id": next(message_ids[chat_id]), "user_id": self.pick_user(),
+                    "msg_type": "text" if kind == "command" else kind, "has_media": has_media,
+                    "media_kind": kind if has_media else None, "file_id": f"F{next(file_ids):010d}" if has_media else None,
+                    "is_command": kind == "command", "is_deleted": rng.random() < 0.01,
+                }
+                if kind == "command":
+                    row["text"] = rng.choice(("/id", "/start", "/help", "/player", "/stats"))
+                elif not has_media or rng.random() < 0.3:
+                    row["text"] = self._text()
+                else:
+                    row["text"] = None
+                yield row
+
+    def user_rows(self, first_seen, last_seen):
+        """Users with first/last seen taken from their activities; users without messages lurk since the start."""
+        for user_id in sorted(self.user_ids):
+            yield {
+                "id": user_id,
+                "username": f"user{user_id}" if user_id % 4 else None,
+                "full_name": f"Nutzer {user_id - FIRST_USER_ID}",
+                "first_seen": first_seen.get(user_id, self.start),
+                "last_seen": last_seen.get(user_id, self.start),
+                "is_blocked": self.rng.random() < 0.005,
+            }
+
+    def topic_rows(self):
+        for chat_id, _ in self.chats:
+            for topic_id in self.topics[chat_id]:
+                yield {"chat_id": chat_id, "topic_id": topic_id, "name": f"Thema {topic_id - 999}"}
+
+    def moderation_rows(self):
+        """Moderation actions hit the same heavy writers, spread uniformly over the period."""
+        total = int(self.activities * self.moderation_rate)
+        span = (self.end - self.start).total_seconds()
+        times = sorted(self.start + timedelta(seconds=self.rng.uniform(0, span)) for _ in range(total))
+        for ts in times:
+            yield {
+                "ts": ts, "chat_id": self.rng.choice(self.chats)[0], "user_id": self.pick_user(),
+                "admin_id": FIRST_ADMIN_ID + self.rng.randrange(5),
+                "action": self.rng.choices(self.mod_actions, cum_weights=self.mod_action_weights)[0],
+                "reason": self.rng.choice(("Spam", "Flood", "Beleidigung", "Werbung", None)),
+                "message_id": self.rng.randrange(1, 1 + max(1, self.activities // len(self.chats))),
+            }
+
+
+def _insert_batches(conn, table, rows, on_batch=None):
+    inserted = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return inserted
+        conn.execute(table.insert(), batch)
+        conn.commit()
+        inserted += len(batch)
+        if on_batch:
+            on_batch(inserted)
+
+
+def seed_database(fixture, progress=True):
+    """Insert the fixture into the configured database; returns the row counts."""
+    from database import engine, init_db, rebuild_user_summaries, rebuild_user_search, User, Activity, Topic, ModerationLog
+
+    init_db()
+    with engine.connect() as conn:
+        if conn.execute(Activity.__table__.select().limit(1)).first():
+            raise RuntimeError("Die Datenbank enthält bereits Aktivitäten; Testdaten nur in eine leere Datenbank schreiben")
+    first_seen, last_seen = {}, {}
+
+    def tracked(rows):
+        for row in rows:
+            uid = row["user_id"]
+            first_seen.setdefault(uid, row["ts"])
+            last_seen[uid] = row["ts"]
+            yield row
+
+    def report(n):
+        if progress and n % (BATCH_SIZE * 25) == 0:
+            print(f"  {n:,} / {fixture.activities:,} Aktivitäten", file=sys.stderr)
+
+    with engine.connect() as conn:
+        # first_seen/last_seen come from the activities, so the users are inserted after them
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            activities = _insert_batches(conn, Activity.__table__, tracked(fixture.activity_rows()), report)
+            users = _insert_batches(conn, User.__table__, fixture.user_rows(first_seen, last_seen))
+            topics = _insert_batches(conn, Topic.__table__, fixture.topic_rows())
+            moderation = _insert_batches(conn, ModerationLog.__table__, fixture.moderation_rows())
+            # Counters and daily histogram the ID-Finder maintains at ingest
+            rebuild_user_summaries(conn)
+            rebuild_user_search(conn)
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    return {"users": users, "activities": activities, "topics": topics, "moderation_logs": moderation}
+
+
+def fixture_from_args(args):
+    return Fixture(args.activities, users=args.users, chats=args.chats, topics_per_chat=args.topics_per_chat, days=args.days,
+                   moderation_rate=args.moderation_rate, zipf=args.zipf, seed=args.seed)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_path = use_temp_database(args.db)
+    quiet_logging(db_path + ".log")
+    print(f"Erzeuge Testdaten in {db_path} ...", file=sys.stderr)
+    start = perf_counter()
+    rows = seed_database(fixture_from_args(args))
+    print(f"Fertig in {perf_counter() - start:.1f}s: {rows}, {db_size(db_path) / 1e6:.1f} MB", file=sys.stderr)
+    return db_path
+
+
+if __name__ == "__main__":
+    main()
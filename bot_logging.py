@@ -0,0 +1,265 @@
+"""Shared logging setup for the bots, the bot host and the dashboard.
+
+Logging calls only put the record on an in-memory queue (``QueueHandler``).
+A ``QueueListener`` thread does the disk work: it writes the text log file
+of each bot (rotated by size) and stores every record as a structured row in
+the ``log_entries`` table, the index the dashboard searches by bot, level
+and time range.
+
+Usage, once per process before the first log call::
+
+    from bot_logging import setup_logging
+    setup_logging("quiz", os.path.join(BASE_DIR, "quiz_bot.log"))
+
+Inside the bot host the host configures logging; the call in a plugin is then
+a no-op and the host routes the plugin's records with ``add_route()``.
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from sqlalchemy import insert, delete
+
+from database import engine, LogEntry
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# LOG_JSON=1 prints JSON lines on stdout instead of text (for docker log collectors)
+CONSOLE_JSON = os.environ.get("LOG_JSON", "").lower() in ("1", "true", "yes")
+# httpx logs every Bot API request at INFO, with the bot token in the URL
+QUIET_LOGGERS = {"httpx": logging.WARNING, "httpcore": logging.WARNING}
+# Bot tokens (123456:ABC-...) as they appear in api.telegram.org/bot<token>/... URLs
+BOT_TOKEN_PATTERN = re.compile(r"bot\d+:[\w-]+")
+
+INDEX_LEVEL = logging.INFO
+INDEX_FLUSH_SECONDS = 2
+INDEX_BATCH_SIZE = 500
+INDEX_RETENTION_DAYS = 14
+INDEX_PRUNE_SECONDS = 3600
+# Writing the index would log again through these loggers
+INDEX_EXCLUDED_LOGGERS = ("sqlalchemy",)
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName", "bot"}
+
+_listener = None
+
+
+def redact(text):
+    """``text`` with bot tokens replaced by ``bot***``."""
+    return BOT_TOKEN_PATTERN.sub("bot***", text) if text else text
+
+
+def structured(record):
+    """The record as a JSON-serialisable dict (fields passed with ``extra`` go to ``context``)."""
+    context = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+    return {
+        "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+        "bot": getattr(record, "bot", None),
+        "level": record.levelname,
+        "logger": record.name,
+        "message": redact(record.getMessage()),
+        "exc": redact(record.exc_text),
+        "context": context or None,
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(structured(record), ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The message is rendered in the calling thread (the args may change afterwards);
+        # the traceback is kept separate from the message so the index can store both.
+        record = logging.makeLogRecord(vars(record))
+        record.message = redact(record.getMessage())
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.exc_text = redact(record.exc_text)
+        return record
+
+
+class LogIndexHandler(logging.Handler):
+    """Buffers records and inserts them into ``log_entries`` in batches."""
+
+    def __init__(self, level=INDEX_LEVEL):
+        super().__init__(level)
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._last_prune = 0
+        self._table_ready = False
+
+    def emit(self, record):
+        if record.name.startswith(INDEX_EXCLUDED_LOGGERS):
+            return
+        row = structured(record)
+        self._rows.append({
+            "ts": datetime.fromtimestamp(record.created),
+            "bot": row["bot"] or "unknown",
+            "level": record.levelno,
+            "logger": record.name,
+            "message": row["message"],
+            "exc": row["exc"],
+            "context": json.loads(json.dumps(row["context"], default=str)) if row["context"] else None,
+        })
+        if len(self._rows) >= INDEX_BATCH_SIZE or time.monotonic() - self._last_flush >= INDEX_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        rows, self._rows = self._rows, []
+        try:
+            if not self._table_ready:
+                # Processes may log before init_db() ran
+                LogEntry.__table__.create(engine, checkfirst=True)
+                self._table_ready = True
+            with engine.begin() as conn:
+                if rows:
+                    conn.execute(insert(LogEntry), rows)
+                if time.monotonic() - self._last_prune >= INDEX_PRUNE_SECONDS:
+                    self._last_prune = time.monotonic()
+                    conn.execute(delete(LogEntry).where(LogEntry.ts < datetime.now() - timedelta(days=INDEX_RETENTION_DAYS)))
+        except Exception as e:
+            # Never through logging: that would end up here again
+            print(f"Log-Index: {len(rows)} Einträge verworfen ({type(e).__name__}: {e})", file=sys.stderr)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class _Route:
+    def __init__(self, bot, handler, logger_name=None, thread_prefix=None):
+        self.bot = bot
+        self.handler = handler
+        self.logger_name = logger_name
+        self.thread_prefix = thread_prefix
+
+    def matches(self, record):
+        if self.thread_prefix:
+            return record.threadName.startswith(self.thread_prefix)
+        return record.name == self.logger_name or record.name.startswith(self.logger_name + ".")
+
+
+class _Dispatcher(logging.Handler):
+    """Runs in the listener thread: tags each record with its bot and hands it to the handlers.
+
+    The process handlers (own log file, console) receive every record, a route's
+    file only the records of its bot.
+    """
+
+    def __init__(self, bot, handlers, index):
+        super().__init__()
+        self.bot = bot
+        self.handlers = handlers
+        self.index = index
+        self.routes = ()
+
+    def emit(self, record):
+        route = next((r for r in self.routes if r.matches(record)), None)
+        record.bot = route.bot if route else self.bot
+        if route:
+            route.handler.handle(record)
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        if record.levelno >= self.index.level:
+            self.index.handle(record)
+
+    def close(self):
+        for handler in (*self.handlers, *(r.handler for r in self.routes), self.index):
+            handler.close()
+        super().close()
+
+
+class _Listener(QueueListener):
+    def dequeue(self, block):
+        # Wake up regularly so buffered index rows are written even when nothing else is logged
+        while True:
+            try:
+                return self.queue.get(block, timeout=INDEX_FLUSH_SECONDS)
+            except queue.Empty:
+                self.dispatcher.index.flush()
+
+
+def file_handler(path, fmt=LOG_FORMAT):
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(fmt))
+    return handler
+
+
+def setup_logging(bot, log_file, level=logging.INFO, fmt=LOG_FORMAT, console=None):
+    """Configure the root logger of this process for ``bot``.
+
+    ``console`` defaults to logging on stdout only when it is a terminal or
+    LOG_JSON is set: the dashboard redirects the stdout of the bots it starts
+    into a file, where the records would otherwise be written a second time.
+
+    Does nothing if logging was already set up in this process (a plugin
+    started by the bot host).
+    """
+    global _listener
+    if _listener is not None:
+        return
+    if console is None:
+        console = CONSOLE_JSON or sys.stdout.isatty()
+
+    handlers = [file_handler(log_file, fmt)]
+    if console:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if CONSOLE_JSON else logging.Formatter(fmt))
+        handlers.append(stream)
+    dispatcher = _Dispatcher(bot, handlers, LogIndexHandler())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, quiet_level in QUIET_LOGGERS.items():
+        logging.getLogger(name).setLevel(quiet_level)
+
+    _listener = _Listener(log_queue, dispatcher)
+    _listener.dispatcher = dispatcher
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def add_route(bot, log_file, logger_name=None, thread_prefix=None, fmt=LOG_FORMAT):
+    """Send the records of ``logger_name`` (or of threads named ``thread_prefix*``) to their own file as ``bot``."""
+    route = _Route(bot, file_handler(log_file, fmt), logger_name, thread_prefix)
+    dispatcher = _listener.dispatcher
+    dispatcher.routes = (*dispatcher.routes, route)
+    return route
+
+
+def remove_route(route):
+    dispatcher = _listener.dispatcher
+    dispatcher.routes = tuple(r for r in dispatcher.routes if r is not route)
+    route.handler.close()
+
+
+def shutdown_logging():
+    """Write out everything still queued. Registered with atexit by setup_logging()."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    listener.dispatcher.close()
@@ -0,0 +1,297 @@
+"""Single-process bot host.
+
+Loads the bots as plugins into one asyncio process instead of one Python
+process per bot. All plugins share the interpreter, the SQLAlchemy engine from
+``database.py`` and one HTTP connection pool for Bot API calls. A crash or bad
+config in one bot only stops that bot.
+
+The dashboard controls the host through two JSON files in ``data/``:
+``bot_host_control.json`` holds the desired state per bot (written by the
+dashboard), ``bot_host_status.json`` the actual state (written by the host).
+"""
+import os
+import sys
+import json
+import signal
+import asyncio
+import logging
+import tempfile
+import threading
+import importlib.util
+from datetime import datetime
+
+BOTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BOTS_DIR)
+sys.path.append(PROJECT_ROOT)
+
+from database import init_db
+from bot_logging import setup_logging, add_route, remove_route
+from bot_metrics import start_exporter
+
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+CONTROL_FILE = os.path.join(DATA_DIR, "bot_host_control.json")
+STATUS_FILE = os.path.join(DATA_DIR, "bot_host_status.json")
+LOG_FILE = os.path.join(BOTS_DIR, "bot_host.log")
+
+CONTROL_POLL_SECONDS = 2
+STOP_TIMEOUT_SECONDS = 30
+
+# Plugins call setup_logging() too; in this process that is a no-op and their records are routed below
+setup_logging("host", LOG_FILE)
+logger = logging.getLogger("bot_host")
+
+from telegram.ext import ApplicationBuilder
+from telegram.request import HTTPXRequest
+
+# kind "ptb": module provides build_application(builder) -> Application | None
+# kind "telebot": module provides main() (blocking) and stop()
+PLUGINS = {
+    "quiz": {"script": os.path.join(BOTS_DIR, "quiz_bot", "quiz_bot.py"), "kind": "ptb", "logger": "quiz_bot"},
+    "umfrage": {"script": os.path.join(BOTS_DIR, "umfrage_bot", "umfrage_bot.py"), "kind": "ptb", "logger": "umfrage_bot"},
+    "invite": {"script": os.path.join(BOTS_DIR, "invite_bot", "invite_bot.py"), "kind": "ptb", "logger": "invite_bot"},
+    "id_finder": {"script": os.path.join(BOTS_DIR, "id_finder_bot", "id_finder_bot.py"), "kind": "ptb", "logger": "id_finder_bot"},
+    "minecraft": {"script": os.path.join(BOTS_DIR, "id_finder_bot", "minecraft_bridge.py"), "kind": "ptb", "logger": "minecraft_bridge"},
+    # The outfit bot logs through the root logger; its records are routed by thread name instead.
+    "outfit": {"script": os.path.join(BOTS_DIR, "outfit_bot", "outfit_bot.py"), "kind": "telebot", "logger": None},
+}
+
+
+def load_json(path, default):
+    try:
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading JSON from {path}: {e}")
+        return default
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.error(f"Error saving JSON to {path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class SharedRequest(HTTPXRequest):
+    """HTTPXRequest shared by all hosted PTB bots.
+
+    Every Bot initializes and shuts down its request object; the connection
+    pool is only closed when the last bot using it has shut down.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._users = 0
+
+    async def initialize(self):
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self):
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await super().shutdown()
+
+
+class Plugin:
+    def __init__(self, name, spec, request):
+        self.name = name
+        self.spec = spec
+        self.request = request
+        self.task = None
+        self.stop_event = asyncio.Event()
+        self.status = {"running": False, "error": None, "since": None}
+        self._log_route = None
+
+    def _load_module(self):
+        # A fresh module per start so config and module globals are re-read like on a process start
+        module_name = os.path.splitext(os.path.basename(self.spec["script"]))[0]
+        module_spec = importlib.util.spec_from_file_location(module_name, self.spec["script"])
+        module = importlib.util.module_from_spec(module_spec)
+        sys.modules[module_name] = module
+        module_spec.loader.exec_module(module)
+        return module
+
+    def _attach_log_handler(self):
+        log_path = os.path.splitext(self.spec["script"])[0] + ".log"
+        if self.spec["logger"]:
+            self._log_route = add_route(self.name, log_path, logger_name=self.spec["logger"])
+        else:
+            self._log_route = add_route(self.name, log_path, thread_prefix=self.name)
+
+    def _detach_log_handler(self):
+        if not self._log_route:
+            return
+        remove_route(self._log_route)
+        self._log_route = None
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.stop_event = asyncio.Event()
+        self.task = asyncio.create_task(self._run(), name=f"plugin-{self.name}")
+
+    async def stop(self):
+        if not self.task or self.task.done():
+            return
+        self.stop_event.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task), timeout=STOP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Plugin '{self.name}' did not stop within {STOP_TIMEOUT_SECONDS}s, cancelling.")
+            self.task.cancel()
+
+    async def _run(self):
+        self._attach_log_handler()
+        self.status = {"running": True, "error": None, "since": datetime.now().isoformat(timespec="seconds")}
+        logger.info(f"Starting plugin '{self.name}'...")
+        try:
+            module = self._load_module()
+            if self.spec["kind"] == "ptb":
+                await self._run_ptb(module)
+            else:
+                await self._run_telebot(module)
+            self.status = {"running": False, "error": None, "since": datetime.now().isoformat(timespec="seconds")}
+            logger.info(f"Plugin '{self.name}' stopped.")
+        except asyncio.CancelledError:
+            self.status = {"running": False, "error": "cancelled", "since": datetime.now().isoformat(timespec="seconds")}
+            raise
+        except (Exception, SystemExit) as e:
+            # Isolation: one broken bot never takes the host or the other bots down
+            logger.error(f"Plugin '{self.name}' failed: {type(e).__name__}: {e}", exc_info=not isinstance(e, (SystemExit, RuntimeError)))
+            self.status = {"running": False, "error": f"{type(e).__name__}: {e}", "since": datetime.now().isoformat(timespec="seconds")}
+        finally:
+            self._detach_log_handler()
+
+    async def _run_ptb(self, module):
+        app = module.build_application(ApplicationBuilder().request(self.request))
+        if app is None:
+            raise RuntimeError("Konfiguration unvollständig (siehe Log des Bots).")
+
+        # Mirrors Application.run_polling(), which cannot be used because it owns the event loop
+        await app.initialize()
+        try:
+            if app.post_init:
+                await app.post_init(app)
+            await app.start()
+            if getattr(module, "POLL_UPDATES", True):
+                await app.updater.start_polling(allowed_updates=getattr(module, "ALLOWED_UPDATES", None))
+            await self.stop_event.wait()
+        finally:
+            if app.updater and app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+                if app.post_stop:
+                    await app.post_stop(app)
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+
+    async def _run_telebot(self, module):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def _target():
+            try:
+                module.main()
+            except BaseException as e:
+                loop.call_soon_threadsafe(lambda: finished.done() or finished.set_exception(e))
+            else:
+                loop.call_soon_threadsafe(lambda: finished.done() or finished.set_result(None))
+
+        threading.Thread(target=_target, name=self.name, daemon=True).start()
+        stop_waiter = asyncio.ensure_future(self.stop_event.wait())
+        try:
+            await asyncio.wait({finished, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop_waiter.cancel()
+        if not finished.done():
+            await asyncio.to_thread(module.stop)
+            await finished
+        elif not self.stop_event.is_set():
+            finished.result()
+            raise RuntimeError("Polling beendet.")
+
+
+class BotHost:
+    def __init__(self):
+        self.request = SharedRequest(connection_pool_size=128)
+        self.plugins = {name: Plugin(name, spec, self.request) for name, spec in PLUGINS.items()}
+        self.shutdown_event = asyncio.Event()
+        self._control_mtime = None
+        self._desired = {}
+        self._last_status = None
+
+    def _read_control(self):
+        try:
+            mtime = os.path.getmtime(CONTROL_FILE)
+        except OSError:
+            return self._desired
+        if mtime != self._control_mtime:
+            self._control_mtime = mtime
+            control = load_json(CONTROL_FILE, {})
+            self._desired = {name: bool(control.get(name)) for name in self.plugins}
+        return self._desired
+
+    def _write_status(self):
+        status = {name: plugin.status for name, plugin in self.plugins.items()}
+        if status != self._last_status:
+            save_json(STATUS_FILE, status)
+            self._last_status = {name: dict(s) for name, s in status.items()}
+
+    async def _reconcile(self):
+        desired = self._read_control()
+        for name, plugin in self.plugins.items():
+            running = plugin.task is not None and not plugin.task.done()
+            if desired.get(name) and not running and not plugin.status.get("error"):
+                plugin.start()
+            elif not desired.get(name) and running:
+                await plugin.stop()
+            elif not desired.get(name):
+                # Clear a previous error so a new start request from the dashboard is honoured
+                plugin.status["error"] = None
+        self._write_status()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.shutdown_event.set)
+            except NotImplementedError:
+                pass
+
+        init_db()
+        # Before the plugins start so their metrics are served on the host's port
+        start_exporter("host")
+        logger.info(f"Bot-Host gestartet. Plugins: {', '.join(self.plugins)}")
+        try:
+            while not self.shutdown_event.is_set():
+                try:
+                    await self._reconcile()
+                except Exception as e:
+                    logger.error(f"Error in control loop: {e}")
+                try:
+                    await asyncio.wait_for(self.shutdown_event.wait(), timeout=CONTROL_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            logger.info("Bot-Host wird beendet...")
+            await asyncio.gather(*(plugin.stop() for plugin in self.plugins.values()), return_exceptions=True)
+            self._write_status()
+
+
+def main():
+    asyncio.run(BotHost().serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Performance metrics of the bots.
+
+Counts updates (total and per second over the last minute), measures the lag
+between a message's date and its processing, the latency of every handler
+callback and how long ``run_in_executor`` calls wait for a free thread.
+
+``instrument_application()`` hooks a python-telegram-bot Application
+(TypeHandler in group -1, wrapped handler callbacks, instrumented default
+executor), ``instrument_telebot()`` a pyTelegramBotAPI bot. Both start a
+local HTTP exporter (``/metrics`` in Prometheus text format, ``/metrics.json``
+for the dashboard) on the bot's port from ``metrics.BOT_METRICS_PORTS``;
+inside the bot host all plugins share the host's exporter.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import logging
+import functools
+import threading
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry, BOT_METRICS_HOST, BOT_METRICS_PORTS
+
+logger = logging.getLogger(__name__)
+
+# Message dates only have second resolution, so lag below 1s is noise
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600)
+RATE_WINDOW_SECONDS = 60
+
+# Update fields checked in this order to name the update type
+_UPDATE_TYPES = (
+    "message", "edited_message", "channel_post", "edited_channel_post", "callback_query", "inline_query",
+    "poll_answer", "poll", "chat_join_request", "chat_member", "my_chat_member", "message_reaction",
+)
+
+registry = Registry()
+UPDATES = registry.counter("bot_updates_total", "Updates received", ("bot", "type"))
+UPDATE_LAG = registry.histogram("bot_update_lag_seconds", "Time between the date of a message/join request and its processing", ("bot",), buckets=LAG_BUCKETS)
+HANDLER_SECONDS = registry.histogram("bot_handler_seconds", "Handler callback latency", ("bot", "handler"))
+HANDLER_ERRORS = registry.counter("bot_handler_errors_total", "Handler callbacks that raised", ("bot", "handler"))
+EXECUTOR_WAIT = registry.histogram("bot_executor_wait_seconds", "Time a run_in_executor call waited for a free thread", ("pool",))
+
+_rates = {}
+_executors = []
+_exporter = None
+
+
+class _RateWindow:
+    """Events per second over the last ``seconds`` seconds, one counter slot per second."""
+
+    def __init__(self, seconds=RATE_WINDOW_SECONDS):
+        self.seconds = seconds
+        self._counts = [0] * seconds
+        self._stamps = [0] * seconds
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        now = int(time.time())
+        i = now % self.seconds
+        with self._lock:
+            if self._stamps[i] != now:
+                self._stamps[i] = now
+                self._counts[i] = 0
+            self._counts[i] += n
+
+    def rate(self):
+        now = int(time.time())
+        with self._lock:
+            return sum(c for c, s in zip(self._counts, self._stamps) if now - s < self.seconds) / self.seconds
+
+
+registry.gauge("bot_updates_per_second", f"Updates per second over the last {RATE_WINDOW_SECONDS}s", ("bot",),
+               fn=lambda: [({"bot": bot}, window.rate()) for bot, window in list(_rates.items())])
+registry.gauge("bot_executor_queue_depth", "run_in_executor calls waiting for a free thread", ("pool",),
+               fn=lambda: [({"pool": e.pool}, e.queued) for e in _executors])
+
+
+def record_update(bot, kind, sent_at=None):
+    """Count one update; ``sent_at`` is the Unix time the message was sent, if known."""
+    UPDATES.inc(bot=bot, type=kind)
+    window = _rates.get(bot)
+    if window is None:
+        window = _rates.setdefault(bot, _RateWindow())
+    window.add()
+    if sent_at is not None:
+        UPDATE_LAG.observe(max(0.0, time.time() - sent_at), bot=bot)
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports its queue depth and the wait time of each call."""
+
+    def __init__(self, pool, **kwargs):
+        super().__init__(thread_name_prefix=pool, **kwargs)
+        self.pool = pool
+        self.queued = 0
+        self._queued_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = perf_counter()
+
+        def run():
+            with self._queued_lock:
+                self.queued -= 1
+            EXECUTOR_WAIT.observe(perf_counter() - submitted, pool=self.pool)
+            return fn(*args, **kwargs)
+
+        with self._queued_lock:
+            self.queued += 1
+        try:
+            return super().submit(run)
+        except Exception:
+            with self._queued_lock:
+                self.queued -= 1
+            raise
+
+
+def install_executor():
+    """Replace the default executor of the running loop (once per loop)."""
+    loop = asyncio.get_running_loop()
+    if getattr(loop, "_bot_metrics_executor", None):
+        return
+    # Same size as asyncio's own default executor
+    executor = InstrumentedExecutor("executor", max_workers=min(32, (os.cpu_count() or 1) + 4))
+    loop.set_default_executor(executor)
+    loop._bot_metrics_executor = executor
+    _executors.append(executor)
+
+
+def _timed(callback, bot, name):
+    if inspect.iscoroutinefunction(callback):
+        from telegram.ext import ApplicationHandlerStop
+
+        @functools.wraps(callback)
+        async def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                HANDLER_ERRORS.inc(bot=bot, handler=name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(perf_counter() - start, bot=bot, handler=name)
+    else:
+        @functools.wraps(callback)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(bot=bot, handler=name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(perf_counter() - start, bot=bot, handler=name)
+    timed._bot_metrics = True
+    return timed
+
+
+def _wrap_ptb_handler(handler, bot):
+    from telegram.ext import ConversationHandler
+
+    if isinstance(handler, ConversationHandler):
+        nested = [*handler.entry_points, *handler.fallbacks]
+        for state_handlers in handler.states.values():
+            nested += state_handlers
+        for sub in nested:
+            _wrap_ptb_handler(sub, bot)
+        return
+    callback = getattr(handler, "callback", None)
+    if callback is None or getattr(callback, "_bot_metrics", False):
+        return
+    handler.callback = _timed(callback, bot, getattr(callback, "__qualname__", type(handler).__name__))
+
+
+def _ptb_update_date(update):
+    message = update.message or update.channel_post
+    if message:
+        return message.date
+    for event in (update.chat_join_request, update.chat_member, update.my_chat_member):
+        if event:
+            return event.date
+    return None
+
+
+def instrument_application(app, bot):
+    """Instrument a PTB Application. Call after all handlers were added."""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _wrap_ptb_handler(handler, bot)
+
+    async def count_update(update, context):
+        kind = next((t for t in _UPDATE_TYPES if getattr(update, t, None) is not None), "other")
+        date = _ptb_update_date(update)
+        record_update(bot, kind, date.timestamp() if date else None)
+
+    # Group -1 runs before every other group and does not stop them
+    app.add_handler(TypeHandler(Update, count_update), group=-1)
+
+    post_init = app.post_init
+
+    async def _post_init(application):
+        install_executor()
+        if post_init:
+            await post_init(application)
+
+    app.post_init = _post_init
+    start_exporter(bot)
+    return app
+
+
+def instrument_telebot(tb, bot):
+    """Instrument a pyTelegramBotAPI bot. Call after all handlers were registered."""
+    for attr, handlers in vars(tb).items():
+        if not attr.endswith("_handlers") or not isinstance(handlers, list):
+            continue
+        for handler in handlers:
+            if isinstance(handler, dict) and "function" in handler and not getattr(handler["function"], "_bot_metrics", False):
+                handler["function"] = _timed(handler["function"], bot, handler["function"].__qualname__)
+
+    process_new_updates = tb.process_new_updates
+
+    def counted(updates):
+        for update in updates:
+            kind = next((t for t in _UPDATE_TYPES if getattr(update, t, None) is not None), "other")
+            message = update.message or update.channel_post
+            event = message or update.chat_join_request or update.chat_member or update.my_chat_member
+            record_update(bot, kind, event.date if event else None)
+        return process_new_updates(updates)
+
+    tb.process_new_updates = counted
+    start_exporter(bot)
+    return tb
+
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = registry.render().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter(bot):
+    """Serve the metrics of this process on the port of ``bot``; no-op if already serving."""
+    global _exporter
+    if _exporter is not None or bot not in BOT_METRICS_PORTS:
+        return
+    try:
+        _exporter = ThreadingHTTPServer((BOT_METRICS_HOST, BOT_METRICS_PORTS[bot]), _ExporterHandler)
+    except OSError as e:
+        logger.warning(f"Metrics-Export auf {BOT_METRICS_HOST}:{BOT_METRICS_PORTS[bot]} nicht möglich: {e}")
+        return
+    _exporter.daemon_threads = True
+    threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info(f"Metrics-Export auf http://{BOT_METRICS_HOST}:{BOT_METRICS_PORTS[bot]}/metrics")
@@ -3,6 +3,7 @@ import os
 import json
 import sys
 import asyncio
+import time
 from datetime import datetime
 from typing import Dict, Any, List
 
@@ -10,8 +11,14 @@ from typing import Dict, Any, List
 BOT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(BOT_DIR))
 sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(BOT_DIR))
 
-from database import SessionLocal, User, Activity, Topic, Broadcast, ModerationLog, init_db
+from database import SessionLocal, User, Activity, Topic, Broadcast, ModerationLog, init_db, count_user_message, checkpoint_wal, WAL_CHECKPOINT_INTERVAL_SECONDS, IS_SQLITE
+from bot_logging import setup_logging
+from activity_archive import run_archive, DEFAULT_RETENTION_DAYS, DEFAULT_ARCHIVE_MONTHS, ARCHIVE_INTERVAL_SECONDS
+from moderation import expire_warnings, record_warning, load_moderation_config, EXPIRE_INTERVAL_SECONDS, MODERATION_CONFIG_FILE, DEFAULT_MUTE_MINUTES
+from spam_filter import SpamFilter
+from bot_metrics import instrument_application
 
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -20,15 +27,11 @@ CONFIG_FILE = os.path.join(BOT_DIR, "id_finder_config.json")
 
 # --- Logging ---
 LOG_FILE = os.path.join(BOT_DIR, "id_finder_bot.log")
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s",
-    level=logging.INFO,
-    handlers=[logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler(sys.stdout)]
-)
+setup_logging("id_finder", LOG_FILE, fmt="%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 try:
-    from telegram import Update, ForumTopic
+    from telegram import Update, ForumTopic, ChatPermissions
     from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes, Application
 except ImportError:
     logger.error("Erforderliche Bibliothek 'python-telegram-bot' nicht gefunden!")
@@ -36,6 +39,11 @@ except ImportError:
 
 # --- Globals & Locks ---
 CONFIG_CACHE = {}
+SPAM_CONFIG_CHECK_SECONDS = 30
+SPAM_STATE = {"filter": SpamFilter(), "cfg": {}, "mtime": None, "checked": None}
+SPAM_RULE_NAMES = {"flood": "Flood", "chat_flood": "Gruppen-Flood", "duplicate": "Wiederholung", "link": "Link", "keyword": "Stichwort"}
+ADMIN_CACHE_SECONDS = 600
+ADMIN_CACHE = {} # chat_id -> (monotonic time of the lookup, admin user ids)
 
 # --- Config Management ---
 def validate_config(cfg: Dict[str, Any]) -> bool:
@@ -96,9 +104,11 @@ async def log_activity_db(entry: Dict[str, Any]):
                 has_media=entry["has_media"],
                 media_kind=entry["media_kind"],
                 file_id=entry["file_id"],
-                is_command=entry["is_command"]
+                is_command=entry["is_command"],
+                is_deleted=entry.get("is_deleted", False)
             )
             session.add(activity)
+            count_user_message(session, entry["user_id"], activity.ts, entry["has_media"])
             session.commit()
             
     loop = asyncio.get_running_loop()
@@ -175,10 +185,80 @@ async def send_scheduled_broadcast(context: ContextTypes.DEFAULT_TYPE, broadcast
         logger.error(f"Fehler beim Senden von Broadcast {broadcast_id}: {e}")
         await update_broadcast_status(broadcast_id, "error", error_msg=str(e))
 
+# --- Spam/Flood Rules ---
+def current_spam_filter() -> SpamFilter:
+    # Rebuilt (with empty counters) when moderation_config.json changes; the file is checked every 30s
+    now = time.monotonic()
+    if SPAM_STATE["checked"] is None or now - SPAM_STATE["checked"] >= SPAM_CONFIG_CHECK_SECONDS:
+        SPAM_STATE["checked"] = now
+        try: mtime = os.path.getmtime(MODERATION_CONFIG_FILE)
+        except OSError: mtime = None
+        if mtime != SPAM_STATE["mtime"]:
+            cfg = load_moderation_config()
+            SPAM_STATE.update(filter=SpamFilter(cfg), cfg=cfg, mtime=mtime)
+    return SPAM_STATE["filter"]
+
+async def chat_admin_ids(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> set:
+    # Looked up only when a rule hits, then cached per chat; on API errors the last known list is kept
+    now = time.monotonic()
+    cached = ADMIN_CACHE.get(chat_id)
+    if cached and now - cached[0] < ADMIN_CACHE_SECONDS:
+        return cached[1]
+    try:
+        admins = {member.user.id for member in await context.bot.get_chat_administrators(chat_id)}
+    except Exception as e:
+        logger.warning(f"Spam-Filter: Admins von {chat_id} konnten nicht geladen werden: {e}")
+        admins = cached[1] if cached else set()
+    ADMIN_CACHE[chat_id] = (now, admins)
+    return admins
+
+async def handle_spam(context: ContextTypes.DEFAULT_TYPE, msg, user, chat, verdict):
+    rule, detail, action = verdict
+    reason = f"Spam-Filter ({SPAM_RULE_NAMES.get(rule, rule)}): {detail}"
+    cfg = SPAM_STATE["cfg"]
+    logger.info(f"{reason} – Nachricht {msg.message_id} von {user.id} in {chat.id}, Aktion: {action}")
+    try:
+        await msg.delete()
+    except Exception as e:
+        logger.warning(f"Spam-Filter: Nachricht {msg.message_id} in {chat.id} konnte nicht gelöscht werden: {e}")
+
+    def _sync():
+        with SessionLocal() as session:
+            escalation = None
+            if action == "warn":
+                _, escalation = record_warning(session, chat.id, user.id, cfg, admin_id=context.bot.id, reason=reason, message_id=msg.message_id)
+            else:
+                session.add(ModerationLog(chat_id=chat.id, user_id=user.id, admin_id=context.bot.id, action=action, reason=reason, message_id=msg.message_id))
+            session.commit()
+            return escalation
+
+    loop = asyncio.get_running_loop()
+    escalation = await loop.run_in_executor(None, _sync)
+    if action == "mute":
+        escalation = ("mute", cfg.get("mute_minutes", DEFAULT_MUTE_MINUTES))
+    if not escalation: return
+    try:
+        if escalation[0] == "ban":
+            await context.bot.ban_chat_member(chat.id, user.id)
+        else:
+            await context.bot.restrict_chat_member(chat.id, user.id, ChatPermissions.no_permissions(), until_date=int(time.time()) + escalation[1] * 60)
+    except Exception as e:
+        logger.error(f"Spam-Filter: {escalation[0]} für {user.id} in {chat.id} fehlgeschlagen: {e}")
+
 # --- Activity Tracking ---
 async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg, user, chat = update.effective_message, update.effective_user, update.effective_chat
     if not all([msg, user, chat]): return
+
+    # In-memory rules, applied whether or not messages are logged. Only new messages: edits are no
+    # flood. Messages sent on behalf of a chat (channels, anonymous admins) and admins are exempt.
+    verdict = None
+    if chat.type in ["group", "supergroup"] and update.message is not None and not msg.sender_chat:
+        verdict = current_spam_filter().check(chat.id, user.id, msg.text or msg.caption, time.monotonic())
+        if verdict and user.id in await chat_admin_ids(context, chat.id):
+            verdict = None
+        if verdict:
+            await handle_spam(context, msg, user, chat, verdict)
     
     # Check if logging is enabled
     if not CONFIG_CACHE.get("message_logging_enabled", True): return
@@ -230,11 +310,45 @@ async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "has_media": has_media,
         "media_kind": media_kind,
         "file_id": file_id,
-        "is_command": msg.text.startswith("/") if msg.text else False
+        "is_command": msg.text.startswith("/") if msg.text else False,
+        "is_deleted": verdict is not None
     }
 
     await log_activity_db(log_entry)
 
+# --- Activity Archive ---
+async def archive_activities(context: ContextTypes.DEFAULT_TYPE):
+    def _sync():
+        return run_archive(
+            CONFIG_CACHE.get("activity_retention_days", DEFAULT_RETENTION_DAYS),
+            CONFIG_CACHE.get("activity_archive_months", DEFAULT_ARCHIVE_MONTHS),
+        )
+
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _sync)
+    except Exception as e:
+        logger.error(f"Fehler beim Archivieren alter Aktivitäten: {e}")
+
+# --- WAL Checkpoint ---
+async def checkpoint_database(context: ContextTypes.DEFAULT_TYPE):
+    # One process is enough: the ID-Finder writes the most and always runs
+    try:
+        loop = asyncio.get_running_loop()
+        busy, wal_pages, checkpointed = await loop.run_in_executor(None, checkpoint_wal)
+        if busy:
+            logger.info(f"WAL-Checkpoint nicht abgeschlossen ({checkpointed}/{wal_pages} Seiten), nächster Versuch beim nächsten Lauf.")
+    except Exception as e:
+        logger.error(f"Fehler beim WAL-Checkpoint: {e}")
+
+# --- Warning Expiry ---
+async def expire_warnings_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, expire_warnings)
+    except Exception as e:
+        logger.error(f"Fehler beim Ablaufen von Verwarnungen: {e}")
+
 # --- Commands ---
 async def get_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.effective_message
@@ -254,21 +368,23 @@ async def get_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
-def main():
+ALLOWED_UPDATES = Update.ALL_TYPES
+
+def build_application(builder=None):
     if not os.path.exists(CONFIG_FILE):
         logger.critical("Konfigurationsdatei fehlt!")
-        sys.exit(1)
+        return None
         
     with open(CONFIG_FILE, "r") as f:
         try: config = json.load(f)
-        except: sys.exit(1)
+        except: return None
     
-    if not validate_config(config): sys.exit(1)
+    if not validate_config(config): return None
         
     global CONFIG_CACHE
     CONFIG_CACHE = config
 
-    app = ApplicationBuilder().token(config["bot_token"]).build()
+    app = (builder or ApplicationBuilder()).token(config["bot_token"]).build()
     
     # Handle all messages to log them
     app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, track_activity))
@@ -279,8 +395,21 @@ def main():
     # Specific handlers
     app.add_handler(MessageHandler(filters.StatusUpdate.FORUM_TOPIC_CREATED, handle_topic_creation))
 
+    if app.job_queue:
+        app.job_queue.run_repeating(archive_activities, interval=ARCHIVE_INTERVAL_SECONDS, first=300)
+        app.job_queue.run_repeating(expire_warnings_job, interval=EXPIRE_INTERVAL_SECONDS, first=60)
+        if IS_SQLITE:
+            app.job_queue.run_repeating(checkpoint_database, interval=WAL_CHECKPOINT_INTERVAL_SECONDS, first=WAL_CHECKPOINT_INTERVAL_SECONDS)
+    else:
+        logger.warning("job_queue nicht verfügbar – alte Aktivitäten werden nicht archiviert, Verwarnungen verfallen nicht, kein WAL-Checkpoint.")
+    return instrument_application(app, "id_finder")
+
+def main():
+    app = build_application()
+    if not app: sys.exit(1)
+
     logger.info("ID-Finder Bot startet (SQL Mode)...")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,20 @@
 import os
+import sys
+import copy
 import json
+import hashlib
 import asyncio
 import logging
+import random
 import re
 import time
 import socket
-from datetime import datetime, timezone
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, Tuple, List
 
-from telegram import Update
-from telegram.ext import CommandHandler, ContextTypes, Application
+from telegram import Bot, Update
+from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, Application
 
 # Try importing mcstatus, handle potential missing dependency
 try:
@@ -19,22 +24,37 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
-# ✅ Globaler Lock gegen doppelte Nachrichten / Parallelität
-_status_lock = asyncio.Lock()
+# ✅ Lock pro Server gegen doppelte Nachrichten / Parallelität
+_status_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+# Primary server keeps its message state in the top-level config keys
+PRIMARY_KEY = "default"
+STATUS_JOB_PREFIX = "mc_status:"
+SYNC_JOBS_SECONDS = 60
 
 
 # --- Paths -------------------------------------------------------------------
 def _project_root() -> str:
+    # bots/id_finder_bot -> bots -> project root
     here = os.path.dirname(os.path.abspath(__file__))
-    return os.path.dirname(here)
+    return os.path.dirname(os.path.dirname(here))
+
+
+sys.path.append(_project_root())
+sys.path.append(os.path.join(_project_root(), "bots"))
+
+from database import SessionLocal, McStatusSample, McStatusBucket, init_db
+from bot_logging import setup_logging
+from bot_metrics import instrument_application
 
 
 def _find_config_path() -> str:
     here = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(here)
+    project_root = _project_root()
     # Search in multiple locations for robustness
     candidates = [
         os.path.join(project_root, "data", "minecraft_status_config.json"),
+        os.path.join(os.path.dirname(here), "data", "minecraft_status_config.json"),
         os.path.join(here, "minecraft_status_config.json"),
         os.path.join(project_root, "minecraft_status_config.json"),
         os.path.join(project_root, "MinecraftServerStatus", "minecraft_status_config.json"),
@@ -52,10 +72,15 @@ DATA_DIR = os.path.join(_project_root(), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 STATUS_CACHE_PATH = os.path.join(DATA_DIR, "minecraft_status_cache.json")
+ID_FINDER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "id_finder_config.json")
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "minecraft_bridge.log")
 
 
 # --- Config ------------------------------------------------------------------
 DEFAULT_CFG: Dict[str, Any] = {
+    # Eigener Bot-Token; leer = Token des ID-Finder Bots (dann nur Status, ohne /player)
+    "bot_token": "",
+
     # Anzeige-Name
     "name": "Minecraft Server",
 
@@ -81,43 +106,66 @@ DEFAULT_CFG: Dict[str, Any] = {
 
     "status_message_id": None,
     "status_message_created_at": None,  # Timestamp der Statusmessage (für Rotation < 48h)
+
+    # Weitere Server: Liste von Objekten mit denselben Schlüsseln wie oben
+    # (name, mc_host, mc_port, display_host, display_port, chat_id, topic_id).
+    # Nicht gesetzte Schlüssel werden von oben übernommen.
+    "servers": [],
 }
 
 
-def _load_cfg() -> Dict[str, Any]:
-    cfg = dict(DEFAULT_CFG)
-    if not os.path.exists(CONFIG_PATH):
-        return cfg
+# Parsed config plus the (mtime_ns, size) it was read at; the file is only re-read when that changes
+_cfg_cache: Dict[str, Any] = {"stamp": None, "cfg": None}
+
+
+def _cfg_stamp() -> Optional[Tuple[int, int]]:
     try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-        if isinstance(raw, dict):
-            cfg.update(raw)
-        return cfg
-    except Exception as e:
-        log.error("Could not read %s: %s", CONFIG_PATH, e)
-        return dict(DEFAULT_CFG)
+        st = os.stat(CONFIG_PATH)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_cfg() -> Dict[str, Any]:
+    stamp = _cfg_stamp()
+    if stamp is None:
+        return copy.deepcopy(DEFAULT_CFG)
+    if stamp != _cfg_cache["stamp"]:
+        cfg = copy.deepcopy(DEFAULT_CFG)
+        try:
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if isinstance(raw, dict):
+                cfg.update(raw)
+        except Exception as e:
+            log.error("Could not read %s: %s", CONFIG_PATH, e)
+            return copy.deepcopy(DEFAULT_CFG)
+        _cfg_cache.update(stamp=stamp, cfg=cfg)
+    # Callers modify the result (message state), so hand out a copy
+    return copy.deepcopy(_cfg_cache["cfg"])
 
 
-def _atomic_write_json(path: str, data: Dict[str, Any]) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+def _atomic_write_json(path: str, data: Dict[str, Any]) -> bool:
+    """Write ``data`` via a temp file and rename; returns False (after logging) if that failed."""
     tmp_path = f"{path}.tmp"
     try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
         os.replace(tmp_path, path)
+        return True
     except Exception as e:
         log.error(f"Failed to atomic write {path}: {e}")
         if os.path.exists(tmp_path):
             try: os.remove(tmp_path)
             except: pass
+        return False
 
 
 def _save_cfg(cfg: Dict[str, Any]) -> None:
-    try:
-        _atomic_write_json(CONFIG_PATH, cfg)
-    except Exception as e:
-        log.error("Could not write %s: %s", CONFIG_PATH, e)
+    # The cache only takes the new config once it is on disk; otherwise it keeps matching the file
+    if _atomic_write_json(CONFIG_PATH, cfg):
+        _cfg_cache.update(stamp=_cfg_stamp(), cfg=copy.deepcopy(cfg))
 
 
 # --- Helpers ------------------------------------------------------------------
@@ -148,35 +196,177 @@ def _cfg_display_host_port(cfg: Dict[str, Any], host: str, port: int) -> Tuple[s
     return display_host, display_port
 
 
+def _server_key(entry: Dict[str, Any]) -> str:
+    host, port = _cfg_host_port(entry)
+    return str(entry.get("id") or f"{host}:{port}")
+
+
+def _server_from_cfg(key: str, src: Dict[str, Any], parent: Dict[str, Any]) -> Dict[str, Any]:
+    # Chat, topic and timings are inherited from the top level, host/port never
+    merged = {k: parent.get(k) for k in ("chat_id", "topic_id", "timeout_seconds", "update_seconds")}
+    merged.update({k: v for k, v in src.items() if v not in (None, "")})
+    host, port = _cfg_host_port(merged)
+    display_host, display_port = _cfg_display_host_port(merged, host, port)
+    try:
+        every = max(10, min(int(merged.get("update_seconds") or 30), 3600))
+    except Exception:
+        every = 30
+    return {
+        "key": key,
+        "name": str(merged.get("name") or "Minecraft Server").strip(),
+        "host": host,
+        "port": port,
+        "display_host": display_host,
+        "display_port": display_port,
+        "chat_id": str(merged.get("chat_id") or "").strip(),
+        "topic_id": merged.get("topic_id"),
+        "timeout_seconds": int(merged.get("timeout_seconds") or 5),
+        "update_seconds": every,
+    }
+
+
+def _cfg_servers(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """All monitored servers: the top-level server (if configured) plus ``cfg["servers"]``."""
+    servers: List[Dict[str, Any]] = []
+    if _cfg_host_port(cfg)[0]:
+        servers.append(_server_from_cfg(PRIMARY_KEY, cfg, cfg))
+    seen = {PRIMARY_KEY}
+    for entry in cfg.get("servers") or []:
+        if not isinstance(entry, dict) or not _cfg_host_port(entry)[0]:
+            continue
+        key = _server_key(entry)
+        if key in seen:
+            log.warning("Minecraft bridge: duplicate server %s ignored.", key)
+            continue
+        seen.add(key)
+        servers.append(_server_from_cfg(key, entry, cfg))
+    return servers
+
+
+def _message_state_target(cfg: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    # The primary server keeps its message in the top-level keys (used by the dashboard reset)
+    if key == PRIMARY_KEY:
+        return cfg
+    for entry in cfg.get("servers") or []:
+        if isinstance(entry, dict) and _cfg_host_port(entry)[0] and _server_key(entry) == key:
+            return entry
+    return None
+
+
+def _set_message_state(key: str, msg_id: Optional[int], created_at: Optional[str]) -> None:
+    # Re-read the config so dashboard edits and other servers' message ids are not overwritten.
+    # No await between load and save, so this is atomic within the event loop.
+    cfg = _load_cfg()
+    target = _message_state_target(cfg, key)
+    if target is None:
+        return
+    target["status_message_id"] = msg_id
+    target["status_message_created_at"] = created_at
+    _save_cfg(cfg)
+
+
+# --- Probing --------------------------------------------------------------------
+# SRV lookups are cached; the A/AAAA lookup stays with the OS resolver because the
+# handshake must carry the hostname (proxies route virtual hosts by it).
+DNS_CACHE_SECONDS = 300
+# /player answers from a probe at most this old instead of probing again
+PLAYER_CACHE_SECONDS = 15
+# Upper limit for the exponential backoff while a server is unreachable
+BACKOFF_MAX_SECONDS = 600
+
+# (host, port) -> (expires_at, JavaServer)
+_dns_cache: Dict[Tuple[str, int], Tuple[float, Any]] = {}
+# key -> (probed_at, status, ping_ms, error); error is re-raised to every reader
+_probe_results: Dict[str, Tuple[float, Any, Optional[int], Optional[Exception]]] = {}
+# key -> {"failures": n, "next_probe_at": monotonic}
+_health: Dict[str, Dict[str, float]] = {}
+# key -> running probe, shared by the status job and concurrent /player commands
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+async def _lookup(host: str, port: int, timeout_seconds: int):
+    cached = _dns_cache.get((host, port))
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    server = await JavaServer.async_lookup(f"{host}:{port}", timeout=timeout_seconds)
+    _dns_cache[(host, port)] = (time.monotonic() + DNS_CACHE_SECONDS, server)
+    return server
+
+
 async def _fetch_status(host: str, port: int, timeout_seconds: int) -> Tuple[Any, int]:
     if not JavaServer:
         raise ImportError("mcstatus library not installed")
 
     timeout_seconds = max(1, min(int(timeout_seconds or 5), 15))
-    
-    def _blocking():
+
+    async def _query():
         t0 = time.monotonic()
-        # Lookup can also take time (DNS), so we include it in the measurement/timeout logic implicitly via wrapper
-        server = JavaServer.lookup(f"{host}:{port}")
-        st = server.status()
-        duration = time.monotonic() - t0
-        ping_ms = int(duration * 1000)
+        # Lookup can also take time (DNS/SRV), so it counts towards ping and timeout
+        server = await _lookup(host, port, timeout_seconds)
+        st = await server.async_status()
+        ping_ms = int((time.monotonic() - t0) * 1000)
         return st, ping_ms
 
     try:
-        return await asyncio.wait_for(
-            asyncio.to_thread(_blocking),
-            timeout=timeout_seconds
-        )
-    except asyncio.TimeoutError:
-        raise TimeoutError(f"Connection timed out after {timeout_seconds}s")
-    except socket.gaierror:
-        raise OSError("DNS resolution failed")
-    except ConnectionRefusedError:
-        raise OSError("Connection refused")
+        return await asyncio.wait_for(_query(), timeout=timeout_seconds)
+    except Exception as e:
+        # A failed probe may be caused by a moved server, so resolve again next time
+        _dns_cache.pop((host, port), None)
+        if isinstance(e, asyncio.TimeoutError):
+            raise TimeoutError(f"Connection timed out after {timeout_seconds}s")
+        if isinstance(e, socket.gaierror):
+            raise OSError("DNS resolution failed")
+        if isinstance(e, ConnectionRefusedError):
+            raise OSError("Connection refused")
+        raise
+
+
+async def _probe(server: Dict[str, Any]) -> Tuple[Any, int]:
+    key = server["key"]
+    health = _health.setdefault(key, {"failures": 0, "next_probe_at": 0.0})
+    try:
+        status, ping_ms = await _fetch_status(server["host"], server["port"], server["timeout_seconds"])
     except Exception as e:
-        # Re-raise as is or wrap if needed
-        raise e
+        health["failures"] += 1
+        # Exponential backoff while offline: interval, 2x, 4x, ... up to BACKOFF_MAX_SECONDS
+        delay = min(BACKOFF_MAX_SECONDS, server["update_seconds"] * 2 ** (health["failures"] - 1))
+        health["next_probe_at"] = time.monotonic() + delay
+        _probe_results[key] = (time.monotonic(), None, None, e)
+        if health["failures"] == 1:
+            log.info(f"Minecraft Server {server['host']}:{server['port']} offline/unreachable: {type(e).__name__}: {e}")
+        else:
+            log.debug("Minecraft Server %s still offline (%s failures), next probe in %ss.", key, int(health["failures"]), int(delay))
+        raise
+    if health["failures"]:
+        log.info(f"Minecraft Server {server['host']}:{server['port']} wieder erreichbar nach {int(health['failures'])} Fehlversuchen.")
+    health.update(failures=0, next_probe_at=0.0)
+    _probe_results[key] = (time.monotonic(), status, ping_ms, None)
+    return status, ping_ms
+
+
+async def _get_status(server: Dict[str, Any], max_age: float = 0) -> Tuple[Any, int]:
+    """Status of a server, probing only if needed.
+
+    The last result is reused if it is younger than ``max_age`` or the server is
+    in backoff; otherwise callers share one in-flight probe.
+    """
+    key = server["key"]
+    now = time.monotonic()
+    cached = _probe_results.get(key)
+    in_backoff = now < _health.get(key, {}).get("next_probe_at", 0.0)
+    if cached and (now - cached[0] <= max_age or in_backoff):
+        _probed_at, status, ping_ms, error = cached
+        if error:
+            raise error
+        return status, ping_ms
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_probe(server))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield: a cancelled /player must not cancel the probe the job is waiting for
+    return await asyncio.shield(task)
 
 
 def _sanitize_text(s: str) -> str:
@@ -269,13 +459,116 @@ def _status_to_cache(
     return base
 
 
-def _write_status_cache(cache: Dict[str, Any]) -> None:
+# Latest snapshot per server key, written as one file for the dashboard
+_status_cache: Dict[str, Dict[str, Any]] = {}
+
+# --- Change detection ---
+# Fields that change on every probe; they alone do not justify a disk write
+_CACHE_VOLATILE_FIELDS = ("last_update", "ping_ms")
+# Unchanged snapshots are still written this often so the dashboard sees a fresh last_update/ping
+CACHE_HEARTBEAT_SECONDS = 300
+
+_cache_digests: Dict[str, str] = {}
+_cache_written_at = 0.0
+# key -> (message_id, digest of the text last shown in that message)
+_text_digests: Dict[str, Tuple[int, str]] = {}
+
+
+def _digest(data: Any) -> str:
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _store_snapshot(key: str, snapshot: Dict[str, Any]) -> None:
+    """Keeps the snapshot in memory and writes the cache file only if something significant changed."""
+    _status_cache[key] = snapshot
+    digest = _digest({k: v for k, v in snapshot.items() if k not in _CACHE_VOLATILE_FIELDS})
+    changed = _cache_digests.get(key) != digest
+    _cache_digests[key] = digest
+    if changed or time.monotonic() - _cache_written_at >= CACHE_HEARTBEAT_SECONDS:
+        _write_status_cache()
+
+
+def _write_status_cache() -> None:
+    global _cache_written_at
+    _cache_written_at = time.monotonic()
+    # Top level keeps the primary server for older readers, all servers live under "servers"
+    cache = dict(_status_cache.get(PRIMARY_KEY) or {})
+    cache["servers"] = dict(_status_cache)
     try:
         _atomic_write_json(STATUS_CACHE_PATH, cache)
     except Exception as e:
         log.error("Could not write status cache %s: %s", STATUS_CACHE_PATH, e)
 
 
+# --- History ------------------------------------------------------------------
+HISTORY_RAW_HOURS = 48
+# Bucket size in seconds -> retention in days
+HISTORY_BUCKETS = {300: 30, 3600: 730}
+HISTORY_PRUNE_SECONDS = 3600
+
+
+def _bucket_start(ts: datetime, resolution: int) -> datetime:
+    # Bucket sizes divide an hour, so the hour is always a bucket boundary
+    offset = (ts.minute * 60 + ts.second) // resolution * resolution
+    return ts.replace(minute=0, second=0, microsecond=0) + timedelta(seconds=offset)
+
+
+def _record_sample(key: str, ts: datetime, online: bool, player_count: Optional[int], ping_ms: Optional[int]) -> None:
+    """Stores one raw sample and folds it into the 5-minute and hourly buckets in one transaction."""
+    with SessionLocal() as session:
+        session.add(McStatusSample(server_key=key, ts=ts, online=online, player_count=player_count, ping_ms=ping_ms))
+        for resolution in HISTORY_BUCKETS:
+            start = _bucket_start(ts, resolution)
+            bucket = session.get(McStatusBucket, (key, resolution, start))
+            if not bucket:
+                bucket = McStatusBucket(server_key=key, resolution=resolution, bucket_start=start, samples=0, online_samples=0, player_sum=0, ping_sum=0)
+                session.add(bucket)
+            bucket.samples += 1
+            if not online:
+                continue
+            bucket.online_samples += 1
+            if player_count is not None:
+                bucket.player_min = player_count if bucket.player_min is None else min(bucket.player_min, player_count)
+                bucket.player_max = player_count if bucket.player_max is None else max(bucket.player_max, player_count)
+                bucket.player_sum += player_count
+            if ping_ms is not None:
+                bucket.ping_min = ping_ms if bucket.ping_min is None else min(bucket.ping_min, ping_ms)
+                bucket.ping_max = ping_ms if bucket.ping_max is None else max(bucket.ping_max, ping_ms)
+                bucket.ping_sum += ping_ms
+        session.commit()
+
+
+async def _record_history(key: str, snapshot: Dict[str, Any]) -> None:
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, _record_sample, key, datetime.utcnow(),
+            bool(snapshot.get("server_online")), snapshot.get("player_count"), snapshot.get("ping_ms"),
+        )
+    except Exception as e:
+        log.error("Minecraft bridge: could not store history sample for %s: %s", key, e)
+
+
+async def _prune_history(context: ContextTypes.DEFAULT_TYPE):
+    def _sync():
+        now = datetime.utcnow()
+        with SessionLocal() as session:
+            removed = session.query(McStatusSample).filter(McStatusSample.ts < now - timedelta(hours=HISTORY_RAW_HOURS)).delete(synchronize_session=False)
+            for resolution, days in HISTORY_BUCKETS.items():
+                removed += session.query(McStatusBucket).filter(
+                    McStatusBucket.resolution == resolution,
+                    McStatusBucket.bucket_start < now - timedelta(days=days),
+                ).delete(synchronize_session=False)
+            session.commit()
+            return removed
+    try:
+        removed = await asyncio.get_running_loop().run_in_executor(None, _sync)
+        if removed:
+            log.info("Minecraft bridge: pruned %s old history rows.", removed)
+    except Exception as e:
+        log.error("Minecraft bridge: history pruning failed: %s", e)
+
+
 def _fmt_status_text(status, display_host: str, display_port: int, name: str) -> str:
     try:
         motd = _sanitize_text(_motd_plain(status)).replace("\n", " ").strip()
@@ -313,78 +606,69 @@ def _fmt_status_text(status, display_host: str, display_port: int, name: str) ->
 
 
 # --- Telegram Status Job ------------------------------------------------------
-async def _send_or_edit_status(context: ContextTypes.DEFAULT_TYPE):
-    if not context.job: return # Safety check
-
-    async with _status_lock:
-        cfg = _load_cfg()
-        host, port = _cfg_host_port(cfg)
-        name = str(cfg.get("name") or "Minecraft Server").strip()
-        timeout_seconds = int(cfg.get("timeout_seconds") or 5)
-        display_host, display_port = _cfg_display_host_port(cfg, host, port)
-        chat_id = str(cfg.get("chat_id", "")).strip()
-        topic_id = cfg.get("topic_id")
-
+async def _update_server(bot: Bot, server: Dict[str, Any]) -> None:
+    key = server["key"]
+    host, port = server["host"], server["port"]
+    name = server["name"]
+    display_host, display_port = server["display_host"], server["display_port"]
+    chat_id = server["chat_id"]
+    topic_id = server["topic_id"]
+
+    async with _status_locks[key]:
         if not host:
             # Silent return if no host configured (yet)
             return
 
-        if not chat_id:
-            # Log only once or nicely if chat_id missing
-            return
-
-        try:
-            chat_id_int = int(chat_id)
-        except Exception:
-            log.warning("Minecraft bridge: chat_id not int: %r", chat_id)
-            return
-
-        thread_id: Optional[int] = None
-        if topic_id not in (None, "", "null"):
-            try:
-                thread_id = int(str(topic_id).strip())
-            except Exception:
-                thread_id = None
-
         # --- Fetch status + cache schreiben ---
         text: str
-        status = None
-        ping_ms = None
-        error_msg = None
-        
         try:
-            status, ping_ms = await _fetch_status(host, port, timeout_seconds)
+            status, ping_ms = await _get_status(server)
             text = _fmt_status_text(status, display_host, display_port, name)
-            
-            cache = _status_to_cache(
+            snapshot = _status_to_cache(
                 ok=True,
                 host=host, port=port,
                 display_host=display_host, display_port=display_port,
                 name=name, status=status, ping_ms=ping_ms
             )
-            _write_status_cache(cache)
-            
         except Exception as e:
             error_msg = f"{type(e).__name__}: {e}"
-            log.info(f"Minecraft Server {host}:{port} offline/unreachable: {error_msg}")
-            
+
             text = (
                 f"🔴 Offline\n"
                 f"⛏️ {name}\n"
                 f"🌐 {display_host}:{display_port}\n\n"
                 f"Der Server ist gerade nicht erreichbar."
             )
-            cache = _status_to_cache(
+            snapshot = _status_to_cache(
                 ok=False,
                 host=host, port=port,
                 display_host=display_host, display_port=display_port,
                 name=name, status=None, ping_ms=None,
                 error=error_msg
             )
-            _write_status_cache(cache)
+        _store_snapshot(key, snapshot)
+        await _record_history(key, snapshot)
 
-        # --- msg_id normalisieren ---
-        msg_id_raw = cfg.get("status_message_id")
+        if not chat_id:
+            # Without a chat the server is only monitored for the dashboard
+            return
+
+        try:
+            chat_id_int = int(chat_id)
+        except Exception:
+            log.warning("Minecraft bridge: chat_id not int for %s: %r", key, chat_id)
+            return
+
+        thread_id: Optional[int] = None
+        if topic_id not in (None, "", "null"):
+            try:
+                thread_id = int(str(topic_id).strip())
+            except Exception:
+                thread_id = None
+
+        # --- msg_id normalisieren (frisch aus der Config, das Dashboard kann sie zurücksetzen) ---
+        target = _message_state_target(_load_cfg(), key) or {}
+        msg_id_raw = target.get("status_message_id")
         msg_id: Optional[int] = None
         if msg_id_raw not in (None, "", "null", 0):
             try:
@@ -392,13 +676,12 @@ async def _send_or_edit_status(context: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 msg_id = None
 
-        created_at_raw = cfg.get("status_message_created_at")
+        created_at_raw = target.get("status_message_created_at")
 
         # Robustheits-Fix: Falls msg_id existiert aber created_at fehlt -> jetzt setzen
         if msg_id and not created_at_raw:
-            cfg["status_message_created_at"] = datetime.now().isoformat(timespec="seconds")
-            _save_cfg(cfg)
-            created_at_raw = cfg["status_message_created_at"]
+            created_at_raw = datetime.now().isoformat(timespec="seconds")
+            _set_message_state(key, msg_id, created_at_raw)
 
         # --- Rotation prüfen ---
         must_rotate = False
@@ -414,94 +697,152 @@ async def _send_or_edit_status(context: ContextTypes.DEFAULT_TYPE):
         # 1) Proaktive Rotation: delete -> cfg clear -> dann neu
         if msg_id and must_rotate:
             try:
-                await context.bot.delete_message(chat_id=chat_id_int, message_id=msg_id)
-                log.info("Minecraft bridge: rotated status message (deleted old %s).", msg_id)
+                await bot.delete_message(chat_id=chat_id_int, message_id=msg_id)
+                log.info("Minecraft bridge: rotated status message for %s (deleted old %s).", key, msg_id)
             except Exception as e_del:
                 log.warning("Minecraft bridge: could not delete old status message %s for rotation: %s", msg_id, e_del)
 
             msg_id = None
-            cfg["status_message_id"] = None
-            cfg["status_message_created_at"] = None
-            _save_cfg(cfg)
+            _set_message_state(key, None, None)
 
-        # 2) Edit versuchen
+        text_digest = _digest(text)
+
+        # 2) Edit versuchen – aber nur, wenn sich der Text seit dem letzten Senden geändert hat
+        if msg_id and _text_digests.get(key) == (msg_id, text_digest):
+            return
         if msg_id:
             try:
-                await context.bot.edit_message_text(
+                await bot.edit_message_text(
                     chat_id=chat_id_int,
                     message_id=msg_id,
                     text=text,
                     disable_web_page_preview=True,
                 )
+                _text_digests[key] = (msg_id, text_digest)
                 return
             except Exception as e_edit:
                 msg_lower = str(e_edit).lower()
                 if "message is not modified" in msg_lower:
+                    _text_digests[key] = (msg_id, text_digest)
                     return # No changes, all good
 
                 log.info("Minecraft bridge: edit failed for %s (%s). Attempting delete and new post.", msg_id, e_edit)
                 try:
-                    await context.bot.delete_message(chat_id=chat_id_int, message_id=msg_id)
+                    await bot.delete_message(chat_id=chat_id_int, message_id=msg_id)
                 except Exception:
                     pass # Ignore if already deleted
 
                 msg_id = None
-                cfg["status_message_id"] = None
-                cfg["status_message_created_at"] = None
-                _save_cfg(cfg)
+                _set_message_state(key, None, None)
 
         # 3) Neu senden (erst NACH delete/cfg-clear)
         try:
-            sent = await context.bot.send_message(
+            sent = await bot.send_message(
                 chat_id=chat_id_int,
                 message_thread_id=thread_id,
                 text=text,
                 disable_web_page_preview=True,
                 disable_notification=True,
             )
-            cfg["status_message_id"] = sent.message_id
-            cfg["status_message_created_at"] = datetime.now().isoformat(timespec="seconds")
-            _save_cfg(cfg)
-            log.info("Minecraft bridge: sent new status message %s", sent.message_id)
+            _set_message_state(key, sent.message_id, datetime.now().isoformat(timespec="seconds"))
+            _text_digests[key] = (sent.message_id, text_digest)
+            log.info("Minecraft bridge: sent new status message %s for %s", sent.message_id, key)
         except Exception as e_send:
-            log.error("Minecraft bridge: failed to send new status message: %s", e_send)
+            log.error("Minecraft bridge: failed to send new status message for %s: %s", key, e_send)
 
 
 async def _job_callback(context: ContextTypes.DEFAULT_TYPE):
-    await _send_or_edit_status(context)
+    # Resolve the server from the current config so dashboard edits apply without a restart
+    key = context.job.data
+    server = next((s for s in _cfg_servers(_load_cfg()) if s["key"] == key), None)
+    if server:
+        await _update_server(context.bot, server)
+
+
+# key -> interval of the scheduled status job
+_scheduled: Dict[str, int] = {}
+
+
+def _schedule_servers(job_queue) -> None:
+    servers = {s["key"]: s for s in _cfg_servers(_load_cfg())}
+
+    for key, every in list(_scheduled.items()):
+        if key in servers and servers[key]["update_seconds"] == every:
+            continue
+        for job in job_queue.get_jobs_by_name(STATUS_JOB_PREFIX + key):
+            job.schedule_removal()
+        del _scheduled[key]
+        if key not in servers:
+            _status_cache.pop(key, None)
+            _probe_results.pop(key, None)
+            _health.pop(key, None)
+            _cache_digests.pop(key, None)
+            _text_digests.pop(key, None)
+            _write_status_cache()
+            log.info("Minecraft bridge: stopped monitoring %s.", key)
+
+    for key, server in servers.items():
+        if key in _scheduled:
+            continue
+        every = server["update_seconds"]
+        # Random first run plus jitter spreads the servers over the interval,
+        # the jobs themselves run concurrently on the event loop.
+        job_queue.run_repeating(
+            _job_callback,
+            interval=every,
+            first=random.uniform(1, min(every, 15)),
+            name=STATUS_JOB_PREFIX + key,
+            data=key,
+            job_kwargs={"jitter": max(1, every // 10)},
+        )
+        _scheduled[key] = every
+        log.info("Minecraft bridge job for %s scheduled every %ss.", key, every)
+
+
+async def _sync_jobs(context: ContextTypes.DEFAULT_TYPE):
+    _schedule_servers(context.job_queue)
 
 
 # --- /player Command ----------------------------------------------------------
-async def cmd_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cfg = _load_cfg()
-    host, port = _cfg_host_port(cfg)
-    name = str(cfg.get("name") or "Minecraft Server").strip()
-    timeout_seconds = int(cfg.get("timeout_seconds") or 5)
-    display_host, display_port = _cfg_display_host_port(cfg, host, port)
-    delete_after = int(cfg.get("delete_player_seconds") or 8)
-    
-    if not update.message: return
-    
-    m = None
+async def _player_text(server: Dict[str, Any]) -> str:
+    head = f"⛏️ {server['name']}\n🌐 {server['display_host']}:{server['display_port']}"
     try:
-        status, _ping_ms = await _fetch_status(host, port, timeout_seconds)
+        status, _ping_ms = await _get_status(server, max_age=PLAYER_CACHE_SECONDS)
         online = int(status.players.online)
         maxp = int(status.players.max)
-        
+
         names = []
         if status.players.sample:
             names = [_sanitize_text(p.name) for p in status.players.sample if getattr(p, "name", None)]
             names = names[:40] # Limit
-            
-        txt = f"⛏️ {name}\n🌐 {display_host}:{display_port}\n👥 Spieler online: {online}/{maxp}"
+
+        txt = f"{head}\n👥 Spieler online: {online}/{maxp}"
         if names: txt += "\n" + "\n".join(f"• {n}" for n in names)
-        
-        m = await update.message.reply_text(txt)
+        return txt
     except ImportError:
-        m = await update.message.reply_text("🔴 Fehler: 'mcstatus' Bibliothek fehlt.")
+        return "🔴 Fehler: 'mcstatus' Bibliothek fehlt."
     except Exception as e:
-        m = await update.message.reply_text(f"🔴 Server nicht erreichbar ({type(e).__name__})")
-        
+        return f"{head}\n🔴 Server nicht erreichbar ({type(e).__name__})"
+
+
+async def cmd_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    cfg = _load_cfg()
+    delete_after = int(cfg.get("delete_player_seconds") or 8)
+
+    if not update.message: return
+
+    servers = _cfg_servers(cfg)
+    # Optional filter: /player <name|host>
+    query = " ".join(context.args or []).strip().lower()
+    if query:
+        servers = [s for s in servers if query in s["key"].lower() or query in s["name"].lower() or query in s["display_host"].lower()]
+
+    if not servers:
+        m = await update.message.reply_text("🔴 Kein passender Server konfiguriert.")
+    else:
+        texts = await asyncio.gather(*(_player_text(s) for s in servers))
+        m = await update.message.reply_text("\n\n".join(texts))
+
     if m and delete_after > 0 and context.job_queue:
         async def _del(c: ContextTypes.DEFAULT_TYPE):
             try: await c.bot.delete_message(chat_id=m.chat_id, message_id=m.message_id)
@@ -515,44 +856,108 @@ def register_minecraft(app: Application) -> None:
         log.error("❌ 'mcstatus' library not found. Minecraft bridge disabled.")
         return
 
-    cfg = _load_cfg()
-    every = max(10, min(int(cfg.get("update_seconds") or 30), 3600))
-    
     app.add_handler(CommandHandler("player", cmd_player))
-    
+
     if app.job_queue:
-        # Run first update slightly delayed to allow bot startup to finish
-        app.job_queue.run_once(_job_callback, when=10)
-        app.job_queue.run_repeating(_job_callback, interval=every, first=20)
-        log.info("Minecraft bridge job scheduled every %ss.", every)
+        # Picks up added/removed servers and interval changes from the dashboard
+        app.job_queue.run_repeating(_sync_jobs, interval=SYNC_JOBS_SECONDS, first=1)
+        app.job_queue.run_repeating(_prune_history, interval=HISTORY_PRUNE_SECONDS, first=60)
     else:
         log.warning("Minecraft bridge: job_queue not available – status auto-update disabled.")
 
 
-# --- CLI / Debug --------------------------------------------------------------
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    
+# --- Standalone Bot -----------------------------------------------------------
+ALLOWED_UPDATES = [Update.MESSAGE]
+# Without an own token the ID-Finder token is used; polling it here would conflict
+# with the running ID-Finder bot (getUpdates), so then only the status messages run.
+POLL_UPDATES = True
+
+
+def _resolve_token(cfg: Dict[str, Any]) -> Tuple[str, bool]:
+    token = str(cfg.get("bot_token") or "").strip()
+    if token:
+        return token, True
+    try:
+        with open(ID_FINDER_CONFIG_PATH, "r", encoding="utf-8") as f:
+            token = str(json.load(f).get("bot_token") or "").strip()
+    except Exception:
+        token = ""
+    return token, False
+
+
+def build_application(builder=None) -> Optional[Application]:
+    global POLL_UPDATES
     if not JavaServer:
-        print("❌ 'mcstatus' library not installed. Please run: pip install mcstatus")
-        exit(1)
-        
-    cfg = _load_cfg()
-    host, port = _cfg_host_port(cfg)
-    display_host, display_port = _cfg_display_host_port(cfg, host, port)
-    name = cfg.get("name", "Minecraft Server")
-    
-    async def _main():
-        print(f"🔍 Teste Minecraft-Status für {host}:{port}...")
+        log.error("❌ 'mcstatus' library not found. Minecraft bridge disabled.")
+        return None
+
+    token, own_token = _resolve_token(_load_cfg())
+    if not token:
+        log.error("Minecraft bridge: no bot token configured (neither own nor ID-Finder).")
+        return None
+    POLL_UPDATES = own_token
+
+    app = (builder or ApplicationBuilder()).token(token).build()
+    register_minecraft(app)
+    return instrument_application(app, "minecraft")
+
+
+async def serve(app: Application) -> None:
+    async with app:
+        # run_polling() would call post_init, this loop has to do it itself
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
         try:
-            status, ping_ms = await _fetch_status(host, port, cfg.get("timeout_seconds", 5))
-            text = _fmt_status_text(status, display_host, display_port, name)
-            print("\n✅ ONLINE")
-            print(f"Ping: {ping_ms} ms")
-            print("-" * 20)
-            print(text)
+            await asyncio.Event().wait()
+        finally:
+            await app.stop()
+
+
+async def _check() -> None:
+    servers = _cfg_servers(_load_cfg())
+    if not servers:
+        print("❌ Kein Server konfiguriert.")
+        return
+
+    async def _one(server):
+        try:
+            status, ping_ms = await _fetch_status(server["host"], server["port"], server["timeout_seconds"])
+            return f"✅ ONLINE ({ping_ms} ms)\n" + _fmt_status_text(status, server["display_host"], server["display_port"], server["name"])
         except Exception as e:
-            print("\n🔴 OFFLINE / FEHLER")
-            print(f"{type(e).__name__}: {e}")
-            
-    asyncio.run(_main())
+            return f"🔴 OFFLINE / FEHLER {server['host']}:{server['port']}\n{type(e).__name__}: {e}"
+
+    print(f"🔍 Teste Minecraft-Status für {len(servers)} Server...")
+    for text in await asyncio.gather(*(_one(s) for s in servers)):
+        print("-" * 20)
+        print(text)
+
+
+def main():
+    setup_logging("minecraft", LOG_FILE)
+
+    if not JavaServer:
+        print("❌ 'mcstatus' library not installed. Please run: pip install mcstatus")
+        sys.exit(1)
+
+    # One-shot check of all configured servers
+    if "--check" in sys.argv:
+        asyncio.run(_check())
+        return
+
+    init_db()
+    app = build_application()
+    if not app:
+        sys.exit(1)
+    log.info(f"Minecraft Status Bot gestartet ({len(_cfg_servers(_load_cfg()))} Server, /player {'aktiv' if POLL_UPDATES else 'inaktiv'}).")
+    if POLL_UPDATES:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
+    else:
+        try:
+            asyncio.run(serve(app))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,16 @@ import os
 import json
 import re
 import sys
+import time
 import asyncio
+import tempfile
 from pathlib import Path
+from collections import deque
 from datetime import datetime, timedelta
+from sqlalchemy import func, insert
 from telegram import Update, ChatInviteLink, ChatMember
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -23,20 +27,20 @@ from telegram.ext import (
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
 sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(BASE_DIR))
 
-from database import SessionLocal, User, InviteProfile
+from database import SessionLocal, User, InviteProfile, InviteLink, InviteInteraction, init_db
+from sql_persistence import SQLPersistence
+from bot_logging import setup_logging
+from bot_metrics import instrument_application
 
 LOG_FILE = os.path.join(BASE_DIR, 'invite_bot.log')
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    handlers=[logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler(sys.stdout)]
-)
+setup_logging("invite", LOG_FILE)
 logger = logging.getLogger(__name__)
 
 # --- Files ---
 CONFIG_FILE = Path(BASE_DIR) / 'invite_bot_config.json'
-USER_INTERACTIONS_LOG_FILE = Path(BASE_DIR) / 'user_interactions.log'
+JOIN_METRICS_FILE = Path(PROJECT_ROOT) / 'data' / 'invite_join_metrics.json'
 
 # --- Conversation States ---
 FILLING_FORM, CONFIRM_RULES = range(2)
@@ -48,6 +52,7 @@ def load_config():
         "main_chat_id": "",
         "topic_id": "",
         "link_ttl_minutes": 15,
+        "link_pool_size": 5,
         "repost_profile_for_existing_members": True,
         "start_message": "Willkommen!",
         "rules_message": "Bitte bestätige die Regeln mit OK.",
@@ -60,13 +65,104 @@ def load_config():
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f: return json.load(f)
     except: return default
 
+# --- Config Cache ---
+# The config and the compiled form are kept in memory; the file is only re-read when
+# its mtime/size changes, and that is checked at most every CONFIG_CHECK_SECONDS.
+CONFIG_CHECK_SECONDS = 2
+_config_cache = {"stamp": None, "checked_at": 0.0, "config": None, "form": ()}
+
+class FieldError(Exception):
+    """Invalid answer for a form field; ``end`` aborts the application."""
+    def __init__(self, message, end=False):
+        super().__init__(message)
+        self.message = message
+        self.end = end
+
+def _validate_text(message, field):
+    return message.text.strip() if message.text else ""
+
+def _validate_photo(message, field):
+    if message.photo: return message.photo[-1].file_id
+    raise FieldError("⚠️ Bitte sende ein Foto.")
+
+def _compile_number_validator(field):
+    min_age = field.get("min_age")
+    error_msg = field.get("min_age_error_msg") or f"⚠️ Du musst mindestens {min_age} Jahre alt sein."
+    def _validate(message, field):
+        text = message.text.strip() if message.text else ""
+        if not text.isdigit(): raise FieldError("⚠️ Bitte gib eine Zahl ein.")
+        if min_age is not None and int(text) < int(min_age): raise FieldError(error_msg, end=True)
+        return text
+    return _validate
+
+def _compile_field(field):
+    # min_age turns any field into a number field
+    if field.get("type") == "photo": validate = _validate_photo
+    elif field.get("type") == "number" or field.get("min_age") not in (None, ""): validate = _compile_number_validator(field)
+    else: validate = _validate_text
+    label = field["label"]
+    if not field.get("required"):
+        label += "\n\n_Diese Frage kannst du mit 'nein' überspringen._"
+    return {**field, "prompt": label, "validate": validate}
+
+def compile_form(config):
+    return tuple(_compile_field(f) for f in get_enabled_fields(config))
+
+def _config_stamp():
+    try:
+        st = CONFIG_FILE.stat()
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def _refresh_config():
+    now = time.monotonic()
+    if _config_cache["config"] is not None and now - _config_cache["checked_at"] < CONFIG_CHECK_SECONDS:
+        return
+    _config_cache["checked_at"] = now
+    stamp = _config_stamp()
+    if _config_cache["config"] is not None and stamp == _config_cache["stamp"]:
+        return
+    config = load_config()
+    _config_cache.update(stamp=stamp, config=config, form=compile_form(config))
+    logger.info(f"Konfiguration geladen ({len(_config_cache['form'])} Formularfelder).")
+
+def get_config():
+    _refresh_config()
+    return _config_cache["config"]
+
+def get_form():
+    _refresh_config()
+    return _config_cache["form"]
+
+# --- Interaction Log ---
+# Entries are buffered in memory and written in one transaction every
+# INTERACTION_FLUSH_SECONDS; the table keeps the newest INTERACTION_MAX_ROWS entries.
+INTERACTION_FLUSH_SECONDS = 2
+INTERACTION_MAX_ROWS = 50000
+INTERACTION_BUFFER_MAX = 10000
+_pending_interactions = deque(maxlen=INTERACTION_BUFFER_MAX)
+
 def log_user_interaction(user_id: int, username: str, action: str, details: str = ""):
+    _pending_interactions.append({"ts": datetime.now(), "user_id": user_id, "username": username, "action": action, "details": details})
+
+def _store_interactions(rows):
+    with SessionLocal() as session:
+        session.execute(insert(InviteInteraction), rows)
+        # Rotation: drop everything older than the newest INTERACTION_MAX_ROWS entries
+        newest_id = session.query(func.max(InviteInteraction.id)).scalar() or 0
+        session.query(InviteInteraction).filter(InviteInteraction.id <= newest_id - INTERACTION_MAX_ROWS).delete(synchronize_session=False)
+        session.commit()
+
+async def flush_interactions(context: ContextTypes.DEFAULT_TYPE = None):
+    if not _pending_interactions:
+        return
+    rows = list(_pending_interactions)
+    _pending_interactions.clear()
     try:
-        with open(USER_INTERACTIONS_LOG_FILE, 'a', encoding='utf-8') as f:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            user_info = f"@{username}" if username else f"ID:{user_id}"
-            f.write(f"[{timestamp}] User: {user_info} | Aktion: {action} | Details: {details}\n")
-    except: pass
+        await asyncio.get_running_loop().run_in_executor(None, _store_interactions, rows)
+    except Exception as e:
+        logger.error(f"Could not store {len(rows)} user interactions: {e}")
 
 async def get_or_create_user(user_id: int, username: str, full_name: str):
     def _sync():
@@ -101,6 +197,127 @@ async def get_profile_db(user_id: int):
             return profile.answers if profile else None
     return await asyncio.get_running_loop().run_in_executor(None, _sync)
 
+# --- Invite Link Pool ---
+LINK_POOL_REFILL_SECONDS = 10
+LINK_REVOKE_CONCURRENCY = 5
+
+class InviteLinkPool:
+    """Buffer of pre-created join-request links, so finishing the form needs no API call.
+
+    Pooled links are created with twice the configured TTL and handed out only
+    while younger than one TTL, so every applicant gets at least the full TTL.
+    Older links are revoked in batches. Every link is stored in ``invite_links``
+    together with the applicant it was handed to.
+    """
+
+    def __init__(self):
+        self._links = deque() # (invite_link, chat_id, created_at)
+        self._to_revoke = []  # (invite_link, chat_id)
+        self._owners = {}     # invite_link -> user_id
+        self._lock = asyncio.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def _ttl(config):
+        return timedelta(minutes=int(config.get("link_ttl_minutes") or 15))
+
+    def __len__(self):
+        return len(self._links)
+
+    def _is_fresh(self, entry, config, now):
+        _link, chat_id, created_at = entry
+        return chat_id == int(config["main_chat_id"]) and now - created_at < self._ttl(config)
+
+    def _prune(self, config):
+        now = datetime.utcnow()
+        fresh = deque()
+        for entry in self._links:
+            if self._is_fresh(entry, config, now): fresh.append(entry)
+            else: self._to_revoke.append(entry[:2])
+        self._links = fresh
+
+    def take(self, config):
+        now = datetime.utcnow()
+        while self._links:
+            entry = self._links.popleft()
+            if self._is_fresh(entry, config, now):
+                return entry[0]
+            self._to_revoke.append(entry[:2])
+        return None
+
+    async def create(self, bot, config):
+        chat_id, ttl = int(config["main_chat_id"]), self._ttl(config)
+        now = datetime.utcnow()
+        link = await bot.create_chat_invite_link(chat_id=chat_id, expire_date=now + 2 * ttl, creates_join_request=True)
+        def _sync():
+            with SessionLocal() as session:
+                session.add(InviteLink(invite_link=link.invite_link, chat_id=chat_id, created_at=now, expires_at=now + 2 * ttl))
+                session.commit()
+        await asyncio.get_running_loop().run_in_executor(None, _sync)
+        return link.invite_link, chat_id, now
+
+    async def assign(self, link, user_id):
+        self._owners[link] = user_id
+        def _sync():
+            with SessionLocal() as session:
+                session.query(InviteLink).filter(InviteLink.invite_link == link).update({"user_id": user_id, "assigned_at": datetime.utcnow()}, synchronize_session=False)
+                session.commit()
+        await asyncio.get_running_loop().run_in_executor(None, _sync)
+
+    def owner(self, link):
+        return self._owners.get(link)
+
+    async def _load(self):
+        # Unused links of a previous run go back into the pool instead of being wasted
+        def _sync():
+            with SessionLocal() as session:
+                rows = session.query(InviteLink).filter(InviteLink.user_id.is_(None), InviteLink.revoked.is_(False), InviteLink.expires_at > datetime.utcnow()).order_by(InviteLink.created_at).all()
+                return [(r.invite_link, r.chat_id, r.created_at) for r in rows]
+        self._links.extend(await asyncio.get_running_loop().run_in_executor(None, _sync))
+        self._loaded = True
+        if self._links:
+            logger.info(f"Invite-Link-Pool: {len(self._links)} Links aus der Datenbank übernommen.")
+
+    async def _revoke_pending(self, bot):
+        batch, self._to_revoke = self._to_revoke, []
+        if not batch:
+            return
+        semaphore = asyncio.Semaphore(LINK_REVOKE_CONCURRENCY)
+        async def _revoke(link, chat_id):
+            async with semaphore:
+                try:
+                    await bot.revoke_chat_invite_link(chat_id=chat_id, invite_link=link)
+                except TelegramError as e:
+                    # Expired or already revoked links cannot be revoked again; nothing to retry
+                    logger.debug(f"Revoke {link} failed: {e}")
+        await asyncio.gather(*(_revoke(link, chat_id) for link, chat_id in batch))
+        def _sync():
+            with SessionLocal() as session:
+                session.query(InviteLink).filter(InviteLink.invite_link.in_([link for link, _ in batch])).update({"revoked": True}, synchronize_session=False)
+                session.commit()
+        await asyncio.get_running_loop().run_in_executor(None, _sync)
+        logger.info(f"Invite-Link-Pool: {len(batch)} abgelaufene Links widerrufen.")
+
+    async def replenish(self, context: ContextTypes.DEFAULT_TYPE):
+        if self._lock.locked():
+            return
+        async with self._lock:
+            config = get_config()
+            if not config.get("main_chat_id"):
+                return
+            if not self._loaded:
+                await self._load()
+            self._prune(config)
+            size = max(0, int(config.get("link_pool_size", 5)))
+            try:
+                while len(self._links) < size:
+                    self._links.append(await self.create(context.bot, config))
+            except TelegramError as e:
+                logger.warning(f"Invite-Link-Pool: Auffüllen unterbrochen ({len(self._links)}/{size}): {e}")
+            await self._revoke_pending(context.bot)
+
+link_pool = InviteLinkPool()
+
 def escape_md(text):
     if not text: return ""
     escape_chars = r"_*[]()~`>#+-=|{}.!"
@@ -109,67 +326,55 @@ def escape_md(text):
 def get_enabled_fields(config):
     return [f for f in config.get("form_fields", []) if f.get("enabled", True)]
 
-async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE, config: dict):
-    fields = get_enabled_fields(config)
+async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    form = get_form()
     current_idx = context.user_data.get("form_idx", 0)
     
-    if current_idx >= len(fields):
-        regeln = config.get("rules_message", "Bitte bestätige die Regeln mit OK.")
+    if current_idx >= len(form):
+        regeln = get_config().get("rules_message", "Bitte bestätige die Regeln mit OK.")
         await update.effective_message.reply_text(regeln)
         await update.effective_message.reply_text("Bitte antworte mit *OK*, um fortzufahren\\.", parse_mode=ParseMode.MARKDOWN_V2)
         return CONFIRM_RULES
 
-    field = fields[current_idx]
-    label = field["label"]
-    if not field.get("required"): 
-        label += "\n\n_Diese Frage kannst du mit 'nein' überspringen._"
-    
-    await update.effective_message.reply_text(label)
+    await update.effective_message.reply_text(form[current_idx]["prompt"])
     return FILLING_FORM
 
 async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    config = load_config()
-    await update.message.reply_text(config.get("start_message", "Nutze /letsgo zum Starten."))
+    await update.message.reply_text(get_config().get("start_message", "Nutze /letsgo zum Starten."))
 
 async def start_form(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    config = load_config()
     user = update.effective_user
     await get_or_create_user(user.id, user.username, user.full_name)
     
     context.user_data["form_idx"] = 0
     context.user_data["answers"] = {"telegram_id": user.id, "username": user.username, "first_name": user.first_name}
-    return await ask_next_field(update, context, config)
+    log_user_interaction(user.id, user.username, "Formular gestartet")
+    return await ask_next_field(update, context)
 
 async def handle_field_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    config = load_config()
-    fields = get_enabled_fields(config)
+    form = get_form()
     idx = context.user_data.get("form_idx", 0)
-    if idx >= len(fields): return await ask_next_field(update, context, config)
+    if idx >= len(form): return await ask_next_field(update, context)
 
-    field = fields[idx]
-    user_input = None
+    field = form[idx]
+    text = update.message.text.strip() if update.message.text else ""
     
-    if field["type"] == "photo":
-        if update.message.photo: user_input = update.message.photo[-1].file_id
-        elif not field.get("required") and update.message.text and update.message.text.lower() == "nein": user_input = None
-        else:
-            await update.message.reply_text("⚠️ Bitte sende ein Foto.")
-            return FILLING_FORM
-    elif field["type"] == "number":
-        text = update.message.text.strip() if update.message.text else ""
-        if text.isdigit(): user_input = text
-        elif not field.get("required") and text.lower() == "nein": user_input = None
-        else:
-            await update.message.reply_text("⚠️ Bitte gib eine Zahl ein.")
-            return FILLING_FORM
+    if not field.get("required") and text.lower() == "nein":
+        user_input = None
     else:
-        text = update.message.text.strip() if update.message.text else ""
-        if not field.get("required") and text.lower() == "nein": user_input = None
-        else: user_input = text
+        try:
+            user_input = field["validate"](update.message, field)
+        except FieldError as e:
+            await update.message.reply_text(e.message)
+            if e.end:
+                log_user_interaction(update.effective_user.id, update.effective_user.username, "Formular abgebrochen", f"Feld '{field['id']}': {e.message}")
+                context.user_data.clear()
+                return ConversationHandler.END
+            return FILLING_FORM
 
     context.user_data["answers"][field["id"]] = user_input
     context.user_data["form_idx"] = idx + 1
-    return await ask_next_field(update, context, config)
+    return await ask_next_field(update, context)
 
 async def rules_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text.strip().lower() != "ok":
@@ -179,40 +384,218 @@ async def rules_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     profile = context.user_data["answers"]
     await save_profile_db(user_id, profile)
+    # The profile is stored now; empty user_data also removes the persisted form state
+    context.user_data.clear()
     
-    config = load_config()
+    config = get_config()
     try:
-        link = await context.bot.create_chat_invite_link(
-            chat_id=int(config["main_chat_id"]), 
-            expire_date=datetime.utcnow() + timedelta(minutes=config.get("link_ttl_minutes", 15)), 
-            creates_join_request=True
-        )
-        await update.message.reply_text(f"✅ Profil erstellt\\!\n\nBeitreten:\n{escape_md(link.invite_link)}", parse_mode=ParseMode.MARKDOWN_V2)
+        link = link_pool.take(config)
+        if link is None:
+            # Pool empty (e.g. right after start or during a wave of applicants)
+            link, _chat_id, _created_at = await link_pool.create(context.bot, config)
+        await link_pool.assign(link, user_id)
+        log_user_interaction(user_id, update.effective_user.username, "Profil erstellt", "Einladungslink gesendet")
+        context.job_queue.run_once(link_pool.replenish, when=0)
+        await update.message.reply_text(f"✅ Profil erstellt\\!\n\nBeitreten:\n{escape_md(link)}", parse_mode=ParseMode.MARKDOWN_V2)
     except Exception as e:
         logger.error(f"Link Error: {e}")
         await update.message.reply_text("⚠️ Fehler beim Link-Erstellen.")
     return ConversationHandler.END
 
+# --- Join Request Pipeline ---
+JOIN_BATCH_SIZE = 50
+JOIN_API_CONCURRENCY = 5
+JOIN_MAX_RETRIES = 3
+JOIN_LATENCY_SAMPLES = 500
+# Telegram limits, counted on the text after parsing the entities, in UTF-16 code units
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+
+def _load_profiles(user_ids):
+    with SessionLocal() as session:
+        rows = session.query(InviteProfile).filter(InviteProfile.user_id.in_(user_ids)).all()
+        return {r.user_id: {"answers": r.answers or {}, "is_approved": bool(r.is_approved)} for r in rows}
+
+def _mark_profiles_approved(user_ids):
+    with SessionLocal() as session:
+        session.query(InviteProfile).filter(InviteProfile.user_id.in_(user_ids)).update({"is_approved": True}, synchronize_session=False)
+        session.commit()
+
+def _tg_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+def _shorten(text, limit):
+    if _tg_len(text) <= limit: return text
+    while text and _tg_len(text) > limit - 1: text = text[:-1]
+    return text + "…"
+
+def render_profile_card(answers, config, user, limit=MESSAGE_LIMIT):
+    """MarkdownV2 text of a profile card plus the file_id of the first photo answer.
+
+    Long answers are shortened before escaping (never inside an escape or an
+    entity) until the visible text fits into ``limit``.
+    """
+    name = str(user.full_name or user.username or user.id)
+    photo, fields = None, []
+    for field in config.get("form_fields", []):
+        value = answers.get(field.get("id"))
+        if value in (None, ""):
+            continue
+        if field.get("type") == "photo":
+            photo = photo or value
+            continue
+        label = str(field.get("display_name") or field.get("label") or field.get("id"))
+        fields.append((field.get("emoji") or "▫️", label, str(value)))
+
+    # The longest answers are cut first: the largest cap per answer that keeps the card within the limit
+    budget = limit - _tg_len(f"👤 Neues Mitglied: {name}") - sum(_tg_len(f"\n{emoji} {label}: ") for emoji, label, _ in fields)
+    lengths = [_tg_len(value) for _, _, value in fields]
+    if sum(lengths) > budget:
+        low, high = 0, max(lengths)
+        while low < high:
+            cap = (low + high + 1) // 2
+            if sum(min(n, cap) for n in lengths) <= budget: low = cap
+            else: high = cap - 1
+        fields = [(emoji, label, _shorten(value, low)) for emoji, label, value in fields]
+
+    lines = [f"👤 *Neues Mitglied:* [{escape_md(name)}](tg://user?id={user.id})"]
+    lines += [f"{emoji} *{escape_md(label)}:* {escape_md(value)}" for emoji, label, value in fields]
+    return "\n".join(lines), photo
+
+class JoinRequestPipeline:
+    """Queues join requests and drains them in batches.
+
+    One profile query per batch, approvals and profile posts run concurrently up
+    to JOIN_API_CONCURRENCY with RetryAfter handling. Queue depth and latency
+    (queued -> approved) are written to JOIN_METRICS_FILE after every batch.
+    """
+
+    def __init__(self):
+        self._queue = deque() # (ChatJoinRequest, enqueued_at)
+        self._draining = False
+        self._latencies = deque(maxlen=JOIN_LATENCY_SAMPLES)
+        self.stats = {"received": 0, "approved": 0, "failed": 0, "profiles_posted": 0, "max_queue_depth": 0}
+
+    def __len__(self):
+        return len(self._queue)
+
+    def enqueue(self, request, application):
+        self._queue.append((request, time.monotonic()))
+        self.stats["received"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+        if not self._draining:
+            self._draining = True
+            application.create_task(self.drain(application.bot))
+
+    async def drain(self, bot):
+        try:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(JOIN_BATCH_SIZE, len(self._queue)))]
+                try:
+                    await self._process_batch(bot, batch)
+                except Exception as e:
+                    self.stats["failed"] += len(batch)
+                    logger.error(f"Join-Request-Batch ({len(batch)}) fehlgeschlagen: {e}")
+                self._write_metrics()
+        finally:
+            self._draining = False
+
+    async def _call(self, semaphore, func, **kwargs):
+        for attempt in range(JOIN_MAX_RETRIES):
+            async with semaphore:
+                try:
+                    return await func(**kwargs)
+                except RetryAfter as e:
+                    if attempt == JOIN_MAX_RETRIES - 1: raise
+                    retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                    logger.warning(f"Rate-Limit erreicht, warte {retry_after}s...")
+            await asyncio.sleep(retry_after)
+
+    async def _process_batch(self, bot, batch):
+        config = get_config()
+        loop = asyncio.get_running_loop()
+        profiles = await loop.run_in_executor(None, _load_profiles, list({req.from_user.id for req, _ in batch}))
+        semaphore = asyncio.Semaphore(JOIN_API_CONCURRENCY)
+        results = await asyncio.gather(*(self._handle(bot, config, semaphore, req, enqueued_at, profiles.get(req.from_user.id)) for req, enqueued_at in batch))
+        newly_approved = [uid for uid in results if uid]
+        if newly_approved:
+            await loop.run_in_executor(None, _mark_profiles_approved, newly_approved)
+
+    async def _handle(self, bot, config, semaphore, req, enqueued_at, profile):
+        user = req.from_user
+        link = req.invite_link.invite_link if req.invite_link else None
+        owner = link_pool.owner(link) if link else None
+        if owner and owner != user.id:
+            log_user_interaction(user.id, user.username, "Fremder Einladungslink", f"Link von ID:{owner}")
+        try:
+            await self._call(semaphore, bot.approve_chat_join_request, chat_id=req.chat.id, user_id=user.id)
+        except TelegramError as e:
+            # e.g. HIDE_REQUESTER_MISSING: the user withdrew the request or it was handled elsewhere
+            self.stats["failed"] += 1
+            logger.error(f"Approval failed for {user.id}: {e}")
+            return None
+        self.stats["approved"] += 1
+        self._latencies.append(time.monotonic() - enqueued_at)
+        log_user_interaction(user.id, user.username, "Beitritt genehmigt", "mit Profil" if profile else "ohne Profil")
+
+        if not profile or (profile["is_approved"] and not config.get("repost_profile_for_existing_members", True)):
+            return None
+        try:
+            await self._post_profile(bot, config, semaphore, req.chat.id, user, profile["answers"])
+            self.stats["profiles_posted"] += 1
+        except TelegramError as e:
+            logger.error(f"Profile post failed for {user.id}: {e}")
+        return user.id
+
+    async def _post_profile(self, bot, config, semaphore, chat_id, user, answers):
+        text, photo = render_profile_card(answers, config, user)
+        topic_id = config.get("topic_id")
+        thread_id = int(topic_id) if str(topic_id or "").strip().lstrip("-").isdigit() else None
+        if photo:
+            text, _ = render_profile_card(answers, config, user, limit=CAPTION_LIMIT)
+            await self._call(semaphore, bot.send_photo, chat_id=chat_id, photo=photo, caption=text, parse_mode=ParseMode.MARKDOWN_V2, message_thread_id=thread_id)
+        else:
+            await self._call(semaphore, bot.send_message, chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN_V2, message_thread_id=thread_id)
+
+    def metrics(self):
+        latencies = sorted(self._latencies)
+        def _pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000) if latencies else None
+        return {
+            **self.stats,
+            "queue_depth": len(self._queue),
+            "latency_ms": {"p50": _pct(0.5), "p95": _pct(0.95), "max": _pct(1.0)},
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def _write_metrics(self):
+        try:
+            JOIN_METRICS_FILE.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=JOIN_METRICS_FILE.parent)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.metrics(), f, indent=2)
+            os.replace(tmp, JOIN_METRICS_FILE)
+        except Exception as e:
+            logger.error(f"Could not write join metrics: {e}")
+
+join_pipeline = JoinRequestPipeline()
+
 async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     req = update.chat_join_request
-    user_id, chat_id = req.from_user.id, req.chat.id
-    config = load_config()
-    
-    if str(chat_id) != str(config.get("main_chat_id")): return
+    if str(req.chat.id) != str(get_config().get("main_chat_id")): return
+    join_pipeline.enqueue(req, context.application)
 
-    try:
-        await context.bot.approve_chat_join_request(chat_id=chat_id, user_id=user_id)
-        profile = await get_profile_db(user_id)
-        if profile:
-            # Hier könnte man die Profile-Post Logik einfügen (identisch zu vorher)
-            logger.info(f"Approved {user_id} and profile found.")
-    except Exception as e:
-        logger.error(f"Approval failed: {e}")
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.clear()
+    return ConversationHandler.END
 
-def main():
+ALLOWED_UPDATES = None
+
+def build_application(builder=None):
     config = load_config()
-    if not config.get("bot_token"): sys.exit(1)
-    app = ApplicationBuilder().token(config["bot_token"]).build()
+    if not config.get("bot_token"): return None
+    # Conversation states and form answers survive restarts
+    app = (builder or ApplicationBuilder()).token(config["bot_token"]).persistence(SQLPersistence("invite")).post_shutdown(flush_interactions).build()
     
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("letsgo", start_form)],
@@ -220,12 +603,22 @@ def main():
             FILLING_FORM: [MessageHandler(filters.ALL & ~filters.COMMAND, handle_field_input)],
             CONFIRM_RULES: [MessageHandler(filters.TEXT & ~filters.COMMAND, rules_confirmed)]
         },
-        fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)],
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="invite_form",
+        persistent=True,
     )
     
     app.add_handler(CommandHandler("start", welcome))
     app.add_handler(conv_handler)
     app.add_handler(ChatJoinRequestHandler(handle_join_request))
+    app.job_queue.run_repeating(link_pool.replenish, interval=LINK_POOL_REFILL_SECONDS, first=1)
+    app.job_queue.run_repeating(flush_interactions, interval=INTERACTION_FLUSH_SECONDS, first=INTERACTION_FLUSH_SECONDS)
+    return instrument_application(app, "invite")
+
+def main():
+    init_db()
+    app = build_application()
+    if not app: sys.exit(1)
     logger.info("Invite Bot (SQL) gestartet...")
     app.run_polling()
 
@@ -12,19 +12,18 @@ from datetime import datetime, timedelta
 
 # --- PATH SETUP ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(BASE_DIR)))
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from bot_logging import setup_logging
+from bot_metrics import instrument_telebot
+
 LOG_FILE = os.path.join(BASE_DIR, 'outfit_bot.log')
 CONFIG_FILE = os.path.join(BASE_DIR, 'outfit_bot_config.json')
 DATA_FILE = os.path.join(BASE_DIR, 'outfit_bot_data.json')
 
 # --- LOGGING SETUP ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+setup_logging("outfit", LOG_FILE, fmt='%(asctime)s - %(levelname)s - %(message)s')
 
 DEFAULT_CONFIG = {
     "BOT_TOKEN": "DUMMY",
@@ -77,6 +76,9 @@ if not initial_token or initial_token == "DUMMY":
 
 bot = telebot.TeleBot(initial_token, threaded=False)
 
+# Set to stop the scheduler and command listener threads (used by bot_host.py)
+STOP_EVENT = threading.Event()
+
 
 # --- HELPER FUNCTIONS ---
 def get_config():
@@ -526,7 +528,7 @@ def handle_duel_vote(call):
 
 # --- MAIN ---
 def run_scheduler():
-    while True:
+    while not STOP_EVENT.is_set():
         schedule.run_pending()
         time.sleep(1)
 
@@ -537,7 +539,7 @@ def command_listener():
         "command_announce_winner.tmp": determine_winner,
         "command_end_duel.tmp": end_duel
     }
-    while True:
+    while not STOP_EVENT.is_set():
         for fname, func in files.items():
             fpath = os.path.join(BASE_DIR, fname)
             if os.path.exists(fpath):
@@ -550,17 +552,35 @@ def command_listener():
                     except: pass
         time.sleep(2)
 
-if __name__ == "__main__":
+def start_background_jobs():
+    STOP_EVENT.clear()
+    schedule.clear()
+
     # Schedule setup
     cfg = get_config()
     if cfg.get("AUTO_POST_ENABLED"):
         schedule.every().day.at(cfg.get("POST_TIME", "18:00")).do(send_daily_post)
         schedule.every().day.at(cfg.get("WINNER_TIME", "22:00")).do(determine_winner)
 
-    threading.Thread(target=run_scheduler, daemon=True).start()
-    threading.Thread(target=command_listener, daemon=True).start()
+    threading.Thread(target=run_scheduler, name="outfit-scheduler", daemon=True).start()
+    threading.Thread(target=command_listener, name="outfit-commands", daemon=True).start()
+
+
+def stop():
+    STOP_EVENT.set()
+    schedule.clear()
+    bot.stop_polling()
+
+
+def main():
+    instrument_telebot(bot, "outfit")
+    start_background_jobs()
     
     try:
         bot.polling(non_stop=True, skip_pending=True)
     except Exception as e:
         logging.error(f"Polling error: {e}")
+
+
+if __name__ == "__main__":
+    main()
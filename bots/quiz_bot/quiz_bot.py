@@ -1,18 +1,26 @@
 import os
+import sys
 import json
-import time
 import random
 import asyncio
 import logging
 import hashlib
 from datetime import datetime, time as dt_time, timedelta
-from telegram import Bot
+from sqlalchemy import insert
+from telegram import Bot, Update
 from telegram.error import TelegramError
+from telegram.ext import ApplicationBuilder, PollAnswerHandler, ContextTypes
 
 # ----------------- Setup -----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Navigate up to the project root: bots/quiz_bot -> bots -> project_root
 PROJECT_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from database import SessionLocal, QuizPoll, QuizAnswer, QuizScore, init_db
+from bot_logging import setup_logging
+from bot_metrics import instrument_application
 
 CONFIG_FILE = os.path.join(BASE_DIR, "quiz_bot_config.json")
 TRIGGER_FILE = os.path.join(BASE_DIR, "send_now.tmp")
@@ -22,14 +30,12 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 QUIZ_FILE = os.path.join(DATA_DIR, "quizfragen.json")
 USED_FILE = os.path.join(BASE_DIR, "quizfragen_gestellt.json")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(BASE_DIR, "quiz_bot.log")),
-        logging.StreamHandler()
-    ]
-)
+TICK_SECONDS = 10
+# Answers are buffered and written in one transaction per flush
+ANSWER_FLUSH_SECONDS = 5
+ANSWER_BATCH_SIZE = 200
+
+setup_logging("quiz", os.path.join(BASE_DIR, "quiz_bot.log"))
 log = logging.getLogger("quiz_bot")
 
 
@@ -75,28 +81,99 @@ def question_fingerprint(q: dict) -> str:
     payload = frage + "||" + "||".join([str(x).strip() for x in sorted(optionen)])
     return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
+# ----------------- Answer Storage -----------------
+_pending_answers = []
+
+def _register_poll(poll_id: str, chat_id: int, message_id: int, correct_option: int, question: str):
+    with SessionLocal() as session:
+        session.merge(QuizPoll(poll_id=poll_id, chat_id=chat_id, message_id=message_id, correct_option=correct_option, question=question, sent_at=datetime.utcnow()))
+        session.commit()
+
+def _store_answers(rows):
+    """Grades a batch of answers and folds them into quiz_scores in one transaction."""
+    with SessionLocal() as session:
+        poll_ids = {r["poll_id"] for r in rows}
+        user_ids = {r["user_id"] for r in rows}
+        correct_by_poll = dict(session.query(QuizPoll.poll_id, QuizPoll.correct_option).filter(QuizPoll.poll_id.in_(poll_ids)).all())
+        seen = set(session.query(QuizAnswer.poll_id, QuizAnswer.user_id).filter(QuizAnswer.poll_id.in_(poll_ids), QuizAnswer.user_id.in_(user_ids)).all())
+
+        new_rows = []
+        for r in rows:
+            key = (r["poll_id"], r["user_id"])
+            # Unknown polls were not sent by this bot; quiz answers cannot be changed, so first answer wins
+            if r["poll_id"] not in correct_by_poll or key in seen:
+                continue
+            seen.add(key)
+            r["correct"] = r["option"] == correct_by_poll[r["poll_id"]]
+            new_rows.append(r)
+
+        if not new_rows:
+            return 0
+
+        session.execute(insert(QuizAnswer), [{k: r[k] for k in ("poll_id", "user_id", "option", "correct", "ts")} for r in new_rows])
+
+        scores = {s.user_id: s for s in session.query(QuizScore).filter(QuizScore.user_id.in_({r["user_id"] for r in new_rows})).all()}
+        for r in new_rows:
+            score = scores.get(r["user_id"])
+            if not score:
+                score = QuizScore(user_id=r["user_id"], answered=0, correct=0)
+                session.add(score)
+                scores[r["user_id"]] = score
+            if r["name"]:
+                score.name = r["name"]
+            score.answered += 1
+            score.correct += int(r["correct"])
+            score.last_answer_at = r["ts"]
+        session.commit()
+        return len(new_rows)
+
+async def flush_answers(context: ContextTypes.DEFAULT_TYPE = None):
+    global _pending_answers
+    if not _pending_answers:
+        return
+    rows, _pending_answers = _pending_answers, []
+    try:
+        stored = await asyncio.get_running_loop().run_in_executor(None, _store_answers, rows)
+        log.info(f"Stored {stored} quiz answers ({len(rows)} received).")
+    except Exception as e:
+        log.error(f"Error storing quiz answers: {e}")
+
+async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    answer = update.poll_answer
+    # Votes on behalf of a chat carry no user; empty option_ids means the vote was retracted
+    if not answer or not answer.user or not answer.option_ids:
+        return
+    _pending_answers.append({
+        "poll_id": answer.poll_id,
+        "user_id": answer.user.id,
+        "name": answer.user.full_name or answer.user.username,
+        "option": answer.option_ids[0],
+        "ts": datetime.utcnow(),
+    })
+    if len(_pending_answers) >= ANSWER_BATCH_SIZE:
+        await flush_answers(context)
+
 # ----------------- Core Logic -----------------
-async def send_quiz():
-    log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Attempting to send quiz...")
+async def send_quiz(bot: Bot):
+    log.info("Attempting to send quiz...")
     cfg = load_json(CONFIG_FILE, {})
-    token = cfg.get("bot_token", "").strip()
-    chat_id = cfg.get("channel_id", "").strip() # Can be channel or group ID
+    chat_id = str(cfg.get("channel_id") or "").strip() # Can be channel or group ID
     topic_id = cfg.get("topic_id", "")
 
-    if not token or not chat_id:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Bot token or channel_id is not configured.")
+    if not chat_id:
+        log.warning("channel_id is not configured.")
         return False
 
     all_questions = load_json(QUIZ_FILE, [])
     if not all_questions:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No questions found in quizfragen.json")
+        log.error("No questions found in quizfragen.json")
         return False
 
     used_hashes = set(load_json(USED_FILE, []))
     available_questions = [q for q in all_questions if question_fingerprint(q) not in used_hashes]
 
     if not available_questions:
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] All questions have been asked. Resetting history.")
+        log.info("All questions have been asked. Resetting history.")
         used_hashes = set()
         save_json(USED_FILE, [])
         available_questions = all_questions
@@ -110,34 +187,32 @@ async def send_quiz():
 
     # --- Validation for Telegram API Limits ---
     if len(frage) > 300:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Question too long ({len(frage)} chars). Skipping.")
+        log.warning(f"Question too long ({len(frage)} chars). Skipping.")
         return False
     
     if len(optionen) < 2 or len(optionen) > 10:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Invalid number of options ({len(optionen)}). Skipping.")
+        log.warning(f"Invalid number of options ({len(optionen)}). Skipping.")
         return False
         
     for opt in optionen:
         if len(str(opt)) > 100:
-             log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Option too long ({len(str(opt))} chars). Skipping.")
+             log.warning(f"Option too long ({len(str(opt))} chars). Skipping.")
              return False
 
     if antwort_idx < 0 or antwort_idx >= len(optionen):
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Invalid correct option index {antwort_idx}. Skipping.")
+        log.warning(f"Invalid correct option index {antwort_idx}. Skipping.")
         return False
 
     try:
-        bot = Bot(token=token)
-        
         # Handle Topic ID
         message_thread_id = None
         if topic_id and str(topic_id).strip().lower() != "null":
              if str(topic_id).isdigit():
                  message_thread_id = int(topic_id)
         
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sending quiz to {chat_id} (Topic: {message_thread_id}): {frage}")
+        log.info(f"Sending quiz to {chat_id} (Topic: {message_thread_id}): {frage}")
         
-        await bot.send_poll(
+        message = await bot.send_poll(
             chat_id=chat_id,
             question=frage,
             options=optionen,
@@ -147,31 +222,34 @@ async def send_quiz():
             message_thread_id=message_thread_id
         )
         
+        # Remember the correct option so incoming answers can be graded
+        await asyncio.get_running_loop().run_in_executor(None, _register_poll, message.poll.id, message.chat_id, message.message_id, antwort_idx, frage)
+
         # Mark as used
         used_hashes.add(question_fingerprint(question_data))
         save_json(USED_FILE, list(used_hashes))
         
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Quiz sent successfully.")
+        log.info("Quiz sent successfully.")
         return True
 
     except TelegramError as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Telegram API Error: {e}")
+        log.error(f"Telegram API Error: {e}")
         return False
     except Exception as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Unexpected error sending quiz: {e}")
+        log.error(f"Unexpected error sending quiz: {e}")
         return False
 
 # ----------------- Scheduler and Trigger -----------------
-def process_trigger():
+async def process_trigger(bot: Bot):
     if os.path.exists(TRIGGER_FILE):
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Manual trigger detected.")
+        log.info("Manual trigger detected.")
         try:
             os.remove(TRIGGER_FILE)
-            asyncio.run(send_quiz())
+            await send_quiz(bot)
         except Exception as e:
-            log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error processing trigger: {e}")
+            log.error(f"Error processing trigger: {e}")
 
-def check_schedule():
+async def check_schedule(bot: Bot):
     cfg = load_json(CONFIG_FILE, {})
     schedule = cfg.get("schedule", {})
     
@@ -184,7 +262,7 @@ def check_schedule():
     try:
         scheduled_time = datetime.strptime(time_str, "%H:%M").time()
     except ValueError:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Invalid schedule time format: {time_str}")
+        log.error(f"Invalid schedule time format: {time_str}")
         return
 
     now = datetime.now()
@@ -203,26 +281,44 @@ def check_schedule():
     # Check if time is reached (with 1 minute tolerance to avoid double send in same minute if loop is fast)
     # Actually, since we check last_sent_date, we just need to know if current time >= scheduled time
     if now.time() >= scheduled_time:
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Scheduled time reached. Sending quiz...")
-        success = asyncio.run(send_quiz())
+        log.info("Scheduled time reached. Sending quiz...")
+        success = await send_quiz(bot)
         if success:
             set_last_sent_date(today_date)
-            log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Schedule marked as done for {today_date}")
+            log.info(f"Schedule marked as done for {today_date}")
+
+async def tick(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await process_trigger(context.bot)
+        await check_schedule(context.bot)
+    except Exception as e:
+        log.error(f"Error in main loop: {e}")
+
+# ----------------- Main -----------------
+ALLOWED_UPDATES = [Update.POLL_ANSWER]
+
+def build_application(builder=None):
+    cfg = load_json(CONFIG_FILE, {})
+    token = str(cfg.get("bot_token") or "").strip()
+    if not token:
+        log.error("Bot token is not configured.")
+        return None
+
+    # Flush whatever is still buffered when the bot is stopped from the dashboard
+    app = (builder or ApplicationBuilder()).token(token).post_shutdown(flush_answers).build()
+    app.add_handler(PollAnswerHandler(handle_poll_answer))
+    app.job_queue.run_repeating(tick, interval=TICK_SECONDS, first=1)
+    app.job_queue.run_repeating(flush_answers, interval=ANSWER_FLUSH_SECONDS, first=ANSWER_FLUSH_SECONDS)
+    return instrument_application(app, "quiz")
 
-# ----------------- Main Loop -----------------
 def main():
-    log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Quiz Bot started.")
-    
-    # Startup check: write PID or similar? Not needed, handled by dashboard.
-    
-    while True:
-        try:
-            process_trigger()
-            check_schedule()
-        except Exception as e:
-            log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error in main loop: {e}")
-        
-        time.sleep(10)
+    log.info("Quiz Bot started.")
+    init_db()
+
+    app = build_application()
+    if not app:
+        sys.exit(1)
+    app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
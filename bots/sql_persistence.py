@@ -0,0 +1,152 @@
+"""SQLite-backed persistence for python-telegram-bot Applications.
+
+Stores ConversationHandler states and user_data as one row per conversation /
+user in the shared database instead of pickling the whole store. Only
+user_data and conversations are persisted; bot_data, chat_data and
+callback_data stay in memory.
+
+All writes of one persistence run (PTB calls the update_* methods together
+every ``update_interval`` seconds, only for users that changed) are coalesced
+into one transaction. On startup only user_data of users with an active
+conversation is loaded; everybody else is loaded on their first update.
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+from datetime import datetime
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, BotConversation, BotUserData
+
+logger = logging.getLogger(__name__)
+
+
+class SQLPersistence(BasePersistence):
+    def __init__(self, bot_name, update_interval=1):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.bot_name = bot_name
+        # user_id -> data, None means delete
+        self._pending_users = {}
+        # (name, key) -> state, None means conversation ended
+        self._pending_conversations = {}
+        self._loaded_users = set()
+        self._write_task = None
+
+    # --- Loading ---
+    def _load_active_user_data(self):
+        with SessionLocal() as session:
+            active = session.query(BotConversation.user_id).filter(BotConversation.bot == self.bot_name, BotConversation.user_id.isnot(None))
+            rows = session.query(BotUserData).filter(BotUserData.bot == self.bot_name, BotUserData.user_id.in_(active)).all()
+            return {r.user_id: dict(r.data or {}) for r in rows}
+
+    def _load_user_data(self, user_id):
+        with SessionLocal() as session:
+            row = session.get(BotUserData, (self.bot_name, user_id))
+            return dict(row.data or {}) if row else {}
+
+    def _load_conversations(self, name):
+        with SessionLocal() as session:
+            rows = session.query(BotConversation).filter(BotConversation.bot == self.bot_name, BotConversation.name == name).all()
+            return {tuple(json.loads(r.key)): r.state for r in rows}
+
+    async def get_user_data(self):
+        data = await asyncio.get_running_loop().run_in_executor(None, self._load_active_user_data)
+        self._loaded_users.update(data)
+        logger.info(f"{len(data)} aktive Konversationen geladen ({self.bot_name}).")
+        return data
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Lazy loading: called by PTB before handling an update of this user
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        if not user_data:
+            user_data.update(await asyncio.get_running_loop().run_in_executor(None, self._load_user_data, user_id))
+
+    async def get_conversations(self, name):
+        return await asyncio.get_running_loop().run_in_executor(None, self._load_conversations, name)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- Writing ---
+    async def update_user_data(self, user_id, data):
+        self._loaded_users.add(user_id)
+        self._pending_users[user_id] = data or None
+        await self._schedule_write()
+
+    async def drop_user_data(self, user_id):
+        self._pending_users[user_id] = None
+        await self._schedule_write()
+
+    async def update_conversation(self, name, key, new_state):
+        self._pending_conversations[(name, key)] = new_state
+        await self._schedule_write()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        await self._schedule_write()
+
+    async def _schedule_write(self):
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+        await asyncio.shield(self._write_task)
+
+    async def _write_pending(self):
+        # Let the other update_* calls of this persistence run queue up first
+        await asyncio.sleep(0)
+        while self._pending_users or self._pending_conversations:
+            users, self._pending_users = self._pending_users, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_batch, users, conversations)
+            except Exception as e:
+                logger.error(f"Persistence write failed ({self.bot_name}, {len(users)} users, {len(conversations)} conversations): {e}")
+
+    def _write_batch(self, users, conversations):
+        now = datetime.utcnow()
+        with SessionLocal() as session:
+            for user_id, data in users.items():
+                if data is None:
+                    session.query(BotUserData).filter(BotUserData.bot == self.bot_name, BotUserData.user_id == user_id).delete(synchronize_session=False)
+                else:
+                    session.merge(BotUserData(bot=self.bot_name, user_id=user_id, data=data, updated_at=now))
+            for (name, key), state in conversations.items():
+                key_json = json.dumps(list(key))
+                if state is None:
+                    session.query(BotConversation).filter(BotConversation.bot == self.bot_name, BotConversation.name == name, BotConversation.key == key_json).delete(synchronize_session=False)
+                else:
+                    # Keys are (chat_id, user_id) or (user_id,) depending on per_chat/per_user
+                    session.merge(BotConversation(bot=self.bot_name, name=name, key=key_json, user_id=key[-1], state=state, updated_at=now))
+            session.commit()
@@ -1,6 +1,6 @@
 import os
+import sys
 import json
-import time
 import random
 import asyncio
 import logging
@@ -8,10 +8,16 @@ import hashlib
 from datetime import datetime, time as dt_time, timedelta
 from telegram import Bot
 from telegram.error import TelegramError
+from telegram.ext import ApplicationBuilder, ContextTypes
 
 # ----------------- Setup -----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from bot_logging import setup_logging
+from bot_metrics import instrument_application
 
 CONFIG_FILE = os.path.join(BASE_DIR, "umfrage_bot_config.json")
 TRIGGER_FILE = os.path.join(BASE_DIR, "send_now.tmp")
@@ -21,14 +27,9 @@ DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 POLL_FILE = os.path.join(DATA_DIR, "umfragen.json")
 USED_FILE = os.path.join(BASE_DIR, "umfragen_gestellt.json")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(BASE_DIR, "umfrage_bot.log")),
-        logging.StreamHandler()
-    ]
-)
+TICK_SECONDS = 10
+
+setup_logging("umfrage", os.path.join(BASE_DIR, "umfrage_bot.log"))
 log = logging.getLogger("umfrage_bot")
 
 
@@ -40,7 +41,7 @@ def load_json(path, default):
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error loading JSON from {path}: {e}")
+        log.error(f"Error loading JSON from {path}: {e}")
         return default
 
 def save_json(path, data):
@@ -49,7 +50,7 @@ def save_json(path, data):
         with open(path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
     except Exception as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error saving JSON to {path}: {e}")
+        log.error(f"Error saving JSON to {path}: {e}")
 
 def get_last_sent_date():
     state = load_json(STATE_FILE, {})
@@ -75,27 +76,26 @@ def poll_fingerprint(p: dict) -> str:
     return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
 # ----------------- Core Logic -----------------
-async def send_poll():
-    log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Attempting to send poll...")
+async def send_poll(bot: Bot):
+    log.info("Attempting to send poll...")
     cfg = load_json(CONFIG_FILE, {})
-    token = cfg.get("bot_token", "").strip()
-    chat_id = cfg.get("channel_id", "").strip()
+    chat_id = str(cfg.get("channel_id") or "").strip()
     topic_id = cfg.get("topic_id", "")
 
-    if not token or not chat_id:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Bot token or channel_id is not configured.")
+    if not chat_id:
+        log.warning("channel_id is not configured.")
         return False
 
     all_polls = load_json(POLL_FILE, [])
     if not all_polls:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No polls found in umfragen.json")
+        log.error("No polls found in umfragen.json")
         return False
 
     used_hashes = set(load_json(USED_FILE, []))
     available_polls = [p for p in all_polls if poll_fingerprint(p) not in used_hashes]
 
     if not available_polls:
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] All polls have been sent. Resetting history.")
+        log.info("All polls have been sent. Resetting history.")
         # Optional: Reset used questions
         # used_hashes = set()
         # save_json(USED_FILE, [])
@@ -110,28 +110,26 @@ async def send_poll():
 
     # --- Validation ---
     if len(frage) > 300:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Poll question too long ({len(frage)} chars). Skipping.")
+        log.warning(f"Poll question too long ({len(frage)} chars). Skipping.")
         return False
         
     if len(optionen) < 2 or len(optionen) > 10:
-        log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Invalid number of options ({len(optionen)}). Skipping.")
+        log.warning(f"Invalid number of options ({len(optionen)}). Skipping.")
         return False
 
     for opt in optionen:
         if len(str(opt)) > 100:
-            log.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Option too long ({len(str(opt))} chars). Skipping.")
+            log.warning(f"Option too long ({len(str(opt))} chars). Skipping.")
             return False
 
     try:
-        bot = Bot(token=token)
-        
         # Handle Topic ID
         message_thread_id = None
         if topic_id and str(topic_id).strip().lower() != "null":
              if str(topic_id).isdigit():
                  message_thread_id = int(topic_id)
         
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sending poll to {chat_id} (Topic: {message_thread_id}): {frage}")
+        log.info(f"Sending poll to {chat_id} (Topic: {message_thread_id}): {frage}")
 
         await bot.send_poll(
             chat_id=chat_id,
@@ -145,27 +143,27 @@ async def send_poll():
         used_hashes.add(poll_fingerprint(poll_data))
         save_json(USED_FILE, list(used_hashes))
         
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Poll sent successfully.")
+        log.info("Poll sent successfully.")
         return True
         
     except TelegramError as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Telegram API Error: {e}")
+        log.error(f"Telegram API Error: {e}")
         return False
     except Exception as e:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Unexpected error sending poll: {e}")
+        log.error(f"Unexpected error sending poll: {e}")
         return False
 
 # ----------------- Scheduler and Trigger -----------------
-def process_trigger():
+async def process_trigger(bot: Bot):
     if os.path.exists(TRIGGER_FILE):
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Manual trigger detected.")
+        log.info("Manual trigger detected.")
         try:
             os.remove(TRIGGER_FILE)
-            asyncio.run(send_poll())
+            await send_poll(bot)
         except Exception as e:
-            log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error processing trigger: {e}")
+            log.error(f"Error processing trigger: {e}")
 
-def check_schedule():
+async def check_schedule(bot: Bot):
     cfg = load_json(CONFIG_FILE, {})
     schedule = cfg.get("schedule", {})
     
@@ -178,7 +176,7 @@ def check_schedule():
     try:
         scheduled_time = datetime.strptime(time_str, "%H:%M").time()
     except ValueError:
-        log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Invalid schedule time format: {time_str}")
+        log.error(f"Invalid schedule time format: {time_str}")
         return
 
     now = datetime.now()
@@ -196,24 +194,56 @@ def check_schedule():
 
     # Check time
     if now.time() >= scheduled_time:
-        log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Scheduled time reached. Sending poll...")
-        success = asyncio.run(send_poll())
+        log.info("Scheduled time reached. Sending poll...")
+        success = await send_poll(bot)
         if success:
             set_last_sent_date(today_date)
-            log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Schedule marked as done for {today_date}")
+            log.info(f"Schedule marked as done for {today_date}")
 
-# ----------------- Main Loop -----------------
-def main():
-    log.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Umfrage Bot started.")
-    
-    while True:
+async def tick(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await process_trigger(context.bot)
+        await check_schedule(context.bot)
+    except Exception as e:
+        log.error(f"Error in main loop: {e}")
+
+# ----------------- Main -----------------
+# The poll bot only sends; it never needs getUpdates and so never competes
+# with another bot polling on the same token.
+POLL_UPDATES = False
+
+def build_application(builder=None):
+    cfg = load_json(CONFIG_FILE, {})
+    token = str(cfg.get("bot_token") or "").strip()
+    if not token:
+        log.error("Bot token is not configured.")
+        return None
+
+    app = (builder or ApplicationBuilder()).token(token).build()
+    app.job_queue.run_repeating(tick, interval=TICK_SECONDS, first=1)
+    return instrument_application(app, "umfrage")
+
+async def serve(app):
+    async with app:
+        # run_polling() would call post_init, this loop has to do it itself
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
         try:
-            process_trigger()
-            check_schedule()
-        except Exception as e:
-            log.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error in main loop: {e}")
-        
-        time.sleep(10)
+            await asyncio.Event().wait()
+        finally:
+            await app.stop()
+
+def main():
+    log.info("Umfrage Bot started.")
+
+    app = build_application()
+    if not app:
+        sys.exit(1)
+    try:
+        asyncio.run(serve(app))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,210 @@
+"""In-process metrics with Prometheus text output.
+
+Small replacement for prometheus_client: counters, gauges and histograms with labels,
+kept per process and rendered in the Prometheus text exposition format.
+"""
+import os
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# Seconds; covers fast DB lookups up to slow Telegram calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Local exporters of the bot processes (bots/bot_metrics.py), scraped by the dashboard.
+# In the bot host all plugins share the "host" port.
+BOT_METRICS_HOST = os.environ.get("BOT_METRICS_HOST", "127.0.0.1")
+BOT_METRICS_PORTS = {"host": 9100, "quiz": 9101, "umfrage": 9102, "invite": 9103, "id_finder": 9104, "minecraft": 9105, "outfit": 9106}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += self._render_items([(k, self._copy(v)) for k, v in items])
+        return lines
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        with self._lock:
+            return [(dict(zip(self.labels, k)), v) for k, v in self._values.items()]
+
+    def _render_items(self, items):
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed on read by ``fn`` returning ``[(labels, value)]``."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def items(self):
+        if self.fn:
+            return list(self.fn())
+        with self._lock:
+            return [(dict(zip(self.labels, k)), v) for k, v in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, [labels.get(n, '') for n in self.labels])} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [counts per bucket (last = +Inf), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    @staticmethod
+    def _copy(state):
+        return [list(state[0]), state[1], state[2]]
+
+    def items(self):
+        """``[(labels, {"count", "sum", "p50", "p95", "p99"})]`` for display."""
+        with self._lock:
+            items = [(k, self._copy(v)) for k, v in self._values.items()]
+        result = []
+        for key, (counts, total, count) in items:
+            summary = {"count": count, "sum": total}
+            for q in (0.5, 0.95, 0.99):
+                summary[f"p{int(q * 100)}"] = self.quantile(counts, q)
+            result.append((dict(zip(self.labels, key)), summary))
+        return result
+
+    def quantile(self, counts, q):
+        """Estimate like PromQL histogram_quantile(): linear within the bucket."""
+        count = sum(counts)
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for i, c in enumerate(counts):
+            if cumulative + c >= rank and c:
+                if i == len(self.buckets):
+                    # Beyond the largest bucket: the best known bound is that bucket
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / c
+            cumulative += c
+        return self.buckets[-1]
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), fn=None):
+        return self._add(Gauge(name, help_text, labels, fn))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def snapshot(self):
+        """``{name: [{"labels": {...}, "value": v} or {"labels": {...}, "count", "sum", "p50", ...}]}`` as JSON-ready data."""
+        result = {}
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Histogram):
+                result[name] = [{"labels": labels, **summary} for labels, summary in metric.items()]
+            else:
+                result[name] = [{"labels": labels, "value": value} for labels, value in metric.items()]
+        return result
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,152 @@
+"""Warning counters and automatic escalation.
+
+``warning_counters`` keeps one row per (chat, user) with the active
+warnings. ``record_warning()`` writes the moderation log entry, updates the
+counter in the same transaction and decides the escalation from the counter
+alone, so a warning costs one primary-key lookup however long the user's
+history is. The counter row is written before it is read (SQLite) and read
+with FOR UPDATE (PostgreSQL), so concurrent warnings queue up on it instead
+of overwriting each other.
+
+Escalation (``data/moderation_config.json``):
+
+* ``mute_after_warnings`` active warnings: mute for ``mute_minutes`` (0 = off)
+* ``max_warnings`` active warnings: ban
+
+Active warnings decay: every ``warning_decay_days`` without a new warning one
+of them expires (0 = never). ``expire_warnings()`` runs as a job of the
+ID-Finder bot; ``record_warning()`` applies pending decay itself, so the
+escalation is right even if the job has not run yet.
+"""
+import os
+import time
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from database import SessionLocal, User, ModerationLog, WarningCounter
+
+logger = logging.getLogger(__name__)
+
+MODERATION_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "moderation_config.json")
+DEFAULT_MAX_WARNINGS = 3
+DEFAULT_MUTE_AFTER_WARNINGS = 0
+DEFAULT_MUTE_MINUTES = 60
+DEFAULT_WARNING_DECAY_DAYS = 0
+EXPIRE_INTERVAL_SECONDS = 3600
+
+
+def load_moderation_config():
+    if not os.path.exists(MODERATION_CONFIG_FILE):
+        return {}
+    try:
+        with open(MODERATION_CONFIG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Fehler beim Laden von {MODERATION_CONFIG_FILE}: {e}")
+        return {}
+
+
+def _decay_window(cfg):
+    days = cfg.get("warning_decay_days", DEFAULT_WARNING_DECAY_DAYS)
+    return timedelta(days=days) if days and days > 0 else None
+
+
+def _decay(counter, now, window):
+    """Expire the warnings whose decay window has passed; returns how many expired."""
+    if window is None or not counter.active or counter.decay_from is None:
+        return 0
+    steps = max(0, min(counter.active, int((now - counter.decay_from) / window)))
+    if steps:
+        counter.active -= steps
+        counter.decay_from += steps * window
+    return steps
+
+
+def escalation_for(active, cfg):
+    """Automatic action at ``active`` warnings: ("ban", None), ("mute", minutes) or None."""
+    max_warnings = cfg.get("max_warnings", DEFAULT_MAX_WARNINGS)
+    if max_warnings and active >= max_warnings:
+        return ("ban", None)
+    mute_after = cfg.get("mute_after_warnings", DEFAULT_MUTE_AFTER_WARNINGS)
+    if mute_after and active >= mute_after:
+        return ("mute", cfg.get("mute_minutes", DEFAULT_MUTE_MINUTES))
+    return None
+
+
+def escalation_api_call(chat_id, user_id, escalation):
+    """Bot API method and payload that carry out an escalation."""
+    action, minutes = escalation
+    if action == "ban":
+        return "banChatMember", {"chat_id": chat_id, "user_id": user_id}
+    # Permissions that are not listed are revoked as well
+    return "restrictChatMember", {"chat_id": chat_id, "user_id": user_id, "permissions": {"can_send_messages": False},
+                                  "until_date": int(time.time()) + minutes * 60}
+
+
+def active_warnings(session, chat_id, user_id, cfg, now=None):
+    """Active warnings of a user in a chat (pending decay applied, nothing written)."""
+    counter = session.get(WarningCounter, (chat_id, user_id))
+    if not counter:
+        return 0
+    window = _decay_window(cfg)
+    if window is None or not counter.active or counter.decay_from is None:
+        return counter.active
+    return counter.active - max(0, min(counter.active, int(((now or datetime.utcnow()) - counter.decay_from) / window)))
+
+
+def _lock_counter(session, chat_id, user_id):
+    """The counter row of (chat, user), created if missing and locked until the caller commits."""
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    session.flush() # populate_existing() below would overwrite unflushed changes (several warnings in one transaction)
+    # A write first: on SQLite it takes the write lock (and the writer queue), so the read below sees
+    # the latest committed counter and no other writer can change it before our commit
+    session.execute(insert(WarningCounter).values(chat_id=chat_id, user_id=user_id, active=0, total=0)
+                    .on_conflict_do_nothing(index_elements=["chat_id", "user_id"]))
+    return session.query(WarningCounter).filter(WarningCounter.chat_id == chat_id, WarningCounter.user_id == user_id)\
+        .with_for_update().populate_existing().one()
+
+
+def record_warning(session, chat_id, user_id, cfg, admin_id=0, reason=None, message_id=None, now=None):
+    """Log a warning and count it; returns (active warnings, escalation or None). The caller commits.
+
+    An escalation is logged in the same transaction; carrying it out
+    (``escalation_api_call()``) is up to the caller.
+    """
+    now = now or datetime.utcnow()
+    session.add(ModerationLog(ts=now, chat_id=chat_id, user_id=user_id, admin_id=admin_id, action="warn", reason=reason, message_id=message_id))
+    counter = _lock_counter(session, chat_id, user_id)
+    _decay(counter, now, _decay_window(cfg))
+    counter.active += 1
+    counter.total += 1
+    counter.last_warned_at = now
+    counter.decay_from = now # the clean period starts again with every warning
+    session.query(User).filter(User.id == user_id).update({User.warning_count: User.warning_count + 1}, synchronize_session=False)
+
+    escalation = escalation_for(counter.active, cfg)
+    if escalation:
+        action, minutes = escalation
+        note = f"Automatisch nach {counter.active} Verwarnungen" + (f" ({minutes} Min.)" if minutes else "")
+        session.add(ModerationLog(ts=now, chat_id=chat_id, user_id=user_id, admin_id=admin_id, action=action, reason=note, message_id=message_id))
+    return counter.active, escalation
+
+
+def expire_warnings(cfg=None, now=None):
+    """Apply the decay to all counters that are due; returns the number of expired warnings."""
+    cfg = load_moderation_config() if cfg is None else cfg
+    window = _decay_window(cfg)
+    if window is None:
+        return 0
+    now = now or datetime.utcnow()
+    expired = 0
+    with SessionLocal() as session:
+        due = session.query(WarningCounter).filter(WarningCounter.decay_from <= now - window, WarningCounter.active > 0).with_for_update().all()
+        for counter in due:
+            expired += _decay(counter, now, window)
+        session.commit()
+    if expired:
+        logger.info(f"Moderation: {expired} Verwarnungen abgelaufen.")
+    return expired
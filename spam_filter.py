@@ -0,0 +1,154 @@
+"""Streaming spam and flood rules for the ID-Finder's message stream.
+
+``SpamFilter.check()`` runs inline in ``track_activity`` for every group
+message and only touches in-memory state, so its cost per message is a few
+dict/deque operations plus one regex search:
+
+* flood: messages per user and chat in a sliding window
+* chat flood: messages per chat in a sliding window (raids)
+* duplicates: the same text (normalized: case, spaces and punctuation
+  ignored) repeatedly from the same user in a sliding window
+* links and keywords: one combined, case-insensitive regex
+
+All counters evict keys that have been idle for longer than their window and
+never hold more than ``MAX_TRACKED_KEYS`` keys, so memory stays bounded.
+What happens with a hit (delete, warn, mute) is decided by the bot; it goes
+through ``ModerationLog`` like the live moderation in the dashboard.
+
+Settings live in ``data/moderation_config.json`` next to the escalation
+settings (see moderation.py).
+"""
+import re
+import hashlib
+from collections import OrderedDict
+
+SPAM_ACTIONS = ("delete", "warn", "mute")
+DEFAULT_SPAM_CONFIG = {
+    "spam_enabled": False,
+    "spam_action": "delete",
+    "flood_max_messages": 8, # per user and chat, 0 = off
+    "flood_window_seconds": 10,
+    "chat_flood_max_messages": 0, # per chat, 0 = off
+    "chat_flood_window_seconds": 10,
+    "duplicate_max_messages": 3, # same text per user, 0 = off
+    "duplicate_window_seconds": 300,
+    "duplicate_min_length": 10,
+    "block_links": False,
+    "link_whitelist": ["t.me", "telegram.me"],
+    "blocked_keywords": [],
+    "spam_exempt_user_ids": [],
+}
+MAX_TRACKED_KEYS = 20000
+ACTION_COOLDOWN_SECONDS = 60 # further hits of the same user only delete, no new warn/mute
+
+LINK_PATTERN = r"(?:https?://|www\.)[^\s/]+|\b[a-z0-9][a-z0-9-]*(?:\.[a-z0-9-]+)*\.(?:com|net|org|de|at|ch|io|me|ru|xyz|info|biz|top|club|link|ly|gg)\b"
+_NORMALIZE = re.compile(r"[\W_]+")
+
+
+class SlidingWindowCounter:
+    """Events per key in the last ``window`` seconds, counted up to ``limit + 1``.
+
+    Keys are kept in least-recently-hit order; keys whose last event left the
+    window are dropped from the front on every hit.
+    """
+
+    def __init__(self, window, limit, max_keys=MAX_TRACKED_KEYS):
+        self.window = window
+        self.limit = limit
+        self.max_keys = max_keys
+        self._events = OrderedDict()
+
+    def __len__(self):
+        return len(self._events)
+
+    def hit(self, key, now):
+        """Record an event; returns the events of ``key`` in the window (at most ``limit + 1``)."""
+        cutoff = now - self.window
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = [] # short list instead of a deque: much smaller per key
+        else:
+            self._events.move_to_end(key)
+        events.append(now)
+        drop = 0
+        while events[drop] <= cutoff:
+            drop += 1
+        drop = max(drop, len(events) - self.limit - 1)
+        if drop:
+            del events[:drop]
+        self._evict(cutoff)
+        return len(events)
+
+    def _evict(self, cutoff):
+        while self._events:
+            key, events = next(iter(self._events.items()))
+            if events[-1] > cutoff and len(self._events) <= self.max_keys:
+                break
+            del self._events[key]
+
+
+def _domain(match):
+    return re.sub(r"^(?:https?://)?(?:www\.)?", "", match.lower()).split("/")[0].split(":")[0]
+
+
+class SpamFilter:
+    def __init__(self, cfg=None):
+        cfg = {**DEFAULT_SPAM_CONFIG, **(cfg or {})}
+        self.enabled = bool(cfg["spam_enabled"])
+        self.action = cfg["spam_action"] if cfg["spam_action"] in SPAM_ACTIONS else "delete"
+        self.exempt = {int(u) for u in cfg["spam_exempt_user_ids"] if str(u).lstrip("-").isdigit()}
+        self.duplicate_min_length = cfg["duplicate_min_length"]
+        self.link_whitelist = {d.lower().lstrip(".") for d in cfg["link_whitelist"] if d}
+
+        def counter(limit, window):
+            return SlidingWindowCounter(window, limit) if limit and limit > 0 and window and window > 0 else None
+
+        self.flood = counter(cfg["flood_max_messages"], cfg["flood_window_seconds"])
+        self.chat_flood = counter(cfg["chat_flood_max_messages"], cfg["chat_flood_window_seconds"])
+        self.duplicates = counter(cfg["duplicate_max_messages"], cfg["duplicate_window_seconds"])
+        self.cooldown = SlidingWindowCounter(ACTION_COOLDOWN_SECONDS, 1)
+
+        # Keywords and links in one pass: longest keywords first, so overlapping ones report the longer match
+        alternatives = []
+        keywords = sorted({k.strip().lower() for k in cfg["blocked_keywords"] if k and k.strip()}, key=len, reverse=True)
+        if keywords:
+            alternatives.append(r"(?P<keyword>(?<!\w)(?:" + "|".join(re.escape(k) for k in keywords) + r")(?!\w))")
+        if cfg["block_links"]:
+            alternatives.append(f"(?P<link>{LINK_PATTERN})")
+        self.matcher = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def _match(self, text):
+        for m in self.matcher.finditer(text):
+            if m.lastgroup == "keyword":
+                return ("keyword", m.group())
+            domain = _domain(m.group())
+            if not any(domain == d or domain.endswith("." + d) for d in self.link_whitelist):
+                return ("link", domain)
+        return None
+
+    def check(self, chat_id, user_id, text, now):
+        """Rule hit for a message as (rule, detail, action), or None. ``now`` in seconds (e.g. time.monotonic())."""
+        if not self.enabled or user_id in self.exempt:
+            return None
+        hit = None
+        # Rate counters see every message, also the ones that hit another rule
+        if self.chat_flood is not None and self.chat_flood.hit(chat_id, now) > self.chat_flood.limit:
+            hit = ("chat_flood", f"> {self.chat_flood.limit} Nachrichten in {self.chat_flood.window}s")
+        if self.flood is not None and self.flood.hit((chat_id, user_id), now) > self.flood.limit and not hit:
+            hit = ("flood", f"> {self.flood.limit} Nachrichten in {self.flood.window}s")
+        if text:
+            if self.duplicates is not None:
+                normalized = _NORMALIZE.sub("", text.casefold())
+                if len(normalized) >= self.duplicate_min_length:
+                    digest = hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+                    if self.duplicates.hit((chat_id, user_id, digest), now) > self.duplicates.limit and not hit:
+                        hit = ("duplicate", f"gleicher Text > {self.duplicates.limit}x in {self.duplicates.window}s")
+            if self.matcher and not hit:
+                hit = self._match(text)
+        if not hit:
+            return None
+        # A raid is throttled by deleting only; one warn/mute per user and cooldown
+        action = "delete" if hit[0] == "chat_flood" else self.action
+        if action != "delete" and self.cooldown.hit((chat_id, user_id), now) > 1:
+            action = "delete"
+        return (hit[0], hit[1], action)
@@ -0,0 +1,73 @@
+"""Live moderation continues into the monthly archive once the hot activities run out."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as dashboard
+from conftest import rendered_context
+from activity_archive import run_archive, archived_activities
+from database import SessionLocal, User, Activity
+
+NOW = datetime.now().replace(microsecond=0)
+CHAT = -100
+
+
+@pytest.fixture
+def archived(client, monkeypatch):
+    monkeypatch.setattr(dashboard, "LIVE_MODERATION_PAGE_SIZE", 10)
+    with SessionLocal() as session:
+        session.add(User(id=1, username="anna", full_name="Anna"))
+        # 6 hot messages (last days), 12 old ones in two topics that the archive job moves out
+        session.add_all(Activity(ts=NOW - timedelta(hours=i + 1), chat_id=CHAT, thread_id=1, user_id=1, message_id=i, text=f"neu {i}") for i in range(6))
+        session.add_all(Activity(ts=NOW - timedelta(days=60 + i), chat_id=CHAT, thread_id=1 + i % 2, user_id=1, message_id=100 + i, text=f"alt {i}") for i in range(12))
+        session.commit()
+    moved, _ = run_archive(retention_days=30, archive_months=0)
+    assert moved == 12
+    return client
+
+
+def test_archived_activities_filters(archived):
+    rows = archived_activities(chat_id=CHAT, thread_id=2, limit=100)
+    assert [r["text"] for r in rows] == [f"alt {i}" for i in range(1, 12, 2)]
+
+
+def test_live_moderation_pages_into_archive(archived):
+    first = rendered_context(archived, "/live-moderation", chat_id=CHAT)
+    texts = [m.text for m in first["messages"]]
+    assert texts == [f"neu {i}" for i in range(6)] + [f"alt {i}" for i in range(4)]
+    assert [bool(getattr(m, "archived", False)) for m in first["messages"]] == [False] * 6 + [True] * 4
+    assert first["messages"][6].user.full_name == "Anna"
+
+    second = rendered_context(archived, "/live-moderation", chat_id=CHAT, until=first["next_until"])
+    assert [m.text for m in second["messages"]] == [f"alt {i}" for i in range(4, 12)]
+    assert second["next_until"] is None
+
+
+def test_live_moderation_topic_filter_in_archive(archived):
+    page = rendered_context(archived, "/live-moderation", chat_id=CHAT, topic_id=2)
+    assert [m.text for m in page["messages"]] == [f"alt {i}" for i in range(1, 12, 2)]
+
+
+def test_archive_text_search(archived):
+    rows = archived_activities(text="ALT 1", limit=100)
+    assert sorted(r["text"] for r in rows) == ["alt 1", "alt 10", "alt 11"]
+    assert [r["text"] for r in archived_activities(text='"alt 1" 0', limit=100)] == ["alt 10"]
+    assert archived_activities(text="%", limit=100) == []
+
+
+def test_message_search_in_archive(archived):
+    # The full-text index only holds the hot messages
+    assert archived.get("/api/live-moderation/search", query_string={"q": "alt"}).get_json()["results"] == []
+
+    data = archived.get("/api/live-moderation/search", query_string={"q": "alt", "archive": "1", "limit": 5, "topic_id": 1}).get_json()
+    assert [r["snippet"] for r in data["results"]] == [f"<mark>alt</mark> {i}" for i in range(0, 10, 2)]
+    assert all(r["archived"] for r in data["results"])
+
+    rest = archived.get("/api/live-moderation/search", query_string={"q": "alt", "archive": "1", "limit": 5, "topic_id": 1, "before": data["next_before"]}).get_json()
+    assert [r["snippet"] for r in rest["results"]] == ["<mark>alt</mark> 10"]
+    assert rest["next_before"] is None
+
+    page = archived.get("/live-moderation/search", query_string={"q": "alt"}).get_data(as_text=True)
+    assert "liegen nur im Archiv" in page
+    page = archived.get("/live-moderation/search", query_string={"q": "alt", "archive": "1"}).get_data(as_text=True)
+    assert "Treffer im Archiv" in page and "<mark>alt</mark> 11" in page
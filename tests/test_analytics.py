@@ -0,0 +1,42 @@
+"""Hour and weekday charts of /id-finder/analytics (extract('hour'/'dow'), raw activities and rollups)."""
+from datetime import datetime
+
+from conftest import rendered_context
+from database import SessionLocal, User, Activity, ActivityRollup
+
+WEDNESDAY = datetime(2026, 10, 14, 13, 5)
+SUNDAY = datetime(2026, 10, 18, 23, 59)
+MONDAY = datetime(2026, 10, 12, 5, 0)
+
+
+def test_hours_and_weekdays(client):
+    with SessionLocal() as session:
+        session.add(User(id=1, username="anna", full_name="Anna"))
+        session.add_all(Activity(ts=WEDNESDAY.replace(minute=m), chat_id=-100, user_id=1, message_id=m, text="x") for m in (0, 20, 40))
+        session.add(Activity(ts=SUNDAY, chat_id=-100, user_id=1, message_id=99, text="x", has_media=True))
+        # Archived hour: only the rollup remains
+        session.add(ActivityRollup(bucket_start=MONDAY, chat_id=-100, user_id=1, messages=4, media=1))
+        session.commit()
+
+    activity = rendered_context(client, "/id-finder/analytics")["activity"]
+
+    hours = [0] * 24
+    hours[13], hours[23], hours[5] = 3, 1, 4
+    assert activity["busiest_hours"] == hours
+    # Chart order Mo..So
+    assert activity["busiest_days"] == [4, 0, 3, 0, 0, 0, 1]
+    assert activity["timeline"] == {"labels": ["2026-10-12", "2026-10-14", "2026-10-18"], "total": [4, 3, 1]}
+    assert activity["leaderboard"][0] == {"uid": 1, "name": "Anna", "msgs": 8, "media": 2, "reacts": 0}
+
+
+def test_month_filter(client):
+    with SessionLocal() as session:
+        session.add(User(id=1, username="anna", full_name="Anna"))
+        session.add(Activity(ts=WEDNESDAY, chat_id=-100, user_id=1, message_id=1, text="x"))
+        session.add(Activity(ts=datetime(2026, 9, 30, 8, 0), chat_id=-100, user_id=1, message_id=2, text="x"))
+        session.commit()
+
+    activity = rendered_context(client, "/id-finder/analytics", month=10, year=2026)["activity"]
+
+    assert sum(activity["busiest_hours"]) == 1
+    assert activity["busiest_days"][2] == 1
@@ -0,0 +1,92 @@
+"""Query building of the message search: FTS5 on SQLite, to_tsquery() on PostgreSQL."""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import app as dashboard
+from database import SessionLocal, User, Activity
+
+# Input that must never turn into a syntax error: quotes, operators, punctuation
+AWKWARD_QUERIES = ['"', '""', '"offen', 'AND', 'a OR', 'NOT b', '-x', '*', 'foo*', '(a', 'a:b', 'c++', "l'été", "!!!", "a & b | c", "<->"]
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("hallo", '"hallo"*'),
+    ("hallo welt", '"hallo" "welt"*'),
+    ("hallo welt ", '"hallo" "welt"*'),
+    ('"guten morgen" welt', '"guten morgen" "welt"*'),
+    ('welt "guten morgen"', '"welt" "guten morgen"'),
+    ("Grüße, Jürgen!", '"Grüße" "Jürgen"*'),
+    ("c++ AND -x", '"c" "AND" "x"*'),
+    ("", None),
+    ("  ", None),
+    ('"" !!!', None),
+    (None, None),
+])
+def test_fts_query(q, expected):
+    assert dashboard._fts_query(q) == expected
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("hallo", "hallo:*"),
+    ("hallo welt", "hallo & welt:*"),
+    ('"guten morgen" welt', "(guten <-> morgen) & welt:*"),
+    ('welt "guten morgen"', "welt & (guten <-> morgen)"),
+    ("Grüße, Jürgen!", "Grüße & Jürgen:*"),
+    ("a & b | c", "a & b & c:*"),
+    ("", None),
+    ('"" !!!', None),
+])
+def test_tsquery(q, expected):
+    assert dashboard._tsquery(q) == expected
+
+
+@pytest.fixture
+def messages(db):
+    with SessionLocal() as session:
+        session.add(User(id=1, username="anna", full_name="Anna"))
+        session.add_all(Activity(ts=datetime(2026, 10, 1, 12, i), chat_id=-100, user_id=1, message_id=i, text=t) for i, t in enumerate([
+            "Guten Morgen zusammen",
+            "Morgen ist das Treffen",
+            "Grüße aus München",
+            "c++ oder Python?",
+        ]))
+        session.commit()
+    return db
+
+
+def _texts(db, q, sort="rank"):
+    with Session(db) as session:
+        return sorted(r["snippet"].replace("<mark>", "").replace("</mark>", "") for r in dashboard._search_messages(session, q, limit=10, sort=sort))
+
+
+def test_search_sqlite(messages):
+    assert _texts(messages, "morgen") == ["Guten Morgen zusammen", "Morgen ist das Treffen"]
+    assert _texts(messages, '"guten morgen"') == ["Guten Morgen zusammen"]
+    assert _texts(messages, "Mün") == ["Grüße aus München"]
+    assert _texts(messages, "grüße münchen", sort="newest") == ["Grüße aus München"]
+    assert _texts(messages, "c++") == ["c++ oder Python?"]
+
+
+@pytest.mark.parametrize("q", AWKWARD_QUERIES)
+def test_search_sqlite_never_fails(messages, q):
+    _texts(messages, q)
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL nicht gesetzt")
+@pytest.mark.parametrize("q", ["guten morgen", '"guten morgen"', "Grüße, Jürgen!", *AWKWARD_QUERIES])
+def test_tsquery_postgresql(q):
+    query = dashboard._tsquery(q)
+    if query is None:
+        return
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT to_tsquery('simple', :q)"), {"q": query})
+            matched = conn.execute(text("SELECT to_tsvector('simple', :t) @@ to_tsquery('simple', :q)"), {"t": "Guten Morgen, Grüße an Jürgen", "q": query}).scalar()
+        assert matched == (q in ("guten morgen", '"guten morgen"', "Grüße, Jürgen!"))
+    finally:
+        engine.dispose()
@@ -0,0 +1,127 @@
+"""migrate_database.main() from the test database into a second SQLite file (and PostgreSQL with TEST_DATABASE_URL)."""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, func, update, delete
+
+import migrate_database
+from database import Base, SessionLocal, DB_PATH, User, Activity, ActivityRollup, Broadcast, InviteProfile, Topic
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def target(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path / 'target.db'}"
+    else:
+        url = os.environ.get("TEST_DATABASE_URL")
+        if not url:
+            pytest.skip("TEST_DATABASE_URL nicht gesetzt")
+    target_engine = create_engine(url)
+    Base.metadata.drop_all(target_engine)
+    yield url, target_engine
+    Base.metadata.drop_all(target_engine)
+    target_engine.dispose()
+
+
+@pytest.fixture
+def source(db):
+    start = datetime(2026, 10, 1, 12, 0)
+    with SessionLocal() as session:
+        users = [User(id=1_000_000_000 + i, username=f"user{i}", full_name=f"Jürgen Öztürk {i}") for i in range(30)]
+        session.add_all(users)
+        session.flush()
+        session.add_all(
+            Activity(ts=start + timedelta(minutes=i), chat_id=-1001234567890, chat_type="supergroup", message_id=i,
+                     user_id=users[i % len(users)].id, text=f"Nachricht {i} mit Ümlaut", msg_type="text", has_media=i % 7 == 0)
+            for i in range(250)
+        )
+        session.add_all(
+            ActivityRollup(bucket_start=start - timedelta(days=90, hours=h), chat_id=-1001234567890, user_id=users[h].id, messages=h + 1)
+            for h in range(10)
+        )
+        session.add(InviteProfile(user_id=users[0].id, answers={"alter": 30, "hobbys": ["Lesen", "Rad"]}))
+        session.add_all(Broadcast(id=f"b-{i}", text=f"Rundschreiben {i}", send_mode="immediate") for i in range(3))
+        session.add(Topic(chat_id=-1001234567890, topic_id=7, name="Allgemein"))
+        session.commit()
+    return db
+
+
+def _counts(conn):
+    return {t.name: conn.execute(select(func.count()).select_from(t)).scalar() for t in Base.metadata.sorted_tables}
+
+
+def test_copy_and_verify(source, target, capsys):
+    url, target_engine = target
+    migrate_database.main([url, "--batch-size", "40"])
+
+    assert "Alle Tabellen stimmen überein." in capsys.readouterr().out
+    with source.connect() as src, target_engine.connect() as dst:
+        assert _counts(src) == _counts(dst)
+        assert dst.execute(select(InviteProfile.answers)).scalar() == {"alter": 30, "hobbys": ["Lesen", "Rad"]}
+        assert dst.execute(select(User.search_name).where(User.id == 1_000_000_000)).scalar() == "jürgen öztürk 0"
+
+
+def test_refuses_filled_target_without_resume(source, target):
+    url, _ = target
+    migrate_database.main([url, "--no-verify"])
+    with pytest.raises(SystemExit, match="--resume"):
+        migrate_database.main([url])
+
+
+def test_resume_after_interruption(source, target):
+    url, target_engine = target
+    migrate_database.main([url, "--batch-size", "40", "--no-verify"])
+    # As if the run stopped in the middle of activities, before broadcasts and rollups
+    with target_engine.begin() as conn:
+        conn.execute(delete(Activity).where(Activity.id > 95))
+        conn.execute(delete(Broadcast))
+        conn.execute(delete(ActivityRollup))
+
+    migrate_database.main([url, "--batch-size", "40", "--resume"])
+
+    with source.connect() as src, target_engine.connect() as dst:
+        assert _counts(src) == _counts(dst)
+
+
+def test_verify_detects_changed_row(source, target):
+    url, target_engine = target
+    migrate_database.main([url, "--no-verify"])
+    with target_engine.begin() as conn:
+        conn.execute(update(Activity).where(Activity.id == 42).values(text="geändert"))
+
+    with pytest.raises(SystemExit, match="activities") as exc:
+        migrate_database.main([url, "--verify-only"])
+    assert "Unterschiede in 1 Tabellen" in str(exc.value)
+
+
+def test_verify_detects_missing_row(source, target):
+    url, target_engine = target
+    migrate_database.main([url, "--no-verify"])
+    with target_engine.begin() as conn:
+        conn.execute(delete(Topic))
+
+    with pytest.raises(SystemExit, match="topics"):
+        migrate_database.main([url, "--verify-only"])
+
+
+def test_rejects_orphans(source, target, capsys):
+    url, target_engine = target
+    # SQLite only enforces foreign keys with PRAGMA foreign_keys=ON, older databases may contain such rows
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("INSERT INTO activities (ts, chat_id, user_id, text) VALUES ('2026-10-01 12:00:00', -100, 999, 'verwaist')")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(SystemExit) as exc:
+        migrate_database.main([url])
+    assert exc.value.code == 1
+    assert "activities.user_id: 1 Zeilen verweisen auf fehlende users.id" in capsys.readouterr().out
+    # Nothing was created in the target
+    assert "activities" not in inspect(target_engine).get_table_names()
+
+
+def test_same_database_is_refused(source):
+    with pytest.raises(SystemExit, match="dieselbe"):
+        migrate_database.main([str(source.url)])
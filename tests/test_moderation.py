@@ -0,0 +1,95 @@
+"""Warning counters under concurrent warnings (two writers on the same chat and user)."""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, func
+
+from database import SessionLocal, User, ModerationLog, WarningCounter
+from moderation import record_warning, expire_warnings
+
+CHAT, USER = -100, 1
+CFG = {"max_warnings": 3, "mute_after_warnings": 0, "warning_decay_days": 0}
+
+
+@pytest.fixture
+def user(db):
+    with SessionLocal() as session:
+        session.add(User(id=USER, username="anna", full_name="Anna"))
+        session.commit()
+    return db
+
+
+def _warn_concurrently():
+    """A warns and commits 0.5 s later; B warns before A has committed. Returns (A's result, B's result)."""
+    results, errors = {}, []
+    warned = threading.Event()
+
+    def first():
+        try:
+            with SessionLocal() as session:
+                results["a"] = record_warning(session, CHAT, USER, CFG, reason="A")
+                warned.set()
+                threading.Event().wait(0.5)
+                session.commit()
+        except Exception as e:
+            errors.append(e)
+            warned.set()
+
+    def second():
+        warned.wait()
+        try:
+            with SessionLocal() as session:
+                results["b"] = record_warning(session, CHAT, USER, CFG, reason="B")
+                session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not errors
+    return results["a"], results["b"]
+
+
+def _state(engine):
+    with engine.connect() as conn:
+        warns = conn.execute(select(func.count()).select_from(ModerationLog).where(ModerationLog.action == "warn")).scalar()
+        counter = conn.execute(select(WarningCounter.active, WarningCounter.total)).one()
+        warning_count = conn.execute(select(User.warning_count).where(User.id == USER)).scalar()
+    return warns, tuple(counter), warning_count
+
+
+def test_first_warnings_concurrently(user):
+    a, b = _warn_concurrently()
+
+    assert (a[0], b[0]) == (1, 2)
+    assert _state(user) == (2, (2, 2), 2)
+
+
+def test_concurrent_warnings_reach_the_ban(user):
+    with SessionLocal() as session:
+        record_warning(session, CHAT, USER, CFG, reason="vorher")
+        session.commit()
+
+    a, b = _warn_concurrently()
+
+    assert (a, b) == ((2, None), (3, ("ban", None)))
+    assert _state(user) == (3, (3, 3), 3)
+
+
+def test_decay(user):
+    cfg = {**CFG, "max_warnings": 0, "warning_decay_days": 7}
+    start = datetime(2026, 10, 1, 12, 0)
+    with SessionLocal() as session:
+        for day in (0, 1):
+            record_warning(session, CHAT, USER, cfg, now=start + timedelta(days=day))
+        session.commit()
+
+    assert expire_warnings(cfg, now=start + timedelta(days=16)) == 2
+    with SessionLocal() as session:
+        assert record_warning(session, CHAT, USER, cfg, now=start + timedelta(days=16))[0] == 1
+        session.commit()
+    assert _state(user)[1] == (1, 3)
@@ -0,0 +1,60 @@
+"""WriterQueue: the flock between processes after a timed-out wait."""
+import threading
+import time
+
+import pytest
+
+from database import WriterQueue, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="ohne fcntl nur Thread-Warteschlange")
+
+
+def _locked_elsewhere(path):
+    """True if another open file description (i.e. another process) cannot take the lock right now."""
+    with open(path, "a+b") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return False
+
+
+def test_late_helper_does_not_release_the_next_turn(tmp_path):
+    path = str(tmp_path / "db.writer-lock")
+    queue = WriterQueue(path, timeout=0.2)
+    other_process = open(path, "a+b")
+    fcntl.flock(other_process, fcntl.LOCK_EX)
+
+    with pytest.raises(TimeoutError):
+        queue.acquire()
+
+    # The next turn waits as well; when the other process finishes, it and the helper of the timed-out
+    # wait both get the lock. The helper hands its lock back, the next turn must keep its own.
+    queue.timeout = 2
+    acquired = threading.Event()
+    def next_turn():
+        with queue:
+            acquired.set()
+            time.sleep(0.5)
+    thread = threading.Thread(target=next_turn)
+    thread.start()
+    time.sleep(0.1)
+    other_process.close()
+    assert acquired.wait(2)
+    time.sleep(0.2)
+    assert _locked_elsewhere(path)
+    thread.join()
+    assert not _locked_elsewhere(path)
+
+
+def test_blocking_wait_takes_the_lock(tmp_path):
+    path = str(tmp_path / "db.writer-lock")
+    queue = WriterQueue(path, timeout=2)
+    other_process = open(path, "a+b")
+    fcntl.flock(other_process, fcntl.LOCK_EX)
+    threading.Timer(0.2, other_process.close).start()
+
+    with queue:
+        assert _locked_elsewhere(path)
+    assert not _locked_elsewhere(path)
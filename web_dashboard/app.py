@@ -1,16 +1,20 @@
 import os
+import re
 import json
 import logging
-from logging.handlers import RotatingFileHandler
 import subprocess
 import sys
 import time
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from time import perf_counter
+from types import SimpleNamespace
 from flask import (
-    Flask, render_template, request, flash, redirect, url_for, jsonify, send_file, abort, session
+    Flask, render_template, request, flash, redirect, url_for, jsonify, send_file, abort, session, g, has_request_context, Response
 )
-from sqlalchemy import func, desc, extract, and_
+from sqlalchemy import func, desc, extract, and_, or_, tuple_, event, Integer, text, cast
+from sqlalchemy.exc import OperationalError
+from markupsafe import escape
 from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
@@ -25,8 +29,14 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR)
 if BASE_DIR not in sys.path: sys.path.append(BASE_DIR)
 if PROJECT_ROOT not in sys.path: sys.path.append(PROJECT_ROOT)
 
-from database import SessionLocal, User, Activity, Topic, Broadcast, ModerationLog, init_db
+from database import engine, read_engine, SessionLocal, ReadSessionLocal, User, Activity, Topic, Broadcast, ModerationLog, QuizPoll, QuizScore, McStatusSample, McStatusBucket, InviteInteraction, LogEntry, ActivityRollup, UserDailyActivity, ACTIVITY_TSVECTOR, search_key, init_db
+from bot_logging import setup_logging
+from metrics import Registry, COUNT_BUCKETS, BOT_METRICS_HOST, BOT_METRICS_PORTS
 from updater import Updater
+from log_reader import tail_lines, tail_text, follow
+from activity_archive import rollup_query, archive_stats, archived_activities, retention_cutoff, text_terms, DEFAULT_RETENTION_DAYS, DEFAULT_ARCHIVE_MONTHS
+from moderation import record_warning, active_warnings, escalation_api_call, MODERATION_CONFIG_FILE
+from spam_filter import SPAM_ACTIONS, DEFAULT_SPAM_CONFIG
 
 # --- App Setup ---
 app = Flask(__name__, template_folder="src")
@@ -36,10 +46,70 @@ app.config["UPLOAD_FOLDER"] = os.path.join(BASE_DIR, "uploads")
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
 # --- Logging ---
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", handlers=[RotatingFileHandler("app.log", maxBytes=10240, backupCount=5), logging.StreamHandler(sys.stdout)], force=True)
+setup_logging("dashboard", os.path.join(BASE_DIR, "app.log"))
 log = logging.getLogger(__name__)
 
 CRITICAL_ERRORS_LOG_FILE = os.path.join(BASE_DIR, "critical_errors.log")
+CRITICAL_ERRORS_TAIL_LINES = 1000
+
+# --- Metrics (per process, exported at /metrics) ---
+metrics = Registry()
+METRICS_STARTED = datetime.now()
+REQUEST_SECONDS = metrics.histogram("dashboard_request_seconds", "Dashboard request latency per route", ("route", "method"))
+REQUESTS_TOTAL = metrics.counter("dashboard_requests_total", "Dashboard requests per route and status", ("route", "method", "status"))
+REQUEST_DB_QUERIES = metrics.histogram("dashboard_request_db_queries", "SQL statements per dashboard request", ("route",), buckets=COUNT_BUCKETS)
+DB_QUERY_SECONDS = metrics.histogram("dashboard_db_query_seconds", "SQL statement latency per route ('-' = outside a request)", ("route",))
+TELEGRAM_SECONDS = metrics.histogram("dashboard_telegram_seconds", "Bot API call latency from the dashboard", ("method",))
+TELEGRAM_ERRORS = metrics.counter("dashboard_telegram_errors_total", "Bot API calls from the dashboard that failed or returned non-200", ("method",))
+TELEGRAM_TIMEOUT_SECONDS = 15
+BOT_METRICS_TIMEOUT_SECONDS = 0.5
+
+def _metrics_route():
+    if not has_request_context(): return "-"
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+# Registered before check_for_setup so redirected requests are measured too
+@app.before_request
+def _start_request_timer():
+    g.request_start = perf_counter()
+    g.db_queries = 0
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is None: return response
+    route = _metrics_route()
+    REQUEST_SECONDS.observe(perf_counter() - start, route=route, method=request.method)
+    REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_DB_QUERIES.observe(g.get("db_queries", 0), route=route)
+    return response
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None: context._query_start = perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None: return
+    DB_QUERY_SECONDS.observe(perf_counter() - start, route=_metrics_route())
+    if has_request_context(): g.db_queries = g.get("db_queries", 0) + 1
+
+for _engine in (engine, read_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+def telegram_api(token, method, http_method="post", **kwargs):
+    """Bot API call with timeout and latency metrics; returns the requests.Response."""
+    kwargs.setdefault("timeout", TELEGRAM_TIMEOUT_SECONDS)
+    start = perf_counter()
+    try:
+        res = requests.request(http_method, f"https://api.telegram.org/bot{token}/{method}", **kwargs)
+    except Exception:
+        TELEGRAM_ERRORS.inc(method=method)
+        raise
+    finally:
+        TELEGRAM_SECONDS.observe(perf_counter() - start, method=method)
+    if res.status_code != 200: TELEGRAM_ERRORS.inc(method=method)
+    return res
 
 # --- Pfade ---
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
@@ -54,7 +124,7 @@ QUIZ_BOT_CONFIG_FILE = os.path.join(BOTS_DIR, "quiz_bot", "quiz_bot_config.json"
 UMFRAGE_BOT_CONFIG_FILE = os.path.join(BOTS_DIR, "umfrage_bot", "umfrage_bot_config.json")
 INVITE_BOT_CONFIG_FILE = os.path.join(BOTS_DIR, "invite_bot", "invite_bot_config.json")
 INVITE_BOT_LOG_FILE = os.path.join(BOTS_DIR, "invite_bot", "invite_bot.log")
-INVITE_BOT_INTERACTION_LOG = os.path.join(BOTS_DIR, "invite_bot", "user_interactions.log")
+INVITE_JOIN_METRICS_FILE = os.path.join(DATA_DIR, "invite_join_metrics.json")
 OUTFIT_BOT_CONFIG_FILE = os.path.join(BOTS_DIR, "outfit_bot", "outfit_bot_config.json")
 OUTFIT_BOT_DATA_FILE = os.path.join(BOTS_DIR, "outfit_bot", "outfit_bot_data.json")
 OUTFIT_BOT_LOG_FILE = os.path.join(BOTS_DIR, "outfit_bot", "outfit_bot.log")
@@ -72,8 +142,16 @@ MATCH_CONFIG = {
     "invite": {"pattern": "invite_bot.py", "script": os.path.join(BOTS_DIR, "invite_bot", "invite_bot.py"), "log": os.path.join(BOTS_DIR, "invite_bot", "invite_bot.log")},
     "id_finder": {"pattern": "id_finder_bot.py", "script": os.path.join(BOTS_DIR, "id_finder_bot", "id_finder_bot.py"), "log": os.path.join(BOTS_DIR, "id_finder_bot", "id_finder_bot.log")},
     "minecraft": {"pattern": "minecraft_bridge.py", "script": os.path.join(BOTS_DIR, "id_finder_bot", "minecraft_bridge.py"), "log": os.path.join(BOTS_DIR, "id_finder_bot", "minecraft_bridge.log")},
+    "host": {"pattern": "bot_host.py", "script": os.path.join(BOTS_DIR, "bot_host.py"), "log": os.path.join(BOTS_DIR, "bot_host.log")},
 }
 
+# Log files the dashboard may read through /api/logs/<source>
+LOG_SOURCES = {**{name: cfg["log"] for name, cfg in MATCH_CONFIG.items()}, "critical": CRITICAL_ERRORS_LOG_FILE}
+
+# Ein-Prozess-Modus (bots/bot_host.py): gewünschter und tatsächlicher Zustand der Plugins
+BOT_HOST_CONTROL_FILE = os.path.join(DATA_DIR, "bot_host_control.json")
+BOT_HOST_STATUS_FILE = os.path.join(DATA_DIR, "bot_host_status.json")
+
 # --- Database Init ---
 with app.app_context():
     init_db()
@@ -116,8 +194,13 @@ def to_int(val, default=None):
 def get_bot_status():
     try:
         output = subprocess.run(["ps", "aux"], stdout=subprocess.PIPE, text=True, check=False).stdout
-        return {k: {"running": cfg["pattern"] in output} for k, cfg in MATCH_CONFIG.items()}
+        status = {k: {"running": cfg["pattern"] in output} for k, cfg in MATCH_CONFIG.items()}
     except: return {k: {"running": False} for k in MATCH_CONFIG}
+    if status["host"]["running"]:
+        for k, hosted in load_json(BOT_HOST_STATUS_FILE, {}).items():
+            if k in status and hosted.get("running"):
+                status[k] = {"running": True, "hosted": True}
+    return status
 
 _updater_instance = None
 def get_updater():
@@ -209,6 +292,8 @@ def _parse_filter_int(value, field_name):
         return None
 
 
+LIVE_MODERATION_PAGE_SIZE = 100
+
 @app.route("/live-moderation")
 @login_required
 def live_moderation():
@@ -217,14 +302,23 @@ def live_moderation():
 
     chat_id = _parse_filter_int(raw_chat_id, "chat_id")
     topic_id = "all" if raw_topic_id == "all" else _parse_filter_int(raw_topic_id, "topic_id")
+    until = _parse_log_time(request.args.get("until"))
 
-    with SessionLocal() as db:
+    with ReadSessionLocal() as db:
         query = db.query(Activity)
         if chat_id is not None:
             query = query.filter(Activity.chat_id == chat_id)
         if topic_id not in (None, "all"):
             query = query.filter(Activity.thread_id == topic_id)
-        messages = query.options(joinedload(Activity.user)).order_by(Activity.ts.desc()).limit(100).all()
+        if until:
+            query = query.filter(Activity.ts < until)
+        messages = query.options(joinedload(Activity.user)).order_by(Activity.ts.desc()).limit(LIVE_MODERATION_PAGE_SIZE).all()
+        if len(messages) < LIVE_MODERATION_PAGE_SIZE:
+            # Older than the retention: the raw messages are in the monthly archive files (see activity_archive.py)
+            archived = archived_activities(end=messages[-1].ts if messages else until, chat_id=chat_id,
+                                           thread_id=topic_id if topic_id != "all" else None, limit=LIVE_MODERATION_PAGE_SIZE - len(messages))
+            users = {u.id: u for u in db.query(User).filter(User.id.in_({a["user_id"] for a in archived}))} if archived else {}
+            messages += [SimpleNamespace(**a, user=users.get(a["user_id"]), archived=True) for a in archived]
         topics_db = db.query(Topic).order_by(Topic.chat_id.asc(), Topic.topic_id.asc()).all()
 
         # Fetch Chat Titles
@@ -249,13 +343,16 @@ def live_moderation():
             display_name = chat_titles.get(t.chat_id, f"Chat {cid}")
             topic_dict[cid] = {"name": display_name, "topics": {}}
         topic_dict[cid]["topics"][str(t.topic_id)] = t.name
-    return render_template("live_moderation.html", messages=messages, topics=topic_dict, mod_config=load_json(os.path.join(DATA_DIR, "moderation_config.json"), {}), selected_chat_id=str(chat_id) if chat_id is not None else None, selected_topic_id=str(topic_id) if topic_id is not None else None)
+    next_until = messages[-1].ts.isoformat() if len(messages) == LIVE_MODERATION_PAGE_SIZE else None
+    return render_template("live_moderation.html", messages=messages, topics=topic_dict, mod_config={**DEFAULT_SPAM_CONFIG, **load_json(MODERATION_CONFIG_FILE, {})}, selected_chat_id=str(chat_id) if chat_id is not None else None, selected_topic_id=str(topic_id) if topic_id is not None else None, until=until, next_until=next_until)
 
 @app.route("/live-moderation/config", methods=["POST"])
 @login_required
 def live_moderation_config():
-    config = {"max_warnings": int(request.form.get("max_warnings", 3)), "warning_text": request.form.get("warning_text", ""), "public_delete_notice_text": request.form.get("public_delete_notice_text", ""), "public_delete_notice_duration": int(request.form.get("public_delete_notice_duration", 60))}
-    save_json(os.path.join(DATA_DIR, "moderation_config.json"), config)
+    config = load_json(MODERATION_CONFIG_FILE, {})
+    config.update({"max_warnings": int(request.form.get("max_warnings", 3)), "mute_after_warnings": int(request.form.get("mute_after_warnings") or 0), "mute_minutes": int(request.form.get("mute_minutes") or 60), "warning_decay_days": int(request.form.get("warning_decay_days") or 0), "warning_text": request.form.get("warning_text", ""), "public_delete_notice_text": request.form.get("public_delete_notice_text", ""), "public_delete_notice_duration": int(request.form.get("public_delete_notice_duration", 60))})
+    config.update({"spam_enabled": "spam_enabled" in request.form, "spam_action": request.form.get("spam_action") if request.form.get("spam_action") in SPAM_ACTIONS else "delete", "flood_max_messages": max(0, to_int(request.form.get("flood_max_messages"), 0)), "flood_window_seconds": max(1, to_int(request.form.get("flood_window_seconds"), 10)), "chat_flood_max_messages": max(0, to_int(request.form.get("chat_flood_max_messages"), 0)), "chat_flood_window_seconds": max(1, to_int(request.form.get("chat_flood_window_seconds"), 10)), "duplicate_max_messages": max(0, to_int(request.form.get("duplicate_max_messages"), 0)), "duplicate_window_seconds": max(1, to_int(request.form.get("duplicate_window_seconds"), 300)), "block_links": "block_links" in request.form, "link_whitelist": [x.strip() for x in request.form.get("link_whitelist", "").split(",") if x.strip()], "blocked_keywords": [x.strip() for x in request.form.get("blocked_keywords", "").splitlines() if x.strip()], "spam_exempt_user_ids": [i for i in (to_int(x.strip()) for x in request.form.get("spam_exempt_user_ids", "").split(",")) if i is not None]})
+    save_json(MODERATION_CONFIG_FILE, config)
     flash("Konfiguration gespeichert.", "success")
     return redirect(url_for("live_moderation"))
 
@@ -296,11 +393,11 @@ def live_moderation_delete():
         flash("Fehler: Bot-Token nicht konfiguriert (ID-Finder).", "danger")
         return redirect(url_for("live_moderation"))
         
-    mod_cfg = load_json(os.path.join(DATA_DIR, "moderation_config.json"), {})
+    mod_cfg = load_json(MODERATION_CONFIG_FILE, {})
 
     # 1. Delete Message
     try:
-        del_res = requests.post(f"https://api.telegram.org/bot{token}/deleteMessage", json={"chat_id": chat_id_int, "message_id": message_id_int})
+        del_res = telegram_api(token, "deleteMessage", json={"chat_id": chat_id_int, "message_id": message_id_int})
         if del_res.status_code != 200:
              log.error(f"Failed to delete message: {del_res.text}")
              flash(f"Fehler beim Löschen der Nachricht: {del_res.text}", "danger")
@@ -317,22 +414,31 @@ def live_moderation_delete():
         flash(f"Fehler beim Löschen der Nachricht: {e}", "danger")
 
     # 2. Log / Warn
+    escalation = None
     with SessionLocal() as db:
-        # Create Mod Log
-        mod_log = ModerationLog(
-            chat_id=chat_id_int,
-            user_id=user_id_int,
-            admin_id=0, # Web Admin
-            action=action,
-            reason=reason,
-            message_id=message_id_int
-        )
-        db.add(mod_log)
-        
-        db.commit() # Commit to get ID and save log
+        if action == "warn":
+            # Log entry, warning counter and a possible escalation in one transaction
+            warn_count, escalation = record_warning(db, chat_id_int, user_id_int, mod_cfg, admin_id=0, reason=reason, message_id=message_id_int) # admin 0 = Web Admin
+        else:
+            db.add(ModerationLog(chat_id=chat_id_int, user_id=user_id_int, admin_id=0, action=action, reason=reason, message_id=message_id_int))
+            warn_count = active_warnings(db, chat_id_int, user_id_int, mod_cfg)
+        db.commit()
 
-        # Determine Warn Count (for placeholders)
-        warn_count = db.query(ModerationLog).filter(ModerationLog.user_id == user_id_int, ModerationLog.action == "warn").count()
+        # Automatic mute/ban at the configured thresholds
+        if escalation:
+            method, payload = escalation_api_call(chat_id_int, user_id_int, escalation)
+            try:
+                esc_res = telegram_api(token, method, json=payload)
+                if esc_res.status_code != 200:
+                    log.error(f"Escalation {method} failed: {esc_res.text}")
+                    flash(f"Automatische Eskalation fehlgeschlagen: {esc_res.text}", "danger")
+                elif escalation[0] == "ban":
+                    flash(f"Nutzer nach {warn_count} Verwarnungen automatisch gebannt.", "warning")
+                else:
+                    flash(f"Nutzer nach {warn_count} Verwarnungen für {escalation[1]} Minuten stummgeschaltet.", "warning")
+            except Exception as e:
+                log.error(f"Escalation {method} failed: {e}")
+                flash(f"Automatische Eskalation fehlgeschlagen: {e}", "danger")
 
         # Send DM?
         if send_dm:
@@ -345,7 +451,7 @@ def live_moderation_delete():
                                 .replace("{group}", request.form.get("chat_name") or "der Gruppe")
                  
                  try:
-                     dm_res = requests.post(f"https://api.telegram.org/bot{token}/sendMessage", json={"chat_id": user_id_int, "text": txt})
+                     dm_res = telegram_api(token, "sendMessage", json={"chat_id": user_id_int, "text": txt})
                      if dm_res.status_code != 200:
                          log.error(f"Failed to send DM: {dm_res.text}")
                          # Maybe user blocked bot or hasn't started it
@@ -365,7 +471,7 @@ def live_moderation_delete():
                      payload["message_thread_id"] = topic_id_int
                  
                  try:
-                     res = requests.post(f"https://api.telegram.org/bot{token}/sendMessage", json=payload)
+                     res = telegram_api(token, "sendMessage", json=payload)
                      
                      if res.status_code != 200:
                          log.error(f"Failed to post topic notice: {res.text}")
@@ -378,7 +484,7 @@ def live_moderation_delete():
                                  def delete_later(chat, msg, delay):
                                      time.sleep(delay)
                                      try:
-                                         requests.post(f"https://api.telegram.org/bot{token}/deleteMessage", json={"chat_id": chat, "message_id": msg})
+                                         telegram_api(token, "deleteMessage", json={"chat_id": chat, "message_id": msg})
                                      except Exception as e:
                                          log.error(f"Error auto-deleting notice: {e}")
                                  
@@ -389,19 +495,216 @@ def live_moderation_delete():
     topic_redirect = "all" if topic_id == "all" else topic_id_int
     return redirect(url_for("live_moderation", chat_id=chat_id_int, topic_id=topic_redirect))
 
+# --- MESSAGE SEARCH (FTS5 index activities_fts, on PostgreSQL a tsvector GIN index, see database.py) ---
+MESSAGE_SEARCH_SORTS = {"rank": "activities_fts.rank", "newest": "activities_fts.rowid DESC"}
+PG_MESSAGE_SEARCH_SORTS = {"rank": "score", "newest": "a.id DESC"}
+MESSAGE_SEARCH_PAGE_SIZE = 50
+# Characters of context around the first match in archive results
+ARCHIVE_SNIPPET_CHARS = 80
+# Control characters as snippet markers, so the text can be HTML-escaped before <mark> is inserted
+_SNIPPET_START, _SNIPPET_END = "\x02", "\x03"
+
+def _fts_query(q):
+    # User input -> FTS5 query without syntax errors: every word is quoted, "phrases" stay phrases,
+    # an unquoted last word matches as prefix (search-as-you-type)
+    parts = re.findall(r'"([^"]*)"|(\S+)', q or "")
+    terms = []
+    for phrase, word in parts:
+        words = re.findall(r"\w+", phrase or word)
+        if words: terms.append('"' + " ".join(words) + '"')
+    if not terms: return None
+    if parts[-1][1] and re.findall(r"\w+", parts[-1][1]): terms[-1] += "*"
+    return " ".join(terms)
+
+def _tsquery(q):
+    # Same rules as _fts_query() for PostgreSQL's to_tsquery(): phrases with <->, all terms required, prefix with :*
+    parts = re.findall(r'"([^"]*)"|(\S+)', q or "")
+    terms = []
+    for phrase, word in parts:
+        words = re.findall(r"\w+", phrase or word)
+        if words: terms.append("(" + " <-> ".join(words) + ")" if len(words) > 1 else words[0])
+    if not terms: return None
+    if parts[-1][1] and re.findall(r"\w+", parts[-1][1]): terms[-1] += ":*"
+    return " & ".join(terms)
+
+def _search_messages(db, q, limit, offset=0, chat_id=None, topic_id=None, user_id=None, since=None, until=None, sort="rank"):
+    postgres = db.get_bind().dialect.name == "postgresql"
+    match = _tsquery(q) if postgres else _fts_query(q)
+    if not match: return []
+    where = [f"{ACTIVITY_TSVECTOR} @@ query"] if postgres else ["activities_fts MATCH :match"]
+    params = {"match": match, "limit": limit, "offset": offset}
+    for column, value in (("chat_id", chat_id), ("thread_id", topic_id), ("user_id", user_id)):
+        if value is not None:
+            where.append(f"a.{column} = :{column}")
+            params[column] = value
+    if since: where.append("a.ts >= :since"); params["since"] = since
+    if until: where.append("a.ts <= :until"); params["until"] = until
+    if postgres:
+        params["headline"] = f'StartSel="{_SNIPPET_START}", StopSel="{_SNIPPET_END}", MaxWords=16, MinWords=8'
+        sql = text(
+            "SELECT a.id, a.ts, a.chat_id, a.chat_title, a.thread_id, a.message_id, a.user_id, a.is_deleted, u.full_name, u.username, "
+            "ts_headline('simple', coalesce(a.text, ''), query, :headline) AS snippet, -ts_rank(" + ACTIVITY_TSVECTOR + ", query) AS score "
+            "FROM activities a CROSS JOIN to_tsquery('simple', :match) query LEFT JOIN users u ON u.id = a.user_id "
+            f"WHERE {' AND '.join(where)} ORDER BY {PG_MESSAGE_SEARCH_SORTS.get(sort, PG_MESSAGE_SEARCH_SORTS['rank'])} LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params.update(start=_SNIPPET_START, end=_SNIPPET_END)
+        sql = text(
+            "SELECT a.id, a.ts, a.chat_id, a.chat_title, a.thread_id, a.message_id, a.user_id, a.is_deleted, u.full_name, u.username, "
+            "snippet(activities_fts, 0, :start, :end, '…', 16) AS snippet, activities_fts.rank AS score "
+            "FROM activities_fts JOIN activities a ON a.id = activities_fts.rowid LEFT JOIN users u ON u.id = a.user_id "
+            f"WHERE {' AND '.join(where)} ORDER BY {MESSAGE_SEARCH_SORTS.get(sort, MESSAGE_SEARCH_SORTS['rank'])} LIMIT :limit OFFSET :offset"
+        )
+    rows = db.execute(sql, params).mappings().all()
+    return [{
+        "id": r["id"], "ts": str(r["ts"])[:19], "chat_id": r["chat_id"], "chat_title": r["chat_title"], "topic_id": r["thread_id"],
+        "message_id": r["message_id"], "user_id": r["user_id"], "name": r["full_name"] or r["username"] or str(r["user_id"]),
+        "is_deleted": bool(r["is_deleted"]), "score": round(-r["score"], 3),
+        "snippet": str(escape(r["snippet"] or "")).replace(_SNIPPET_START, "<mark>").replace(_SNIPPET_END, "</mark>"),
+    } for r in rows]
+
+def _archive_snippet(text, terms):
+    # The archive has no snippet(): the text around the first match, every match marked
+    text = text or ""
+    pattern = re.compile("|".join(r"\s+".join(map(re.escape, t.split())) for t in terms), re.IGNORECASE) if terms else None
+    match = pattern.search(text) if pattern else None
+    start = max(0, match.start() - ARCHIVE_SNIPPET_CHARS) if match else 0
+    end = (match.end() if match else 0) + ARCHIVE_SNIPPET_CHARS
+    part = text[start:end]
+    if pattern: part = pattern.sub(lambda m: _SNIPPET_START + m.group(0) + _SNIPPET_END, part)
+    return ("…" if start else "") + part + ("…" if end < len(text) else "")
+
+def _search_archive(db, q, limit, chat_id=None, topic_id=None, user_id=None, since=None, until=None, before=None):
+    # Messages older than the retention are no longer in the FTS index, only in the monthly archive files
+    terms = text_terms(q)
+    if not terms: return []
+    rows = archived_activities(start=since, end=before or until, user_id=user_id, chat_id=chat_id, thread_id=topic_id, text=q, limit=limit)
+    users = {u.id: u for u in db.query(User).filter(User.id.in_({r["user_id"] for r in rows}))} if rows else {}
+    return [{
+        "id": r["id"], "ts": str(r["ts"])[:19], "chat_id": r["chat_id"], "chat_title": r["chat_title"], "topic_id": r["thread_id"],
+        "message_id": r["message_id"], "user_id": r["user_id"], "name": (users[r["user_id"]].full_name or users[r["user_id"]].username) if r["user_id"] in users else str(r["user_id"]),
+        "is_deleted": bool(r["is_deleted"]), "score": None, "archived": True, "before": r["ts"].isoformat(), "history_until": (r["ts"] + timedelta(seconds=1)).isoformat(),
+        "snippet": str(escape(_archive_snippet(r["text"], terms))).replace(_SNIPPET_START, "<mark>").replace(_SNIPPET_END, "</mark>"),
+    } for r in rows]
+
+def _find_messages(db, limit, offset=0, archive=False, before=None, sort="rank", **args):
+    if archive:
+        return _search_archive(db, limit=limit, before=before, **args)
+    return _search_messages(db, limit=limit, offset=offset, sort=sort, **args)
+
+def _search_horizon():
+    # Start of the messages in the FTS index, if older ones were moved to the archive
+    if not archive_stats()["months"]: return None
+    return retention_cutoff(load_json(ID_FINDER_CONFIG_FILE, {}).get("activity_retention_days", DEFAULT_RETENTION_DAYS))
+
+def _message_search_args():
+    return {"q": request.args.get("q", ""), "chat_id": to_int(request.args.get("chat_id")), "topic_id": to_int(request.args.get("topic_id")), "user_id": to_int(request.args.get("user_id")), "since": _parse_log_time(request.args.get("since")), "until": _parse_log_time(request.args.get("until")), "sort": request.args.get("sort") if request.args.get("sort") in MESSAGE_SEARCH_SORTS else "rank", "archive": request.args.get("archive") == "1", "before": _parse_log_time(request.args.get("before"))}
+
+@app.route("/api/live-moderation/search")
+@login_required
+def api_message_search():
+    limit = max(1, min(request.args.get("limit", MESSAGE_SEARCH_PAGE_SIZE, type=int), 500))
+    offset = max(0, request.args.get("offset", 0, type=int))
+    args = _message_search_args()
+    try:
+        with ReadSessionLocal() as db:
+            results = _find_messages(db, limit=limit, offset=offset, **args)
+    except OperationalError as e:
+        log.error(f"Nachrichtensuche fehlgeschlagen: {e}")
+        return jsonify({"error": "Volltextsuche nicht verfügbar (SQLite ohne FTS5?)"}), 503
+    if args["archive"]:
+        return jsonify({"results": results, "next_before": results[-1]["before"] if len(results) == limit else None})
+    return jsonify({"results": results, "next_offset": offset + limit if len(results) == limit else None})
+
+@app.route("/live-moderation/search")
+@login_required
+def message_search():
+    offset = max(0, request.args.get("offset", 0, type=int))
+    args = _message_search_args()
+    results, error = [], None
+    try:
+        with ReadSessionLocal() as db:
+            results = _find_messages(db, limit=MESSAGE_SEARCH_PAGE_SIZE, offset=offset, **args)
+            topics_db = db.query(Topic).order_by(Topic.chat_id.asc(), Topic.topic_id.asc()).all()
+    except OperationalError as e:
+        log.error(f"Nachrichtensuche fehlgeschlagen: {e}")
+        error, topics_db = "Volltextsuche nicht verfügbar (SQLite ohne FTS5?)", []
+    chats = sorted({t.chat_id for t in topics_db})
+    next_args = {k: v for k, v in request.args.items() if k not in ("offset", "before") and v}
+    next_url = None
+    if len(results) == MESSAGE_SEARCH_PAGE_SIZE:
+        # The archive pages by time (newest first), the index by offset
+        next_url = url_for("message_search", **next_args, before=results[-1]["before"]) if args["archive"] else url_for("message_search", **next_args, offset=offset + MESSAGE_SEARCH_PAGE_SIZE)
+    archive_args = {k: v for k, v in request.args.items() if k not in ("offset", "before", "archive") and v}
+    return render_template("message_search.html", results=results, error=error, chats=chats, topics=topics_db, args=request.args, sorts=MESSAGE_SEARCH_SORTS, next_url=next_url,
+                           horizon=_search_horizon(), archive=args["archive"], archive_args=archive_args)
+
 # --- ID FINDER ---
 @app.route("/id-finder")
 @login_required
 def id_finder_dashboard():
-    with SessionLocal() as db:
-        users = db.query(User).all()
-    return render_template("id_finder_dashboard.html", config=load_json(ID_FINDER_CONFIG_FILE), is_running=get_bot_status()["id_finder"]["running"], user_registry=users)
+    with ReadSessionLocal() as db:
+        users = _user_registry_page(db, USER_REGISTRY_PAGE_SIZE)
+        total_users = db.query(func.count(User.id)).scalar()
+    next_after = _registry_cursor(users[-1], "last_seen") if len(users) == USER_REGISTRY_PAGE_SIZE else None
+    return render_template("id_finder_dashboard.html", config=load_json(ID_FINDER_CONFIG_FILE), is_running=get_bot_status()["id_finder"]["running"], user_registry=users, total_users=total_users, next_after=next_after, archive=archive_stats(), default_retention_days=DEFAULT_RETENTION_DAYS, default_archive_months=DEFAULT_ARCHIVE_MONTHS)
+
+USER_REGISTRY_PAGE_SIZE = 50
+# sort -> (column, descending); the id breaks ties, so (column, id) is a unique keyset
+USER_REGISTRY_SORTS = {"last_seen": (User.last_seen, True), "messages": (User.message_count, True), "id": (User.id, False)}
+
+def _registry_cursor(user, sort):
+    # "<sort value>,<id>" of the last row: the next page continues after these values even if the
+    # user's last_seen/message_count changed in the meantime
+    column, _ = USER_REGISTRY_SORTS.get(sort, USER_REGISTRY_SORTS["last_seen"])
+    value = getattr(user, column.key)
+    return f"{value.isoformat() if isinstance(value, datetime) else value},{user.id}"
+
+def _parse_registry_cursor(cursor, sort):
+    column, _ = USER_REGISTRY_SORTS.get(sort, USER_REGISTRY_SORTS["last_seen"])
+    try:
+        value, user_id = cursor.rsplit(",", 1)
+        return (datetime.fromisoformat(value) if column is User.last_seen else int(value)), int(user_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _user_registry_page(db, limit, q=None, sort="last_seen", after=None):
+    column, descending = USER_REGISTRY_SORTS.get(sort, USER_REGISTRY_SORTS["last_seen"])
+    query = db.query(User)
+    q = search_key((q or "").strip().lstrip("@"))
+    if q:
+        # Prefix ranges on the casefolded search columns walk ix_users_search_username / ix_users_search_name
+        conditions = [and_(col >= q, col < q + "\U0010ffff") for col in (User.search_username, User.search_name)]
+        if q.isdigit(): conditions.append(User.id == int(q))
+        query = query.filter(or_(*conditions))
+    if after is not None:
+        key = tuple_(column, User.id)
+        query = query.filter(key < after if descending else key > after)
+    order = (column.desc(), User.id.desc()) if descending else (column.asc(), User.id.asc())
+    return query.order_by(*order).limit(limit).all()
+
+@app.route("/api/id-finder/users")
+@login_required
+def api_user_registry():
+    limit = max(1, min(request.args.get("limit", USER_REGISTRY_PAGE_SIZE, type=int), 500))
+    sort = request.args.get("sort", "last_seen")
+    after = None
+    if request.args.get("after"):
+        after = _parse_registry_cursor(request.args["after"], sort)
+        if after is None:
+            return jsonify({"error": "invalid cursor"}), 400
+    with ReadSessionLocal() as db:
+        users = _user_registry_page(db, limit, q=request.args.get("q"), sort=sort, after=after)
+    return jsonify({
+        "users": [{"id": u.id, "username": u.username, "full_name": u.full_name, "last_seen": datetimeformat(u.last_seen), "message_count": u.message_count} for u in users],
+        "next_after": _registry_cursor(users[-1], sort) if len(users) == limit else None,
+    })
 
 @app.route("/id-finder/save-config", methods=["POST"])
 @login_required
 def id_finder_save_config():
     cfg = load_json(ID_FINDER_CONFIG_FILE)
-    cfg.update({"bot_token": request.form.get("bot_token"), "admin_group_id": to_int(request.form.get("admin_group_id")), "main_group_id": to_int(request.form.get("main_group_id")), "admin_log_topic_id": to_int(request.form.get("admin_log_topic_id")), "delete_commands": "delete_commands" in request.form, "bot_message_cleanup_seconds": max(0, to_int(request.form.get("bot_message_cleanup_seconds"), 0)), "message_logging_enabled": "message_logging_enabled" in request.form, "message_logging_ignore_commands": "message_logging_ignore_commands" in request.form, "message_logging_groups_only": "message_logging_groups_only" in request.form})
+    cfg.update({"bot_token": request.form.get("bot_token"), "admin_group_id": to_int(request.form.get("admin_group_id")), "main_group_id": to_int(request.form.get("main_group_id")), "admin_log_topic_id": to_int(request.form.get("admin_log_topic_id")), "delete_commands": "delete_commands" in request.form, "bot_message_cleanup_seconds": max(0, to_int(request.form.get("bot_message_cleanup_seconds"), 0)), "message_logging_enabled": "message_logging_enabled" in request.form, "message_logging_ignore_commands": "message_logging_ignore_commands" in request.form, "message_logging_groups_only": "message_logging_groups_only" in request.form, "activity_retention_days": max(0, to_int(request.form.get("activity_retention_days"), DEFAULT_RETENTION_DAYS)), "activity_archive_months": max(0, to_int(request.form.get("activity_archive_months"), DEFAULT_ARCHIVE_MONTHS))})
     save_json(ID_FINDER_CONFIG_FILE, cfg)
     flash("Konfiguration gespeichert.", "success")
     return redirect(url_for("id_finder_dashboard"))
@@ -412,60 +715,77 @@ def id_finder_analytics():
     days = request.args.get("days", type=int)
     month = request.args.get("month", type=int)
     year = request.args.get("year", type=int)
+    start_date = datetime.utcnow() - timedelta(days=days) if days else None
 
-    with SessionLocal() as db:
+    with ReadSessionLocal() as db:
         total_users = db.query(User).count()
-        total_messages = db.query(Activity).count()
+        # Archived activities only exist as hourly rollups (see activity_archive.py); both parts are added up
+        total_messages = db.query(Activity).count() + (db.query(func.sum(ActivityRollup.messages)).scalar() or 0)
         
         # Build query with filters
         query = db.query(Activity)
-        if days:
-            start_date = datetime.utcnow() - timedelta(days=days)
+        if start_date:
             query = query.filter(Activity.ts >= start_date)
         if month and month > 0:
             query = query.filter(extract('month', Activity.ts) == month)
         if year and year > 0:
             query = query.filter(extract('year', Activity.ts) == year)
 
+        def rollups(*columns):
+            return rollup_query(db, columns, start=start_date, month=month, year=year)
+
         # Leaderboard
-        leaderboard = db.query(
-            User.id, 
-            User.full_name, 
-            User.username, 
-            func.count(Activity.id).label('count'),
-            func.sum(Activity.has_media).label('media_count')
-        ).join(Activity, Activity.user_id == User.id)\
+        counts = {}
+        leaderboard_hot = db.query(Activity.user_id, func.count(Activity.id), func.sum(cast(Activity.has_media, Integer)))\
         .filter(Activity.id.in_(query.with_entities(Activity.id)))\
-        .group_by(User.id).order_by(desc('count')).limit(10).all()
+        .group_by(Activity.user_id).all()
+        leaderboard_archived = rollups(ActivityRollup.user_id, func.sum(ActivityRollup.messages), func.sum(ActivityRollup.media))\
+            .group_by(ActivityRollup.user_id).all()
+        for uid, msgs, media in [*leaderboard_hot, *leaderboard_archived]:
+            entry = counts.setdefault(uid, [0, 0])
+            entry[0] += msgs or 0
+            entry[1] += media or 0
+        top = sorted(counts.items(), key=lambda item: -item[1][0])[:10]
+        names = {u.id: u for u in db.query(User).filter(User.id.in_([uid for uid, _ in top])).all()} if top else {}
+        leaderboard = [(uid, names[uid].full_name, names[uid].username, msgs, media) for uid, (msgs, media) in top if uid in names]
 
         # Timeline
+        timeline_counts = {}
         timeline_raw = db.query(func.date(Activity.ts).label('date'), func.count(Activity.id).label('count'))\
             .filter(Activity.id.in_(query.with_entities(Activity.id)))\
-            .group_by('date').order_by('date').all()
+            .group_by('date').all()
+        timeline_archived = rollups(func.date(ActivityRollup.bucket_start).label('date'), func.sum(ActivityRollup.messages).label('count'))\
+            .group_by('date').all()
+        # str(): SQLite returns date() as text, PostgreSQL as a date
+        for r in [*timeline_archived, *timeline_raw]: timeline_counts[str(r.date)] = timeline_counts.get(str(r.date), 0) + r.count
+        timeline_dates = sorted(timeline_counts)
             
-        timeline = {"labels": [r.date for r in timeline_raw], "total": [r.count for r in timeline_raw]}
+        timeline = {"labels": timeline_dates, "total": [timeline_counts[d] for d in timeline_dates]}
         
         # Hours
-        hours_raw = db.query(func.strftime('%H', Activity.ts).label('hour'), func.count(Activity.id).label('count'))\
+        hours_raw = db.query(extract('hour', Activity.ts).label('hour'), func.count(Activity.id).label('count'))\
             .filter(Activity.id.in_(query.with_entities(Activity.id)))\
             .group_by('hour').all()
+        hours_archived = rollups(extract('hour', ActivityRollup.bucket_start).label('hour'), func.sum(ActivityRollup.messages).label('count'))\
+            .group_by('hour').all()
         busiest_hours = [0] * 24
-        for r in hours_raw: busiest_hours[int(r.hour)] = r.count
+        for r in [*hours_raw, *hours_archived]: busiest_hours[int(r.hour)] += r.count
 
         # Days
-        # SQLite uses 0=Sunday, 6=Saturday for strftime('%w', ...) 
+        # extract('dow') is 0=Sunday, 6=Saturday (SQLite strftime('%w') and PostgreSQL alike)
         # Chart.js often expects 0=Monday if labels are Mo,Di... but we can map it.
-        # Let's map SQLite 0..6 (Sun..Sat) to 0..6 (Mon..Sun) for the chart labels provided in HTML ['Mo', 'Di', ...]
-        days_raw = db.query(func.strftime('%w', Activity.ts).label('dow'), func.count(Activity.id).label('count'))\
+        # Let's map 0..6 (Sun..Sat) to 0..6 (Mon..Sun) for the chart labels provided in HTML ['Mo', 'Di', ...]
+        days_raw = db.query(extract('dow', Activity.ts).label('dow'), func.count(Activity.id).label('count'))\
             .filter(Activity.id.in_(query.with_entities(Activity.id)))\
             .group_by('dow').all()
+        days_archived = rollups(extract('dow', ActivityRollup.bucket_start).label('dow'), func.sum(ActivityRollup.messages).label('count'))\
+            .group_by('dow').all()
         
         # Map: Sun(0)->6, Mon(1)->0, Tue(2)->1, ... Sat(6)->5
         busiest_days = [0] * 7
-        for r in days_raw:
-            dow_sqlite = int(r.dow)
-            dow_chart = (dow_sqlite - 1) % 7
-            busiest_days[dow_chart] = r.count
+        for r in [*days_raw, *days_archived]:
+            dow_chart = (int(r.dow) - 1) % 7
+            busiest_days[dow_chart] += r.count
 
     return render_template("id_finder_analytics.html", 
         stats={"total_users": total_users, "total_messages": total_messages}, 
@@ -492,20 +812,20 @@ def api_user_activity(user_id):
     user_id_int = to_int(user_id)
     if user_id_int is None:
         return jsonify({"error": "invalid user_id"}), 400
+    start_date = (datetime.utcnow() - timedelta(days=days)).date() if days else None
 
-    with SessionLocal() as db:
-        query = db.query(func.date(Activity.ts).label('date'), func.count(Activity.id).label('count'))\
-            .filter(Activity.user_id == user_id_int)
+    with ReadSessionLocal() as db:
+        # Daily histogram maintained at ingest, also covers archived activities
+        query = db.query(UserDailyActivity.day, UserDailyActivity.messages).filter(UserDailyActivity.user_id == user_id_int)
         
-        if days:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            query = query.filter(Activity.ts >= start_date)
+        if start_date:
+            query = query.filter(UserDailyActivity.day >= start_date)
         if month and month > 0:
-            query = query.filter(extract('month', Activity.ts) == month)
+            query = query.filter(extract('month', UserDailyActivity.day) == month)
         if year and year > 0:
-            query = query.filter(extract('year', Activity.ts) == year)
+            query = query.filter(extract('year', UserDailyActivity.day) == year)
             
-        raw = query.group_by('date').order_by('date').all()
+        raw = query.order_by(UserDailyActivity.day).all()
         
         # We need to match the global labels. 
         # Ideally, we return a dict {date: count} and let frontend map it, 
@@ -514,7 +834,7 @@ def api_user_activity(user_id):
         # but here we used category scale (strings). 
         
         # Let's return a map.
-        data_map = {r.date: r.count for r in raw}
+        data_map = {r.day.isoformat(): r.messages for r in raw}
         
         # Get global labels from query (re-run logic or pass from frontend? Frontend is easier but insecure/messy)
         # Better: Re-generate global labels for the same period to ensure alignment, 
@@ -562,15 +882,30 @@ def id_finder_update_admin_permissions():
         flash("Rechte aktualisiert.", "success")
     return redirect(url_for("id_finder_admin_panel"))
 
+USER_DETAIL_DAYS = 30
+MODERATION_HISTORY_PAGE_SIZE = 25
+
 @app.route("/user-detail/<user_id>")
 @login_required
 def user_detail(user_id):
-    with SessionLocal() as db:
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        mod_logs = db.query(ModerationLog).filter(ModerationLog.user_id == user_id_int).order_by(ModerationLog.ts.desc()).all()
-        
+    user_id_int = to_int(user_id)
+    if user_id_int is None: abort(404)
+    before_id = request.args.get("before_id", type=int)
+    with ReadSessionLocal() as db:
+        # Counters come with the user row, the chart from the daily histogram (primary key range)
+        user = db.get(User, user_id_int)
         if not user: abort(404)
-        return render_template("id_finder_user_detail.html", user=user, mod_logs=mod_logs)
+        since = date.today() - timedelta(days=USER_DETAIL_DAYS - 1)
+        per_day = dict(db.query(UserDailyActivity.day, UserDailyActivity.messages)
+                       .filter(UserDailyActivity.user_id == user_id_int, UserDailyActivity.day >= since).all())
+        query = db.query(ModerationLog).filter(ModerationLog.user_id == user_id_int)
+        if before_id:
+            query = query.filter(ModerationLog.id < before_id)
+        mod_logs = query.order_by(ModerationLog.id.desc()).limit(MODERATION_HISTORY_PAGE_SIZE + 1).all()
+    next_before_id = mod_logs[MODERATION_HISTORY_PAGE_SIZE - 1].id if len(mod_logs) > MODERATION_HISTORY_PAGE_SIZE else None
+    timeline = [{"date": d.isoformat(), "count": per_day.get(d, 0)} for d in (since + timedelta(days=i) for i in range(USER_DETAIL_DAYS))]
+    return render_template("id_finder_user_detail.html", user=user, mod_logs=mod_logs[:MODERATION_HISTORY_PAGE_SIZE],
+                           next_before_id=next_before_id, before_id=before_id, timeline=timeline, timeline_days=USER_DETAIL_DAYS)
 
 @app.route("/id-finder/delete-user/<user_id>", methods=["POST"])
 @login_required
@@ -578,6 +913,7 @@ def id_finder_delete_user(user_id):
     with SessionLocal() as db:
         user = db.query(User).filter(User.id == int(user_id)).first()
         if user:
+            db.query(UserDailyActivity).filter(UserDailyActivity.user_id == user.id).delete(synchronize_session=False)
             db.delete(user)
             db.commit()
             flash("User gelöscht.", "success")
@@ -587,7 +923,7 @@ def id_finder_delete_user(user_id):
 @app.route("/broadcast")
 @login_required
 def broadcast_manager():
-    with SessionLocal() as db:
+    with ReadSessionLocal() as db:
         broadcasts = db.query(Broadcast).order_by(Broadcast.created_at.desc()).all()
         topics_db = db.query(Topic).all()
     # Convert list of SQL objects to a dict for the template
@@ -657,7 +993,7 @@ def delete_topic_mapping(topic_id):
 def outfit_bot_dashboard():
     data = load_json(OUTFIT_BOT_DATA_FILE)
     duel = {"active": True, "contestants": " vs ".join([f"@{c['username']}" for c in data.get("current_duel", {}).get("contestants", {}).values()])} if data.get("current_duel") else {"active": False, "contestants": ""}
-    return render_template("outfit_bot_dashboard.html", config=load_json(OUTFIT_BOT_CONFIG_FILE), is_running=get_bot_status()["outfit"]["running"], logs=open(OUTFIT_BOT_LOG_FILE).readlines()[-100:] if os.path.exists(OUTFIT_BOT_LOG_FILE) else [], duel_status=duel)
+    return render_template("outfit_bot_dashboard.html", config=load_json(OUTFIT_BOT_CONFIG_FILE), is_running=get_bot_status()["outfit"]["running"], logs=tail_lines(OUTFIT_BOT_LOG_FILE, 100), duel_status=duel)
 
 @app.route("/outfit-bot/action/<action>", methods=["POST"])
 @login_required
@@ -677,7 +1013,8 @@ def outfit_bot_actions(action):
 @login_required
 def minecraft_status_page():
     s = load_json(MINECRAFT_STATUS_CACHE_FILE)
-    return render_template("minecraft.html", cfg=load_json(MINECRAFT_STATUS_CONFIG_FILE), status=s, is_running=get_bot_status()["minecraft"]["running"], server_online=s.get("online") is True, pi={"cpu_percent":0,"ram_used_mb":0,"temp_c":0,"disk_percent":0}, log_tail=open(MATCH_CONFIG["minecraft"]["log"]).read()[-2000:] if os.path.exists(MATCH_CONFIG["minecraft"]["log"]) else "")
+    cfg = load_json(MINECRAFT_STATUS_CONFIG_FILE)
+    return render_template("minecraft.html", cfg=cfg, status=s, servers=s.get("servers") or {}, servers_json=json.dumps(cfg.get("servers") or [], indent=2, ensure_ascii=False), is_running=get_bot_status()["minecraft"]["running"], server_online=s.get("server_online") is True, pi={"cpu_percent":0,"ram_used_mb":0,"temp_c":0,"disk_percent":0}, log_tail=tail_text(MATCH_CONFIG["minecraft"]["log"], 40))
 
 @app.route("/minecraft/start", methods=["POST"])
 @login_required
@@ -691,7 +1028,18 @@ def minecraft_status_stop(): return bot_action_route("minecraft", "stop")
 @login_required
 def minecraft_status_save():
     cfg = load_json(MINECRAFT_STATUS_CONFIG_FILE)
-    cfg.update({"mc_host": request.form.get("mc_host"), "mc_port": int(request.form.get("mc_port", 25565)), "display_host": request.form.get("display_host"), "display_port": int(request.form.get("display_port", 25565)), "chat_id": to_int(request.form.get("chat_id")), "topic_id": to_int(request.form.get("topic_id"))})
+    try:
+        servers = json.loads(request.form.get("servers_json") or "[]")
+        if not isinstance(servers, list) or not all(isinstance(e, dict) for e in servers): raise ValueError("Liste von Objekten erwartet")
+    except ValueError as e:
+        flash(f"Weitere Server: ungültiges JSON ({e}).", "danger")
+        return redirect(url_for("minecraft_status_page"))
+    # Keep the status message of servers that still exist so the bot edits instead of re-posting
+    old_state = {e.get("id") or f"{e.get('mc_host') or e.get('host')}:{e.get('mc_port') or e.get('port') or 25565}": e for e in cfg.get("servers") or [] if isinstance(e, dict)}
+    for e in servers:
+        prev = old_state.get(e.get("id") or f"{e.get('mc_host') or e.get('host')}:{e.get('mc_port') or e.get('port') or 25565}", {})
+        for k in ("status_message_id", "status_message_created_at"): e.setdefault(k, prev.get(k))
+    cfg.update({"bot_token": request.form.get("bot_token", "").strip(), "mc_host": request.form.get("mc_host"), "mc_port": int(request.form.get("mc_port", 25565)), "display_host": request.form.get("display_host"), "display_port": int(request.form.get("display_port", 25565)), "chat_id": to_int(request.form.get("chat_id")), "topic_id": to_int(request.form.get("topic_id")), "servers": servers})
     save_json(MINECRAFT_STATUS_CONFIG_FILE, cfg)
     flash("Konfiguration gespeichert.", "success")
     return redirect(url_for("minecraft_status_page"))
@@ -701,10 +1049,39 @@ def minecraft_status_save():
 def minecraft_status_reset_message():
     cfg = load_json(MINECRAFT_STATUS_CONFIG_FILE)
     cfg["status_message_id"] = None
+    for e in cfg.get("servers") or []:
+        if isinstance(e, dict): e["status_message_id"] = None
     save_json(MINECRAFT_STATUS_CONFIG_FILE, cfg)
     flash("Status-Nachricht zurückgesetzt. Bot sendet neu...", "success")
     return redirect(url_for("minecraft_status_page"))
 
+MC_HISTORY_RESOLUTIONS = {"raw": 0, "5m": 300, "1h": 3600}
+
+def _mc_history_auto_resolution(hours):
+    # Keeps charts at a few hundred points: raw for short ranges, then 5-minute, then hourly buckets
+    if hours <= 3: return "raw"
+    if hours <= 72: return "5m"
+    return "1h"
+
+@app.route("/api/minecraft/history")
+@login_required
+def api_minecraft_history():
+    server = request.args.get("server", "default")
+    hours = max(1, min(request.args.get("hours", 24, type=int), 24 * 730))
+    resolution = request.args.get("resolution") or _mc_history_auto_resolution(hours)
+    if resolution not in MC_HISTORY_RESOLUTIONS: return jsonify({"error": "resolution must be raw, 5m or 1h"}), 400
+    since = datetime.utcnow() - timedelta(hours=hours)
+    with ReadSessionLocal() as db:
+        if resolution == "raw":
+            rows = db.query(McStatusSample).filter(McStatusSample.server_key == server, McStatusSample.ts >= since).order_by(McStatusSample.ts).all()
+            points = [{"t": r.ts.isoformat() + "Z", "uptime": 1.0 if r.online else 0.0, "players_min": r.player_count, "players_avg": r.player_count, "players_max": r.player_count, "ping_min": r.ping_ms, "ping_avg": r.ping_ms, "ping_max": r.ping_ms} for r in rows]
+        else:
+            rows = db.query(McStatusBucket).filter(McStatusBucket.server_key == server, McStatusBucket.resolution == MC_HISTORY_RESOLUTIONS[resolution], McStatusBucket.bucket_start >= since).order_by(McStatusBucket.bucket_start).all()
+            points = [{"t": r.bucket_start.isoformat() + "Z", "uptime": round(r.online_samples / r.samples, 4) if r.samples else None, "players_min": r.player_min, "players_avg": round(r.player_sum / r.online_samples, 2) if r.online_samples else None, "players_max": r.player_max, "ping_min": r.ping_min, "ping_avg": round(r.ping_sum / r.online_samples) if r.online_samples and r.ping_min is not None else None, "ping_max": r.ping_max} for r in rows]
+        # Overall uptime weighted by sample count
+        samples, online = (len(rows), sum(1 for r in rows if r.online)) if resolution == "raw" else (sum(r.samples for r in rows), sum(r.online_samples for r in rows))
+    return jsonify({"server": server, "hours": hours, "resolution": resolution, "uptime": round(online / samples, 4) if samples else None, "points": points})
+
 # --- INVITE BOT ---
 @app.route("/bot-settings", methods=["GET", "POST"])
 @login_required
@@ -713,13 +1090,32 @@ def bot_settings():
         action = request.form.get("action")
         cfg = load_json(INVITE_BOT_CONFIG_FILE)
         if action == "save_base_config":
-            cfg.update({"is_enabled": "is_enabled" in request.form, "bot_token": request.form.get("bot_token"), "main_chat_id": to_int(request.form.get("main_chat_id")), "topic_id": to_int(request.form.get("topic_id")), "link_ttl_minutes": int(request.form.get("link_ttl_minutes", 15))})
+            cfg.update({"is_enabled": "is_enabled" in request.form, "bot_token": request.form.get("bot_token"), "main_chat_id": to_int(request.form.get("main_chat_id")), "topic_id": to_int(request.form.get("topic_id")), "link_ttl_minutes": int(request.form.get("link_ttl_minutes", 15)), "link_pool_size": max(0, min(int(request.form.get("link_pool_size") or 5), 50)), "repost_profile_for_existing_members": "repost_profile_for_existing_members" in request.form})
             save_json(INVITE_BOT_CONFIG_FILE, cfg)
             flash("Basis-Konfiguration gespeichert.", "success")
         elif action == "start_invite_bot": return bot_action_route("invite", "start")
         elif action == "stop_invite_bot": return bot_action_route("invite", "stop")
         return redirect(url_for("bot_settings"))
-    return render_template("bot_settings.html", config=load_json(INVITE_BOT_CONFIG_FILE), is_invite_running=get_bot_status()["invite"]["running"], invite_bot_logs=open(INVITE_BOT_LOG_FILE).readlines()[-100:] if os.path.exists(INVITE_BOT_LOG_FILE) else [], user_interaction_logs=open(INVITE_BOT_INTERACTION_LOG).readlines()[-100:] if os.path.exists(INVITE_BOT_INTERACTION_LOG) else [])
+    interaction_user = request.args.get("interaction_user", type=int)
+    with SessionLocal() as db:
+        interactions = _invite_interactions(db, 100, user_id=interaction_user)
+    return render_template("bot_settings.html", config=load_json(INVITE_BOT_CONFIG_FILE), is_invite_running=get_bot_status()["invite"]["running"], join_metrics=load_json(INVITE_JOIN_METRICS_FILE, {}), invite_bot_logs=tail_lines(INVITE_BOT_LOG_FILE, 100), user_interaction_logs=interactions, interaction_user=interaction_user)
+
+def _invite_interactions(db, limit, user_id=None, before_id=None):
+    # Newest first; ORDER BY id DESC LIMIT n walks the primary key (or ix_invite_interactions_user when filtered)
+    q = db.query(InviteInteraction)
+    if user_id is not None: q = q.filter(InviteInteraction.user_id == user_id)
+    if before_id is not None: q = q.filter(InviteInteraction.id < before_id)
+    return [{"id": r.id, "ts": r.ts.strftime("%Y-%m-%d %H:%M:%S") if r.ts else None, "user_id": r.user_id, "username": r.username, "action": r.action, "details": r.details} for r in q.order_by(InviteInteraction.id.desc()).limit(limit).all()]
+
+@app.route("/api/invite/interactions")
+@login_required
+def api_invite_interactions():
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+    with ReadSessionLocal() as db:
+        entries = _invite_interactions(db, limit, user_id=request.args.get("user_id", type=int), before_id=request.args.get("before_id", type=int))
+    # before_id of the next page for "load more"
+    return jsonify({"entries": entries, "next_before_id": entries[-1]["id"] if len(entries) == limit else None})
 
 @app.route("/bot-settings/save-content", methods=["POST"])
 @login_required
@@ -775,8 +1171,11 @@ def invite_bot_move_field(field_id, direction):
 @app.route("/bot-settings/clear-logs/<log_type>", methods=["POST"])
 @login_required
 def invite_bot_clear_logs(log_type):
-    file = INVITE_BOT_INTERACTION_LOG if log_type == "user" else INVITE_BOT_LOG_FILE
-    if os.path.exists(file): open(file, 'w').close()
+    if log_type == "user":
+        with SessionLocal() as db:
+            db.query(InviteInteraction).delete()
+            db.commit()
+    elif os.path.exists(INVITE_BOT_LOG_FILE): open(INVITE_BOT_LOG_FILE, 'w').close()
     flash("Logs geleert.", "success")
     return redirect(url_for("bot_settings"))
 
@@ -794,7 +1193,22 @@ def quiz_settings():
         flash("Gespeichert.", "success")
         return redirect(url_for("quiz_settings"))
     qs = load_json(Q_FILE, [])
-    return render_template("quiz_settings.html", config=load_json(QUIZ_BOT_CONFIG_FILE), schedule=load_json(QUIZ_BOT_CONFIG_FILE).get("schedule", {}), stats={"total": len(qs), "asked": 0, "remaining": len(qs)}, questions_json=json.dumps(qs, indent=4, ensure_ascii=False), asked_questions_json="[]", logs=[])
+    with SessionLocal() as db:
+        asked = db.query(QuizPoll).count()
+        leaderboard = _quiz_leaderboard(db, 10)
+    return render_template("quiz_settings.html", config=load_json(QUIZ_BOT_CONFIG_FILE), schedule=load_json(QUIZ_BOT_CONFIG_FILE).get("schedule", {}), stats={"total": len(qs), "asked": asked, "remaining": max(len(qs) - asked, 0)}, questions_json=json.dumps(qs, indent=4, ensure_ascii=False), asked_questions_json="[]", logs=[], leaderboard=leaderboard)
+
+def _quiz_leaderboard(db, limit):
+    # Served from the quiz_scores aggregate via ix_quiz_scores_rank, never from quiz_answers
+    rows = db.query(QuizScore).order_by(QuizScore.correct.desc(), QuizScore.answered.asc()).limit(limit).all()
+    return [{"uid": r.user_id, "name": r.name or f"User {r.user_id}", "correct": r.correct, "answered": r.answered, "last_answer_at": r.last_answer_at.isoformat() if r.last_answer_at else None} for r in rows]
+
+@app.route("/api/quiz/leaderboard")
+@login_required
+def api_quiz_leaderboard():
+    limit = max(1, min(request.args.get("limit", 10, type=int), 100))
+    with ReadSessionLocal() as db:
+        return jsonify({"leaderboard": _quiz_leaderboard(db, limit)})
 
 @app.route("/umfrage-settings", methods=["GET", "POST"])
 @login_required
@@ -871,13 +1285,82 @@ def edit_user(username):
 def bot_action_route(bot_name, action):
     cfg = MATCH_CONFIG.get(bot_name)
     if not cfg: return redirect(url_for("index"))
-    if action == "start": subprocess.Popen([VENV_PYTHON, cfg["script"]], cwd=os.path.dirname(cfg["script"]), stdout=open(cfg["log"], "a"), stderr=subprocess.STDOUT)
+    if bot_name != "host" and bot_name in load_json(BOT_HOST_STATUS_FILE, {}) and get_bot_status()["host"]["running"]:
+        # Host-Modus: keinen eigenen Prozess starten, sondern das Plugin im Bot-Host schalten
+        subprocess.run(["pkill", "-f", cfg["pattern"]])
+        control = load_json(BOT_HOST_CONTROL_FILE, {})
+        control[bot_name] = action == "start"
+        save_json(BOT_HOST_CONTROL_FILE, control)
+        return redirect(request.referrer or url_for("index"))
+    if action == "start":
+        # Only what bypasses logging (crashes before setup, print) ends up here; the bot writes and rotates
+        # cfg["log"] itself. The child keeps its own copy of the file descriptor, ours can be closed right away
+        with open(os.path.splitext(cfg["log"])[0] + ".stdout.log", "a") as log_file:
+            subprocess.Popen([VENV_PYTHON, cfg["script"]], cwd=os.path.dirname(cfg["script"]), stdout=log_file, stderr=subprocess.STDOUT)
     elif action == "stop": subprocess.run(["pkill", "-f", cfg["pattern"]])
     return redirect(request.referrer or url_for("index"))
 
 @app.route("/critical-errors")
 @login_required
-def critical_errors(): return render_template("critical_errors.html", critical_logs=open(CRITICAL_ERRORS_LOG_FILE).readlines() if os.path.exists(CRITICAL_ERRORS_LOG_FILE) else [])
+def critical_errors(): return render_template("critical_errors.html", critical_logs=tail_lines(CRITICAL_ERRORS_LOG_FILE, CRITICAL_ERRORS_TAIL_LINES))
+
+@app.route("/api/logs/<source>/tail")
+@login_required
+def api_log_tail(source):
+    if source not in LOG_SOURCES: return jsonify({"error": "unknown log"}), 404
+    path = LOG_SOURCES[source]
+    lines = max(1, min(request.args.get("lines", 100, type=int), 5000))
+    # offset = current end of file, the starting point for /follow
+    return jsonify({"lines": tail_lines(path, lines), "offset": follow(path)[1]})
+
+@app.route("/api/logs/<source>/follow")
+@login_required
+def api_log_follow(source):
+    # Cursor-based instead of a held-open stream: with gunicorn's sync worker an open stream would block the dashboard
+    if source not in LOG_SOURCES: return jsonify({"error": "unknown log"}), 404
+    lines, offset, reset = follow(LOG_SOURCES[source], request.args.get("offset", type=int))
+    return jsonify({"lines": lines, "offset": offset, "reset": reset})
+
+LOG_SEARCH_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+def _parse_log_time(value):
+    try: return datetime.fromisoformat(value) if value else None
+    except ValueError: return None
+
+def _search_logs(db, limit, bot=None, level=None, since=None, until=None, text=None, before_id=None):
+    # Newest first, keyset on (ts, id): walks ix_log_entries_bot_ts / ix_log_entries_ts backwards without sorting
+    q = db.query(LogEntry)
+    if bot: q = q.filter(LogEntry.bot == bot)
+    if level in LOG_SEARCH_LEVELS: q = q.filter(LogEntry.level >= logging.getLevelName(level))
+    if since: q = q.filter(LogEntry.ts >= since)
+    if until: q = q.filter(LogEntry.ts <= until)
+    if text: q = q.filter(LogEntry.message.contains(text, autoescape=True))
+    if before_id is not None:
+        before = db.get(LogEntry, before_id)
+        if before: q = q.filter(tuple_(LogEntry.ts, LogEntry.id) < (before.ts, before.id))
+    rows = q.order_by(LogEntry.ts.desc(), LogEntry.id.desc()).limit(limit).all()
+    return [{"id": r.id, "ts": r.ts.strftime("%Y-%m-%d %H:%M:%S"), "bot": r.bot, "level": logging.getLevelName(r.level), "logger": r.logger, "message": r.message, "exc": r.exc, "context": r.context} for r in rows]
+
+def _log_search_args():
+    return {"bot": request.args.get("bot") or None, "level": request.args.get("level") or None, "since": _parse_log_time(request.args.get("since")), "until": _parse_log_time(request.args.get("until")), "text": request.args.get("q") or None, "before_id": request.args.get("before_id", type=int)}
+
+@app.route("/api/logs/search")
+@login_required
+def api_log_search():
+    limit = max(1, min(request.args.get("limit", 200, type=int), 1000))
+    with ReadSessionLocal() as db:
+        entries = _search_logs(db, limit, **_log_search_args())
+    return jsonify({"entries": entries, "next_before_id": entries[-1]["id"] if len(entries) == limit else None})
+
+@app.route("/logs")
+@login_required
+def log_search():
+    limit = 200
+    with ReadSessionLocal() as db:
+        entries = _search_logs(db, limit, **_log_search_args())
+    next_args = {k: v for k, v in request.args.items() if k != "before_id" and v}
+    next_url = url_for("log_search", **next_args, before_id=entries[-1]["id"]) if len(entries) == limit else None
+    return render_template("log_search.html", entries=entries, bots=[*MATCH_CONFIG, "dashboard"], levels=LOG_SEARCH_LEVELS, args=request.args, next_url=next_url)
 
 @app.route("/critical-errors/clear", methods=["POST"])
 @login_required
@@ -886,6 +1369,56 @@ def clear_critical_errors():
     flash("Logs gelöscht.", "success")
     return redirect(url_for("critical_errors"))
 
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def _scrape_bot_metrics():
+    # /metrics.json of every bot exporter that is up (bots/bot_metrics.py); stopped bots refuse at once
+    snapshots = {}
+    for name, port in BOT_METRICS_PORTS.items():
+        try:
+            res = requests.get(f"http://{BOT_METRICS_HOST}:{port}/metrics.json", timeout=BOT_METRICS_TIMEOUT_SECONDS)
+            if res.status_code == 200: snapshots[name] = res.json()
+        except (requests.RequestException, ValueError): continue
+    return snapshots
+
+def _bot_performance(snapshots):
+    bots, handlers, executors = {}, [], []
+    def bot_row(sample): return bots.setdefault(sample["labels"]["bot"], {"updates": 0, "rate": 0, "lag_p50": None, "lag_p95": None})
+    for process, snap in snapshots.items():
+        for sample in snap.get("bot_updates_total", []): bot_row(sample)["updates"] += sample["value"]
+        for sample in snap.get("bot_updates_per_second", []): bot_row(sample)["rate"] = sample["value"]
+        for sample in snap.get("bot_update_lag_seconds", []): bot_row(sample).update({"lag_p50": sample["p50"], "lag_p95": sample["p95"]})
+        errors = {(e["labels"]["bot"], e["labels"]["handler"]): e["value"] for e in snap.get("bot_handler_errors_total", [])}
+        for sample in snap.get("bot_handler_seconds", []):
+            key = (sample["labels"]["bot"], sample["labels"]["handler"])
+            handlers.append({"bot": key[0], "handler": key[1], "count": sample["count"], "avg": sample["sum"] / sample["count"], "p50": sample["p50"], "p95": sample["p95"], "p99": sample["p99"], "errors": errors.get(key, 0)})
+        waits = {w["labels"]["pool"]: w for w in snap.get("bot_executor_wait_seconds", [])}
+        for sample in snap.get("bot_executor_queue_depth", []):
+            wait = waits.get(sample["labels"]["pool"], {})
+            executors.append({"process": process, "pool": sample["labels"]["pool"], "queued": sample["value"], "calls": wait.get("count", 0), "wait_p95": wait.get("p95")})
+    handlers.sort(key=lambda h: h["p95"] or 0, reverse=True)
+    return {"bots": bots, "handlers": handlers, "executors": executors, "processes": sorted(snapshots)}
+
+@app.route("/api/bots/metrics")
+@login_required
+def api_bot_metrics(): return jsonify(_scrape_bot_metrics())
+
+@app.route("/performance")
+@login_required
+def performance():
+    db_time = {labels["route"]: summary["sum"] for labels, summary in DB_QUERY_SECONDS.items()}
+    db_queries = {labels["route"]: summary for labels, summary in REQUEST_DB_QUERIES.items()}
+    routes = []
+    for labels, summary in REQUEST_SECONDS.items():
+        queries = db_queries.get(labels["route"], {"sum": 0, "count": 0})
+        routes.append({**labels, **summary, "avg": summary["sum"] / summary["count"], "queries": queries["sum"] / queries["count"] if queries["count"] else 0, "db_avg": db_time.get(labels["route"], 0) / queries["count"] if queries["count"] else 0})
+    routes.sort(key=lambda r: r["p95"] or 0, reverse=True)
+    telegram = [{**labels, **summary, "avg": summary["sum"] / summary["count"], "errors": TELEGRAM_ERRORS.value(**labels)} for labels, summary in TELEGRAM_SECONDS.items()]
+    telegram.sort(key=lambda r: r["count"], reverse=True)
+    return render_template("performance.html", routes=routes, telegram=telegram, started=METRICS_STARTED, bot_perf=_bot_performance(_scrape_bot_metrics()))
+
 @app.route("/api/update/check")
 @login_required
 def update_check(): return jsonify(get_updater().check_for_update() if get_updater() else {"update_available": False})
@@ -915,7 +1448,7 @@ def tg_avatar_proxy(user_id):
 
         if not token: abort(404)
         
-        res = requests.get(f"https://api.telegram.org/bot{token}/getUserProfilePhotos?user_id={user_id}&limit=1")
+        res = telegram_api(token, "getUserProfilePhotos", "get", params={"user_id": user_id, "limit": 1})
         if res.status_code != 200: abort(404)
         data = res.json()
         if not data.get("result") or not data["result"]["photos"]: abort(404)
@@ -924,7 +1457,7 @@ def tg_avatar_proxy(user_id):
         photo_list = data["result"]["photos"][0]
         file_id = photo_list[0]["file_id"] # small
         
-        res = requests.get(f"https://api.telegram.org/bot{token}/getFile?file_id={file_id}")
+        res = telegram_api(token, "getFile", "get", params={"file_id": file_id})
         if res.status_code != 200: abort(404)
         file_path = res.json()["result"]["file_path"]
         
@@ -946,7 +1479,7 @@ def tg_media_proxy(file_id):
 
         if not token: abort(404)
         
-        res = requests.get(f"https://api.telegram.org/bot{token}/getFile?file_id={file_id}")
+        res = telegram_api(token, "getFile", "get", params={"file_id": file_id})
         if res.status_code != 200: abort(404)
         file_path = res.json()["result"]["file_path"]
         
@@ -0,0 +1,81 @@
+import os
+
+# Reads the end of log files without loading them: the cost depends on the
+# number of lines requested, not on the size of the file.
+
+BLOCK_SIZE = 8192
+# Upper bound for one follow() call, so a client far behind cannot pull a whole file at once
+MAX_FOLLOW_BYTES = 256 * 1024
+
+
+def _decode(raw):
+    return raw.decode("utf-8", errors="replace")
+
+
+def tail_lines(path, n=100, block_size=BLOCK_SIZE):
+    """Last ``n`` lines of ``path`` (without line endings), oldest first.
+
+    Reads blocks backwards from EOF until enough newlines were found.
+    Returns [] if the file does not exist.
+    """
+    if n <= 0:
+        return []
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return []
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        chunks = []
+        newlines = 0
+        # A trailing newline terminates the last line, it does not start a new one
+        needed = n + 1
+        while pos > 0 and newlines < needed:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+        data = b"".join(reversed(chunks))
+    lines = _decode(data).splitlines()
+    return lines[-n:]
+
+
+def tail_text(path, n=100):
+    return "\n".join(tail_lines(path, n))
+
+
+def follow(path, offset=None, max_bytes=MAX_FOLLOW_BYTES):
+    """Complete lines written after byte ``offset``.
+
+    Returns ``(lines, new_offset, reset)``. Without an offset only the current
+    end of the file is returned, so a client can start following from there.
+    ``reset`` is True when the file was truncated or rotated since ``offset``;
+    reading then restarts at the beginning of the new file.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return [], 0, offset not in (None, 0)
+    if offset is None:
+        return [], size, False
+
+    reset = offset > size
+    if reset:
+        offset = 0
+    if offset == size:
+        return [], offset, reset
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(min(max_bytes, size - offset))
+    # Only hand out complete lines; a partially written line is picked up next time
+    cut = data.rfind(b"\n")
+    if cut == -1:
+        if len(data) < max_bytes:
+            return [], offset, reset
+        cut = len(data) - 1
+    data = data[:cut + 1]
+    return _decode(data).splitlines(), offset + len(data), reset